@@ -0,0 +1,320 @@
+"""
+Headless HTTP API for NoteMate, next to the Streamlit UI.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+One RAGEngine, embedder and Groq client serve every request. Retrieval
+and other CPU-bound work runs on a bounded thread pool
+(NOTEMATE_API_CPU_WORKERS); ingestion runs on the shared background
+worker pool (NOTEMATE_INGEST_WORKERS); LLM calls are async and capped at
+NOTEMATE_LLM_CONCURRENCY at a time (and NOTEMATE_LLM_MAX_CONCURRENCY
+across the process). Requests carry no session: everything
+is addressed by collection id, and collections live in vector_db/, so
+replicas sharing that directory can sit behind a load balancer. (Ingest
+jobs are polled on the replica that accepted the upload.)
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, File, Header, HTTPException, Response, UploadFile
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+from backend.catalog import CollectionCatalog
+from backend.generator import ContentGenerator
+from backend.ingest import make_ingest_job
+from backend.jobs import get_worker_pool
+from backend.rag_engine import RETRIEVAL_MODES, RAGEngine
+from backend.semantic_cache import SEMANTIC_FEATURES, SemanticCache
+from backend.sharded_generation import SHARD_THRESHOLD, agenerate_flashcards_sharded, agenerate_quiz_sharded
+from backend.study_pack import PACK_RETRIEVALS, abuild_study_pack
+from backend.tracing import get_tracer
+from backend.warmup import start_warmup
+
+load_dotenv()
+
+# Retrieval query (None: the request's topic/concept) and context size per feature, as in the UI tabs
+FEATURE_RETRIEVALS = {
+    "quiz": PACK_RETRIEVALS["quiz"],
+    "lesson": PACK_RETRIEVALS["lesson"],
+    "story": (None, 3),
+    "explain": PACK_RETRIEVALS["explanations"],
+    "mindmap": PACK_RETRIEVALS["mindmap"],
+    "summary": PACK_RETRIEVALS["summary"],
+    "flashcards": PACK_RETRIEVALS["flashcards"]
+}
+
+UPLOAD_DIR = os.getenv("NOTEMATE_UPLOAD_DIR", "./uploads")
+UPLOAD_EXTENSIONS = (".pdf", ".docx", ".txt")
+
+
+class Services:
+    """What every request shares; created once in the app's lifespan."""
+
+    def __init__(self):
+        self.engine = RAGEngine(os.getenv("NOTEMATE_DB_PATH", "./vector_db"))
+        self.semantic_cache = SemanticCache(self.engine)
+        api_key = os.getenv("GROQ_API_KEY")
+        self.generator = ContentGenerator(api_key, base_url=os.getenv("GROQ_BASE_URL") or None) if api_key else None
+        self.cpu_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("NOTEMATE_API_CPU_WORKERS", "4")), thread_name_prefix="api-cpu"
+        )
+        self.llm_semaphore = asyncio.Semaphore(int(os.getenv("NOTEMATE_LLM_CONCURRENCY", "4")))
+        self.client = self.generator.async_client() if self.generator else None
+
+    async def run_cpu(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.cpu_pool, fn, *args)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+        self.cpu_pool.shutdown(wait=False)
+
+
+services: Optional[Services] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global services
+    services = Services()
+    start_warmup()
+    try:
+        yield
+    finally:
+        await services.close()
+
+
+app = FastAPI(title="NoteMate API", lifespan=lifespan)
+
+
+class QueryRequest(BaseModel):
+    query: str
+    n_results: int = Field(3, ge=1, le=50)
+    mode: Optional[str] = None
+
+
+class FeatureRequest(BaseModel):
+    # topic for lessons, concept for story/explain; ignored by the other features
+    topic: Optional[str] = None
+    num_questions: int = Field(5, ge=1, le=50)
+    quiz_type: str = "mcq"
+    num_cards: int = Field(10, ge=1, le=100)
+    n_results: Optional[int] = Field(None, ge=1, le=50)
+    mode: Optional[str] = None
+    use_cache: bool = True
+
+
+class StudyPlanRequest(BaseModel):
+    chapters: List[str]
+    days: int = Field(7, ge=1, le=365)
+    difficulty: str = "Intermediate"
+    use_cache: bool = True
+
+
+class StudyPackRequest(BaseModel):
+    topic: Optional[str] = None
+    num_questions: int = Field(5, ge=1, le=50)
+    quiz_type: str = "mcq"
+    num_cards: int = Field(10, ge=1, le=100)
+    use_cache: bool = True
+
+
+def _job_dict(job) -> Dict:
+    return {
+        "job_id": job.id,
+        "state": job.state,
+        "stage": job.stage,
+        "progress": job.progress,
+        "collection": job.result,
+        "error": job.error
+    }
+
+
+def _require_collection(collection: str):
+    if not services.engine.has_collection(collection):
+        raise HTTPException(404, f"Unknown collection: {collection}")
+
+
+def _require_generator() -> ContentGenerator:
+    if services.generator is None:
+        raise HTTPException(503, "GROQ_API_KEY is not set on this server")
+    return services.generator
+
+
+def _check_mode(mode: Optional[str]):
+    if mode is not None and mode not in RETRIEVAL_MODES:
+        raise HTTPException(422, f"mode must be one of {', '.join(RETRIEVAL_MODES)}")
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "llm": services.generator is not None}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return get_tracer().prometheus_text()
+
+
+@app.post("/collections", status_code=202)
+async def upload(response: Response, file: UploadFile = File(...), x_client_id: Optional[str] = Header(None)):
+    """
+    Upload a PDF, DOCX or TXT file. Known content returns its existing
+    collection at once; otherwise an ingest job is queued (poll /jobs/{id}).
+    """
+    if not file.filename or not file.filename.lower().endswith(UPLOAD_EXTENSIONS):
+        raise HTTPException(415, f"Supported files: {', '.join(UPLOAD_EXTENSIONS)}")
+    data = await file.read()
+    content_hash = CollectionCatalog.content_hash(data)
+    engine = services.engine
+
+    known = engine.catalog.get(content_hash)
+    if known and engine.has_collection(known["collection"]):
+        response.status_code = 200
+        return {"collection": known["collection"], "chunks": known["chunks"], "state": "done", "job_id": None}
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    file_path = os.path.join(UPLOAD_DIR, f"{content_hash[:12]}_{os.path.basename(file.filename)}")
+    with open(file_path, 'wb') as f:
+        f.write(data)
+
+    # The worker pool queues per owner, so one busy client can't starve the others
+    job = get_worker_pool().submit(
+        x_client_id or "api",
+        make_ingest_job(engine, file_path, file.filename, content_hash, services.generator),
+        description=file.filename,
+        key=content_hash
+    )
+    return {
+        **_job_dict(job),
+        "collection": CollectionCatalog.collection_name_for(file.filename, content_hash),
+        "chunks": None
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = get_worker_pool().get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Unknown job: {job_id}")
+    return _job_dict(job)
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, x_client_id: Optional[str] = Header(None)):
+    """Withdraw this client from the job; it stops once no other client that uploaded the same file is waiting on it."""
+    job = get_worker_pool().get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Unknown job: {job_id}")
+    if not get_worker_pool().cancel(job_id, x_client_id or "api"):
+        raise HTTPException(403, f"Job {job_id} was not submitted by this client")
+    return _job_dict(job)
+
+
+@app.post("/collections/{collection}/query")
+async def query(collection: str, request: QueryRequest):
+    _require_collection(collection)
+    _check_mode(request.mode)
+    chunks = await services.run_cpu(
+        lambda: services.engine.query(collection, request.query, request.n_results, mode=request.mode)
+    )
+    return {"collection": collection, "chunks": list(chunks)}
+
+
+async def _retrieve(collection: str, feature: str, request: FeatureRequest) -> List[str]:
+    query_text, n_results = FEATURE_RETRIEVALS[feature]
+    query_text = query_text or request.topic
+    if not query_text:
+        raise HTTPException(422, f"{feature} needs a topic")
+    return await services.run_cpu(
+        lambda: services.engine.query(collection, query_text, request.n_results or n_results, mode=request.mode)
+    )
+
+
+async def _generate(feature: str, prompt: str, context: List[str], use_cache: bool) -> str:
+    return await _require_generator().agenerate_with_context(
+        prompt, context, services.client, services.llm_semaphore, use_cache, feature
+    )
+
+
+def _feature_prompt(generator: ContentGenerator, feature: str, request: FeatureRequest) -> str:
+    if feature == "quiz":
+        return generator.quiz_prompt(request.num_questions, request.quiz_type)
+    if feature == "lesson":
+        return generator.lesson_prompt(request.topic)
+    if feature == "story":
+        return generator.story_prompt(request.topic)
+    if feature == "explain":
+        return generator.explain_prompt(request.topic)
+    if feature == "mindmap":
+        return generator.mindmap_prompt()
+    if feature == "summary":
+        return generator.summary_prompt()
+    return generator.flashcards_prompt(request.num_cards)
+
+
+@app.post("/collections/{collection}/study-pack")
+async def study_pack(collection: str, request: StudyPackRequest):
+    generator = _require_generator()
+    _require_collection(collection)
+    return await abuild_study_pack(
+        services.engine, generator, collection, request.topic, request.num_questions, request.quiz_type,
+        request.num_cards, use_cache=request.use_cache, client=services.client, semaphore=services.llm_semaphore
+    )
+
+
+@app.post("/collections/{collection}/{feature}")
+async def generate(collection: str, feature: str, request: FeatureRequest):
+    """quiz, lesson, story, explain, mindmap, summary or flashcards, grounded in the collection."""
+    if feature not in FEATURE_RETRIEVALS:
+        raise HTTPException(404, f"Unknown feature: {feature}")
+    generator = _require_generator()
+    _require_collection(collection)
+    _check_mode(request.mode)
+
+    # Large quizzes and decks are split across concurrent calls and merged
+    if feature == "quiz" and request.num_questions > SHARD_THRESHOLD:
+        result = await agenerate_quiz_sharded(
+            services.engine, generator, collection, request.num_questions, request.quiz_type,
+            use_cache=request.use_cache, client=services.client, semaphore=services.llm_semaphore
+        )
+        return {"collection": collection, "feature": feature, **result}
+    if feature == "flashcards" and request.num_cards > SHARD_THRESHOLD:
+        result = await agenerate_flashcards_sharded(
+            services.engine, generator, collection, request.num_cards,
+            use_cache=request.use_cache, client=services.client, semaphore=services.llm_semaphore
+        )
+        return {"collection": collection, "feature": feature, **result}
+
+    # Lessons, stories and explanations of a topic asked before in other words are reused, skipping retrieval
+    semantic = feature in SEMANTIC_FEATURES and request.topic
+    hit = None
+    if semantic and request.use_cache:
+        hit = await services.run_cpu(services.semantic_cache.get, collection, feature, request.topic)
+    if hit is not None:
+        content = hit["response"]
+    else:
+        context = await _retrieve(collection, feature, request)
+        content = await _generate(feature, _feature_prompt(generator, feature, request), context, request.use_cache)
+        if semantic:
+            await services.run_cpu(services.semantic_cache.put, collection, feature, request.topic, content)
+    result = {"collection": collection, "feature": feature, "content": content}
+    if hit is not None:
+        result["similar_request"] = {"request": hit["request"], "similarity": hit["similarity"]}
+    if feature == "explain":
+        result["levels"] = generator.split_levels(content)
+    return result
+
+
+@app.post("/study-plan")
+async def study_plan(request: StudyPlanRequest):
+    generator = _require_generator()
+    chapter_text = "\n".join(f"- {c}" for c in request.chapters)
+    prompt = generator.study_plan_prompt(request.chapters, request.days, request.difficulty)
+    content = await _generate("study_plan", prompt, [chapter_text], request.use_cache)
+    return {"content": content}
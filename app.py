@@ -1,7 +1,16 @@
 import streamlit as st
 import os
-from backend.document_parser import DocumentParser
-from backend.rag_engine import RAGEngine
+import uuid
+from backend.warmup import mark_interactive, start_warmup, warmup_status
+from backend.catalog import CollectionCatalog
+from backend.ingest import make_ingest_job
+from backend.jobs import CANCELLED, DONE, FAILED, QUEUED, get_worker_pool
+from backend.rag_engine import DENSE, RETRIEVAL_MODES, RAGEngine
+from backend.semantic_cache import SemanticCache
+from backend.sharded_generation import SHARD_THRESHOLD, generate_flashcards_sharded, generate_quiz_sharded
+from backend.study_pack import build_study_pack
+from backend.summary_tree import coarse_query, load_summary_tree
+from backend.tracing import get_tracer
 from backend.generator import ContentGenerator
 from dotenv import load_dotenv
 
@@ -14,14 +23,37 @@ st.set_page_config(
     layout="wide"
 )
 
+# Load the embedding model in the background while the first page renders
+start_warmup()
+
+
+@st.cache_resource
+def get_rag_engine():
+    # One engine per process: collections are addressed by name and the
+    # resident indexes are bounded by a shared LRU memory budget
+    return RAGEngine()
+
+
+@st.cache_resource
+def get_semantic_cache():
+    # Shared like the engine, so one student's lesson on a class document serves the others
+    return SemanticCache(get_rag_engine())
+
+
 # Initialize
 if 'rag_engine' not in st.session_state:
-    st.session_state.rag_engine = RAGEngine()
+    st.session_state.rag_engine = get_rag_engine()
 
 # Make sure collection_name always exists
 if 'collection_name' not in st.session_state:
     st.session_state.collection_name = None
 
+# Background ingestion: this session's id on the worker pool and its current job
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'ingest_job_id' not in st.session_state:
+    st.session_state.ingest_job_id = None
+
 if 'generator' not in st.session_state:
     api_key = None
 
@@ -45,6 +77,74 @@ if 'generator' not in st.session_state:
         )
         st.stop()
 
+
+def stream_text(stream, show):
+    # Re-render a placeholder with the text so far, for widgets write_stream can't target
+    placeholder = st.empty()
+    text = ""
+    for delta in stream:
+        text += delta
+        show(placeholder, text)
+    return text
+
+
+def show_shard_problems(result, items):
+    # A sharded quiz or deck that came back short says so instead of silently having fewer items
+    if result.get("missing"):
+        st.warning(f"{result['missing']} {items} could not be generated; try again for a full set.")
+    for error in result.get("errors", []):
+        st.caption(error)
+
+
+@st.fragment(run_every=1.0)
+def show_ingest_progress():
+    # Polls the background ingest job; only this fragment re-runs every second
+    pool = get_worker_pool()
+    job = pool.get(st.session_state.ingest_job_id)
+    if job is None:
+        st.session_state.ingest_job_id = None
+        return
+
+    if job.state == DONE:
+        st.session_state.collection_name = job.result
+        st.session_state.ingest_job_id = None
+        st.session_state.ingest_finished = True
+        st.session_state.ingest_finished_chunks = job.progress.get("chunks_embedded", 0)
+        st.session_state.ingest_finished_duplicates = job.progress.get("duplicates_removed", 0)
+        st.rerun()
+
+    if job.state in (FAILED, CANCELLED):
+        if job.state == FAILED:
+            st.error(f"⚠️ Processing {job.description} failed: {job.error}")
+        else:
+            st.warning(f"Processing {job.description} was cancelled.")
+        if st.button("Dismiss", key="dismiss_ingest"):
+            st.session_state.ingest_job_id = None
+            st.rerun()
+        return
+
+    st.markdown(f"**⏳ Processing {job.description}**")
+    if job.state == QUEUED:
+        st.caption(f"Waiting in queue ({pool.queue_position(job.id)} ahead)")
+    else:
+        progress = job.progress
+        st.caption(f"Stage: {job.stage}")
+        st.caption(
+            f"Pages parsed: {progress.get('pages_parsed', 0)} · "
+            f"Chunks embedded: {progress.get('chunks_embedded', 0)} · "
+            f"Duplicates removed: {progress.get('duplicates_removed', 0)} · "
+            f"Written: {progress.get('bytes_written', 0) / 1024:.0f} KB"
+        )
+        if job.stage == "summarizing":
+            st.caption(f"Summaries written: {progress.get('summaries_done', 0)}")
+    if st.button("✖ Cancel", key="cancel_ingest"):
+        pool.cancel(job.id, st.session_state.session_id)
+        if job.owners:
+            # Another session uploaded the same file and is still waiting on it: only stop following it here
+            st.session_state.ingest_job_id = None
+            st.rerun()
+
+
 # Header
 st.title("🚀 NOTEMATE - GenAI Study Pack Generator")
 st.caption("Transform your notes into AI-powered learning materials using RAG + GenAI!")
@@ -61,43 +161,130 @@ with st.sidebar:
     
     if uploaded_file:
         if st.button("🔄 Process Document", type="primary", use_container_width=True):
-            with st.spinner("Processing your document..."):
+            rag_engine = st.session_state.rag_engine
+            data = uploaded_file.getbuffer()
+            content_hash = CollectionCatalog.content_hash(data)
+            known = rag_engine.catalog.get(content_hash)
+
+            if known and rag_engine.has_collection(known["collection"]):
+                # Same content was processed before: reuse its collection
+                st.session_state.collection_name = known["collection"]
+                st.success(f"✅ Loaded {known['chunks']} chunks from a previous upload!")
+                st.balloons()
+            else:
                 # Create uploads folder
                 os.makedirs("./uploads", exist_ok=True)
-                
-                # Save file
-                file_path = f"./uploads/{uploaded_file.name}"
+
+                # Save file under its content hash so same-named uploads never clash
+                file_path = f"./uploads/{content_hash[:12]}_{uploaded_file.name}"
                 with open(file_path, 'wb') as f:
-                    f.write(uploaded_file.getbuffer())
-                
-                # Parse document
-                parser = DocumentParser()
-                
-                if uploaded_file.name.endswith('.pdf'):
-                    text = parser.parse_pdf(file_path)
-                elif uploaded_file.name.endswith('.docx'):
-                    text = parser.parse_docx(file_path)
-                else:
-                    text = parser.parse_txt(file_path)
-                
-                # Process text
-                chunks = parser.chunk_text(text)
-                collection_name = uploaded_file.name.replace('.', '_').replace(' ', '_')
-                st.session_state.collection_name = collection_name
-                
-                # Store in vector DB
-                st.session_state.rag_engine.create_collection(collection_name)
-                st.session_state.rag_engine.add_documents(collection_name, chunks)
-                
-                st.success(f"✅ Successfully processed {len(chunks)} chunks!")
-                st.balloons()
-    
+                    f.write(data)
+
+                # Parse, chunk, embed and summarize on the shared worker pool
+                job = get_worker_pool().submit(
+                    st.session_state.session_id,
+                    make_ingest_job(rag_engine, file_path, uploaded_file.name, content_hash, st.session_state.generator),
+                    description=uploaded_file.name,
+                    key=content_hash
+                )
+                st.session_state.ingest_job_id = job.id
+
+    if st.session_state.ingest_job_id:
+        show_ingest_progress()
+
+    if st.session_state.pop("ingest_finished", None):
+        st.success(f"✅ Successfully processed {st.session_state.ingest_finished_chunks} chunks!")
+        if st.session_state.get("ingest_finished_duplicates"):
+            st.caption(f"{st.session_state.ingest_finished_duplicates} near-duplicate chunks (repeated headers, "
+                       f"footers, copied paragraphs) were merged into the first copy.")
+        st.balloons()
+
     if st.session_state.collection_name:
         st.divider()
         st.info(f"📄 Active Document: {st.session_state.collection_name}")
 
+    # Repeated requests are served from the response cache unless this is ticked
+    fresh_output = st.checkbox(
+        "🎲 Always generate a new variation",
+        help="Skip cached answers for identical requests"
+    )
+    use_cache = not fresh_output
+
+    # How the Lesson, Story and Explain tabs find their context
+    retrieval_mode = st.selectbox(
+        "🔎 Retrieval",
+        RETRIEVAL_MODES,
+        index=RETRIEVAL_MODES.index(st.session_state.rag_engine.retrieval_mode),
+        help="hybrid adds keyword (BM25) matches for exact terms like formula names and acronyms; "
+             "sparse uses keywords only and skips the embedding model"
+    )
+
+    # Where the time goes: per-step timings from backend.tracing
+    if st.checkbox("🐢 Performance debug panel"):
+        tracer = get_tracer()
+        warmup = warmup_status()
+        st.caption(
+            f"Startup: interactive after {warmup['interactive_s']}s, "
+            f"model warm-up {warmup['status']}" + (f" in {warmup['seconds']}s" if warmup['seconds'] is not None else "")
+        )
+        if warmup["error"]:
+            st.caption(f"Warm-up error: {warmup['error']}")
+        stats = tracer.stats()
+        if not stats:
+            st.caption("No traced steps yet.")
+        else:
+            total = sum(row["total_s"] for row in stats if row["span"] in ("embed.encode", "query.search", "llm.call")) or 1
+            for row in stats:
+                if row["span"] in ("embed.encode", "query.search", "llm.call"):
+                    st.caption(f"{row['span']}: {row['total_s']}s ({row['total_s'] / total:.0%} of embed + search + LLM)")
+            st.dataframe(stats, hide_index=True, use_container_width=True)
+            with st.expander("Recent spans"):
+                st.dataframe([
+                    {"span": span["name"], "ms": span["duration_ms"], "error": span["error"], **span["attributes"]}
+                    for span in reversed(tracer.recent(30))
+                ], hide_index=True, use_container_width=True)
+            st.download_button("Prometheus metrics", tracer.prometheus_text(), file_name="notemate_metrics.txt")
+        if st.button("Reset timings"):
+            tracer.reset()
+
 # Main content
 if st.session_state.collection_name:
+    # Precomputed map-reduce summaries of the whole document, if built
+    summary_tree = load_summary_tree(
+        st.session_state.rag_engine.db_path,
+        st.session_state.collection_name
+    )
+
+    def retrieve(query_text, n_results):
+        # Section summaries act as a coarse first-level index for dense search when available
+        if summary_tree and retrieval_mode == DENSE:
+            return coarse_query(
+                st.session_state.rag_engine,
+                st.session_state.collection_name,
+                query_text,
+                summary_tree,
+                n_results=n_results
+            )
+        return st.session_state.rag_engine.query(
+            st.session_state.collection_name,
+            query_text,
+            n_results=n_results,
+            mode=retrieval_mode
+        )
+
+    def similar_answer(feature, request):
+        # Lesson, story and explain reuse the answer to a request that means the same (backend.semantic_cache)
+        if not use_cache:
+            return None
+        hit = get_semantic_cache().get(st.session_state.collection_name, feature, request)
+        if hit is None:
+            return None
+        st.caption(f"♻️ Answer to a similar request: \"{hit['request']}\" (similarity {hit['similarity']:.2f})")
+        return hit["response"]
+
+    def remember_answer(feature, request, response):
+        get_semantic_cache().put(st.session_state.collection_name, feature, request, response)
+
     tabs = st.tabs([
         "🎯 Quiz Generator",
         "📚 Lesson Creator", 
@@ -105,7 +292,8 @@ if st.session_state.collection_name:
         "🗺️ Mind Map",
         "📅 Study Planner",
         "🎓 Multi-Level Explain",
-        "📋 Summary & Cards"
+        "📋 Summary & Cards",
+        "📦 Study Pack"
     ])
     
     # Tab 1: Quiz Generator
@@ -115,19 +303,30 @@ if st.session_state.collection_name:
         
         col1, col2 = st.columns(2)
         with col1:
-            num_q = st.number_input("Number of questions", min_value=1, max_value=10, value=5)
+            num_q = st.number_input("Number of questions", min_value=1, max_value=40, value=5)
         with col2:
             q_type = st.selectbox("Question type", ["mcq", "scenario", "short"])
         
         if st.button("🎯 Generate Quiz", type="primary"):
             with st.spinner("Creating quiz..."):
-                context = st.session_state.rag_engine.query(
-                    st.session_state.collection_name,
-                    "main concepts and important topics",
-                    n_results=5
-                )
-                
-                quiz = st.session_state.generator.generate_quiz(context, num_q, q_type)
+                if num_q > SHARD_THRESHOLD:
+                    # Large quizzes: parallel calls, each from its own slice of the notes
+                    quiz = generate_quiz_sharded(
+                        st.session_state.rag_engine,
+                        st.session_state.generator,
+                        st.session_state.collection_name,
+                        num_q,
+                        q_type,
+                        use_cache=use_cache
+                    )
+                else:
+                    context = st.session_state.rag_engine.query(
+                        st.session_state.collection_name,
+                        "main concepts and important topics",
+                        n_results=5
+                    )
+                    quiz = st.session_state.generator.generate_quiz(context, num_q, q_type, use_cache=use_cache)
+                show_shard_problems(quiz, "questions")
                 st.markdown("### Your Generated Quiz:")
                 st.markdown(quiz.get("content", "No quiz generated"))
 
@@ -143,16 +342,18 @@ if st.session_state.collection_name:
         )
         
         if st.button("📚 Generate Lesson", type="primary") and topic:
-            with st.spinner(f"Creating lesson about '{topic}'..."):
-                context = st.session_state.rag_engine.query(
-                    st.session_state.collection_name,
-                    topic,
-                    n_results=5
-                )
-                
-                lesson = st.session_state.generator.generate_lesson(topic, context)
+            cached = similar_answer("lesson", topic)
+            if cached is not None:
+                st.markdown("### Generated Lesson:")
+                st.markdown(cached)
+            else:
+                with st.spinner(f"Creating lesson about '{topic}'..."):
+                    context = retrieve(topic, n_results=5)
+
+                # Render tokens as they arrive instead of waiting for the last one
+                lesson = st.session_state.generator.generate_lesson(topic, context, use_cache=use_cache, stream=True)
                 st.markdown("### Generated Lesson:")
-                st.markdown(lesson)
+                remember_answer("lesson", topic, st.write_stream(lesson))
     
     # Tab 3: Story Mode
     with tabs[2]:
@@ -165,33 +366,38 @@ if st.session_state.collection_name:
         )
         
         if st.button("📖 Generate Story", type="primary") and concept:
-            with st.spinner("Creating story..."):
-                context = st.session_state.rag_engine.query(
-                    st.session_state.collection_name,
-                    concept,
-                    n_results=3
-                )
-                
-                story = st.session_state.generator.generate_story_mode(concept, context)
+            cached = similar_answer("story", concept)
+            if cached is not None:
+                st.markdown("### Your Learning Story:")
+                st.markdown(cached)
+            else:
+                with st.spinner("Creating story..."):
+                    context = retrieve(concept, n_results=3)
+
+                story = st.session_state.generator.generate_story_mode(concept, context, use_cache=use_cache, stream=True)
                 st.markdown("### Your Learning Story:")
-                st.write(story)
+                remember_answer("story", concept, st.write_stream(story))
     
     # Tab 4: Mind Map
     with tabs[3]:
         st.header("Mind Map Generator")
         st.caption("Visualize concept hierarchy from your notes")
         
-        if st.button("🗺️ Generate Mind Map", type="primary"):
+        if summary_tree and summary_tree.get("mindmap") and use_cache:
+            # Built from summaries of every section at ingest time
+            st.markdown("### Concept Mind Map:")
+            st.code(summary_tree["mindmap"], language="text")
+        elif st.button("🗺️ Generate Mind Map", type="primary"):
             with st.spinner("Creating mind map..."):
                 context = st.session_state.rag_engine.query(
                     st.session_state.collection_name,
                     "all topics subtopics concepts hierarchy structure",
                     n_results=10
                 )
-                
-                mindmap = st.session_state.generator.generate_mindmap(context)
-                st.markdown("### Concept Mind Map:")
-                st.code(mindmap, language="text")
+
+            mindmap = st.session_state.generator.generate_mindmap(context, use_cache=use_cache, stream=True)
+            st.markdown("### Concept Mind Map:")
+            stream_text(mindmap, lambda box, text: box.code(text, language="text"))
     
     # Tab 5: Study Planner
     with tabs[4]:
@@ -221,7 +427,7 @@ if st.session_state.collection_name:
         if plan_btn and chapters:
             with st.spinner("Creating personalized study plan..."):
                 chapter_list = [c.strip() for c in chapters.split('\n') if c.strip()]
-                plan = st.session_state.generator.generate_study_plan(chapter_list, days, difficulty)
+                plan = st.session_state.generator.generate_study_plan(chapter_list, days, difficulty, use_cache=use_cache)
                 st.markdown("### Your Study Plan:")
                 st.text(plan)
     
@@ -236,14 +442,17 @@ if st.session_state.collection_name:
         )
         
         if st.button("🎓 Generate Explanations", type="primary") and explain_concept:
+            response = similar_answer("explain", explain_concept)
             with st.spinner("Generating explanations at 3 levels..."):
-                context = st.session_state.rag_engine.query(
-                    st.session_state.collection_name,
-                    explain_concept,
-                    n_results=3
-                )
-                
-                levels = st.session_state.generator.explain_at_levels(explain_concept, context)
+                if response is None:
+                    context = retrieve(explain_concept, n_results=3)
+                    generator = st.session_state.generator
+                    response = generator.generate_with_context(
+                        generator.explain_prompt(explain_concept), context, use_cache, "explain"
+                    )
+                    remember_answer("explain", explain_concept, response)
+
+                levels = st.session_state.generator.split_levels(response)
                 
                 col1, col2, col3 = st.columns(3)
                 
@@ -268,33 +477,93 @@ if st.session_state.collection_name:
         
         with col1:
             st.subheader("📝 Generate Summary")
-            if st.button("Create Summary", type="primary", use_container_width=True):
+            if summary_tree and use_cache:
+                # Whole-document summary reduced from every section at ingest time
+                st.markdown("### Summary:")
+                st.write(summary_tree["document"])
+                with st.expander("Section summaries"):
+                    for node in summary_tree["levels"][0]:
+                        st.markdown(f"**Chunks {node['start'] + 1}–{node['end']}**")
+                        st.write(node["summary"])
+            elif st.button("Create Summary", type="primary", use_container_width=True):
                 with st.spinner("Generating comprehensive summary..."):
                     context = st.session_state.rag_engine.query(
                         st.session_state.collection_name,
                         "comprehensive overview all main topics key points",
                         n_results=10
                     )
-                    
-                    summary = st.session_state.generator.generate_summary(context)
-                    st.markdown("### Summary:")
-                    st.write(summary)
+
+                summary = st.session_state.generator.generate_summary(context, use_cache=use_cache, stream=True)
+                st.markdown("### Summary:")
+                st.write_stream(summary)
         
         with col2:
             st.subheader("🎴 Generate Flashcards")
-            num_cards = st.slider("Number of flashcards", min_value=5, max_value=20, value=10)
+            num_cards = st.slider("Number of flashcards", min_value=5, max_value=40, value=10)
             
             if st.button("Create Flashcards", type="primary", use_container_width=True):
-                with st.spinner("Generating flashcards..."):
-                    context = st.session_state.rag_engine.query(
-                        st.session_state.collection_name,
-                        "key terms definitions important concepts",
-                        n_results=5
-                    )
-                    
-                    cards = st.session_state.generator.generate_flashcards(context, num_cards)
+                if num_cards > SHARD_THRESHOLD:
+                    # Large decks: parallel calls, each from its own slice of the notes
+                    with st.spinner("Generating flashcards..."):
+                        cards = generate_flashcards_sharded(
+                            st.session_state.rag_engine,
+                            st.session_state.generator,
+                            st.session_state.collection_name,
+                            num_cards,
+                            use_cache=use_cache
+                        )
+                    show_shard_problems(cards, "flashcards")
+                    st.markdown("### Flashcards:")
+                    st.text(cards["content"] or "No flashcards generated")
+                else:
+                    with st.spinner("Generating flashcards..."):
+                        context = st.session_state.rag_engine.query(
+                            st.session_state.collection_name,
+                            "key terms definitions important concepts",
+                            n_results=5
+                        )
+
+                    cards = st.session_state.generator.generate_flashcards(context, num_cards, use_cache=use_cache, stream=True)
                     st.markdown("### Flashcards:")
-                    st.text(cards)
+                    stream_text(cards, lambda box, text: box.text(text))
+
+    # Tab 8: Full Study Pack
+    with tabs[7]:
+        st.header("Full Study Pack")
+        st.caption("Quiz, lesson, summary, mind map, flashcards and explanations in one go")
+
+        pack_topic = st.text_input(
+            "Focus topic (optional)",
+            placeholder="Leave empty to cover the main concepts of the notes"
+        )
+
+        if st.button("📦 Generate Study Pack", type="primary"):
+            with st.spinner("Generating all study materials in parallel..."):
+                pack = build_study_pack(
+                    st.session_state.rag_engine,
+                    st.session_state.generator,
+                    st.session_state.collection_name,
+                    topic=pack_topic or None,
+                    use_cache=use_cache
+                )
+
+            with st.expander("🎯 Quiz", expanded=True):
+                st.markdown(pack["quiz"].get("content", "No quiz generated"))
+            with st.expander("📚 Lesson"):
+                st.markdown(pack["lesson"])
+            with st.expander("📋 Summary"):
+                st.write(pack["summary"])
+            with st.expander("🗺️ Mind Map"):
+                st.code(pack["mindmap"], language="text")
+            with st.expander("🎴 Flashcards"):
+                st.text(pack["flashcards"])
+            with st.expander("🎓 Multi-Level Explanation"):
+                st.markdown("**🧒 Beginner**")
+                st.info(pack["explanations"].get("beginner", ""))
+                st.markdown("**🎓 Intermediate**")
+                st.warning(pack["explanations"].get("intermediate", ""))
+                st.markdown("**🎯 Advanced**")
+                st.error(pack["explanations"].get("advanced", ""))
 else:
     # Welcome screen
     st.info("👈 Please upload a document to start generating AI-powered learning materials")
@@ -334,3 +603,6 @@ else:
     
     st.subheader("🚀 Powered by RAG + GenAI")
     st.caption("Using Retrieval-Augmented Generation for context-aware content creation")
+
+# First complete render of this process: how long the app took to become usable
+mark_interactive()
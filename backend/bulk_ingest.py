@@ -0,0 +1,290 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backend.catalog import CollectionCatalog
+from backend.dedup import NearDuplicateFilter, save_duplicate_refs
+from backend.document_parser import DocumentParser
+from backend.ingest import EMPTY_DOCUMENT, iter_document_text, unique_chunks
+from backend.rag_engine import RAGEngine
+from backend.tracing import get_tracer
+
+INGEST_EXTENSIONS = (".pdf", ".docx", ".txt")
+# What the parsers return instead of raising
+PARSE_ERRORS = ("Error reading PDF", "Error reading DOCX", "Error reading TXT")
+
+
+class IngestManifest:
+    """
+    Checkpoint of a bulk ingest, stored as vector_db/ingest_manifest.json:
+    for every file path, the size, mtime and content hash it had when it was
+    ingested and the collection built from it. A file whose size and mtime
+    still match is skipped without being read; one that was touched but not
+    changed is recognised by its hash. Written after every committed batch,
+    so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except:
+                self._entries = {}
+
+    def get(self, file_path: str) -> Optional[Dict]:
+        with self._lock:
+            return self._entries.get(file_path)
+
+    def unchanged(self, file_path: str, stat: os.stat_result) -> Optional[Dict]:
+        """The done entry for file_path if its size and mtime still match."""
+        entry = self.get(file_path)
+        if entry and entry["state"] == "done" and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry
+        return None
+
+    def record(self, file_path: str, stat: os.stat_result, content_hash: str, state: str, **fields):
+        with self._lock:
+            self._entries[file_path] = {
+                "hash": content_hash,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "state": state,
+                "updated": time.time(),
+                **fields
+            }
+
+    def save(self):
+        # Write-then-rename, like the catalog, so a crash never leaves a truncated manifest
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def scan_folder(folder: str) -> List[str]:
+    """Absolute paths of the PDF, DOCX and TXT files under folder, sorted."""
+    found = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.lower().endswith(INGEST_EXTENSIONS) and not name.startswith("."):
+                found.append(os.path.abspath(os.path.join(root, name)))
+    return found
+
+
+def _parse_file(file_path: str) -> Tuple[List[str], float]:
+    # Runs in a worker process: one file per task, pages extracted in-process
+    start = time.perf_counter()
+    pages = list(iter_document_text(file_path, workers=1))
+    return pages, time.perf_counter() - start
+
+
+class _File:
+    def __init__(self, path: str, stat: os.stat_result, content_hash: str):
+        self.path = path
+        self.stat = stat
+        self.hash = content_hash
+        self.name = os.path.basename(path)
+        self.collection = CollectionCatalog.collection_name_for(self.name, content_hash)
+        self.aliases: List[Tuple[str, os.stat_result]] = []  # other paths with the same content
+        self.pages = 0
+        self.chunks: List[Dict] = []
+        self.refs: Dict[int, List[Tuple[int, int]]] = {}
+        self.duplicates = 0
+        self.parse_s = 0.0
+        self.chunk_s = 0.0
+
+    def stats(self, state: str, index_s: float = 0.0, error: Optional[str] = None) -> Dict:
+        seconds = self.parse_s + self.chunk_s + index_s
+        return {
+            "file": self.path,
+            "state": state,
+            "collection": self.collection,
+            "bytes": self.stat.st_size,
+            "pages": self.pages,
+            "chunks": len(self.chunks),
+            "duplicates": self.duplicates,
+            "parse_s": round(self.parse_s, 4),
+            "chunk_s": round(self.chunk_s, 4),
+            "index_s": round(index_s, 4),
+            "mb_per_s": round(self.stat.st_size / 1e6 / seconds, 3) if seconds else None,
+            "chunks_per_s": round(len(self.chunks) / seconds, 1) if seconds else None,
+            "error": error
+        }
+
+
+def ingest_folder(
+    rag_engine: RAGEngine,
+    folder: str,
+    workers: Optional[int] = None,
+    batch_size: int = 1024,
+    storage: Optional[str] = None,
+    dedup_threshold: Optional[float] = None,
+    manifest_path: Optional[str] = None,
+    force: bool = False,
+    on_file: Optional[Callable[[Dict], None]] = None
+) -> List[Dict]:
+    """
+    Ingest every PDF, DOCX and TXT file under folder into its own collection
+    (named and catalogued like an upload, so the app reuses it).
+
+    Files are parsed in parallel in a process pool while the parent chunks
+    them and embeds the chunks of as many files as it takes to fill
+    batch_size, in one call on the engine's single embedder. Files already
+    in the manifest (or the catalog) with the same content are skipped;
+    force re-ingests everything.
+
+    Returns one stats dict per file (see _File.stats), also passed to
+    on_file as each file finishes; state is "done", "skipped" or "failed".
+    """
+    if dedup_threshold is None:
+        dedup_threshold = float(os.getenv("NOTEMATE_DEDUP_THRESHOLD", "0.8"))
+    manifest = IngestManifest(manifest_path or os.path.join(rag_engine.db_path, "ingest_manifest.json"))
+    report = on_file or (lambda stats: None)
+    results = []
+
+    def finish(stats: Dict):
+        results.append(stats)
+        report(stats)
+
+    # Work out what needs ingesting; hashing is skipped for files whose size and mtime match
+    todo: Dict[str, _File] = {}
+    for path in scan_folder(folder):
+        stat = os.stat(path)
+        entry = None if force else manifest.unchanged(path, stat)
+        if entry and rag_engine.has_collection(entry["collection"]):
+            finish({"file": path, "state": "skipped", "collection": entry["collection"], "bytes": stat.st_size})
+            continue
+        content_hash = CollectionCatalog.file_hash(path)
+        known = None if force else rag_engine.catalog.get(content_hash)
+        if known and rag_engine.has_collection(known["collection"]):
+            manifest.record(path, stat, content_hash, "done", collection=known["collection"], chunks=known["chunks"])
+            finish({"file": path, "state": "skipped", "collection": known["collection"], "bytes": stat.st_size})
+            continue
+        if content_hash in todo:
+            todo[content_hash].aliases.append((path, stat))
+        else:
+            todo[content_hash] = _File(path, stat, content_hash)
+    manifest.save()
+    if not todo:
+        return results
+
+    embedder = rag_engine.embedder
+    pending: List[_File] = []
+
+    def flush():
+        # One embedding call for every pending file, then each is written and checkpointed
+        start = time.perf_counter()
+        rag_engine.add_documents_many([
+            (f.collection, [c["text"] for c in f.chunks], [(c["start"], c["end"]) for c in f.chunks])
+            for f in pending
+        ])
+        for f in pending:
+            save_duplicate_refs(rag_engine.db_path, f.collection, f.refs, f.duplicates)
+            rag_engine.catalog.add(f.hash, f.collection, f.name, len(f.chunks))
+            for path, stat in [(f.path, f.stat)] + f.aliases:
+                manifest.record(path, stat, f.hash, "done", collection=f.collection, chunks=len(f.chunks))
+        manifest.save()
+        # The batch's embedding and write time is shared out by chunk count
+        elapsed = time.perf_counter() - start
+        total = sum(len(f.chunks) for f in pending) or 1
+        for f in pending:
+            finish(f.stats("done", elapsed * len(f.chunks) / total))
+            for path, stat in f.aliases:
+                finish({"file": path, "state": "skipped", "collection": f.collection, "bytes": stat.st_size})
+        pending.clear()
+
+    def fail(f: _File, error: str):
+        for path, stat in [(f.path, f.stat)] + f.aliases:
+            manifest.record(path, stat, f.hash, "failed", collection=f.collection, error=error)
+        manifest.save()
+        finish(f.stats("failed", error=error))
+
+    workers = workers or os.cpu_count() or 1
+    files = list(todo.values())
+    # spawn, not fork: the parent holds the embedder's threads
+    context = multiprocessing.get_context("spawn")
+    with get_tracer().span("ingest.bulk", files=len(files), workers=workers) as span, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        in_flight = {}
+        try:
+            while files or in_flight:
+                # At most 2 files per worker parsed ahead, so a folder of books never sits in memory
+                while files and len(in_flight) < 2 * workers:
+                    f = files.pop(0)
+                    in_flight[pool.submit(_parse_file, f.path)] = f
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    f = in_flight.pop(future)
+                    try:
+                        pages, f.parse_s = future.result()
+                    except Exception as e:
+                        fail(f, f"{type(e).__name__}: {e}")
+                        continue
+                    # A PDF whose later pages failed ends with the error, after the pages read before it
+                    if pages and pages[-1] in PARSE_ERRORS:
+                        fail(f, pages[-1])
+                        continue
+
+                    start = time.perf_counter()
+                    f.pages = len(pages)
+                    chunks = DocumentParser.stream_token_chunks(pages, embedder.tokenizer, max_tokens=embedder.max_tokens)
+                    dedup = NearDuplicateFilter(dedup_threshold) if dedup_threshold > 0 else None
+                    f.chunks = list(unique_chunks(chunks, dedup, f.refs))
+                    f.duplicates = dedup.removed if dedup else 0
+                    if not f.chunks:
+                        # No source span, as ingest_file stores it
+                        f.chunks = [{"text": EMPTY_DOCUMENT, "start": -1, "end": -1}]
+                    f.chunk_s = time.perf_counter() - start
+
+                    # A collection left half-written by an interrupted run starts over
+                    rag_engine.create_collection(f.collection, storage)
+                    pending.append(f)
+                    if sum(len(p.chunks) for p in pending) >= batch_size:
+                        flush()
+            if pending:
+                flush()
+        finally:
+            for future in in_flight:
+                future.cancel()
+        span.set(done=sum(1 for r in results if r["state"] == "done"))
+    return results
+
+
+def format_report(results: List[Dict], wall_s: float) -> str:
+    """Per-file throughput table and totals, for the CLI."""
+    lines = [f"{'file':<40} {'state':<8} {'MB':>7} {'pages':>6} {'chunks':>7} {'dups':>5} "
+             f"{'parse_s':>8} {'index_s':>8} {'MB/s':>7} {'chunks/s':>9}"]
+    for r in results:
+        name = os.path.basename(r["file"])
+        name = name if len(name) <= 40 else name[:37] + "..."
+        if r["state"] != "done":
+            detail = r.get("error") or r.get("collection") or ""
+            lines.append(f"{name:<40} {r['state']:<8} {r['bytes'] / 1e6:>7.2f}  {detail}")
+            continue
+        lines.append(
+            f"{name:<40} {r['state']:<8} {r['bytes'] / 1e6:>7.2f} {r['pages']:>6} {r['chunks']:>7} "
+            f"{r['duplicates']:>5} {r['parse_s']:>8.3f} {r['index_s']:>8.3f} {r['mb_per_s'] or 0:>7.2f} "
+            f"{r['chunks_per_s'] or 0:>9.1f}"
+        )
+
+    done = [r for r in results if r["state"] == "done"]
+    counts = {state: sum(1 for r in results if r["state"] == state) for state in ("done", "skipped", "failed")}
+    mb = sum(r["bytes"] for r in done) / 1e6
+    chunks = sum(r["chunks"] for r in done)
+    lines.append("")
+    lines.append(
+        f"{counts['done']} ingested, {counts['skipped']} skipped, {counts['failed']} failed in {wall_s:.1f}s: "
+        f"{mb:.2f} MB, {chunks} chunks ({mb / wall_s if wall_s else 0:.2f} MB/s, "
+        f"{chunks / wall_s if wall_s else 0:.1f} chunks/s)"
+    )
+    return "\n".join(lines)
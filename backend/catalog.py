@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+class CollectionCatalog:
+    """
+    Persistent map from file content hash to the collection built from it,
+    stored as vector_db/catalog.json. Lets a re-upload of a known file reuse
+    its collection instead of being parsed and embedded again.
+    """
+
+    def __init__(self, db_path: str):
+        self.path = os.path.join(db_path, "catalog.json")
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except:
+                self._entries = {}
+
+    @staticmethod
+    def file_hash(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        # Same digest as file_hash, for uploads that are still in memory
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def collection_name_for(file_name: str, content_hash: str) -> str:
+        base = file_name.replace('.', '_').replace(' ', '_')
+        return f"{base}_{content_hash[:12]}"
+
+    def get(self, content_hash: str) -> Optional[Dict]:
+        with self._lock:
+            return self._entries.get(content_hash)
+
+    def add(self, content_hash: str, collection_name: str, file_name: str, chunks: int):
+        with self._lock:
+            self._entries[content_hash] = {
+                "collection": collection_name,
+                "file_name": file_name,
+                "chunks": chunks,
+                "created": time.time()
+            }
+            self._write()
+
+    def remove(self, content_hash: str):
+        with self._lock:
+            if self._entries.pop(content_hash, None) is not None:
+                self._write()
+
+    def _write(self):
+        # Write-then-rename so a crash never leaves a truncated catalog
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,210 @@
+import os
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+# Prompt token budget for the retrieved context of each feature
+FEATURE_BUDGETS = {
+    "quiz": 1500,
+    "lesson": 1500,
+    "story": 1000,
+    "mindmap": 2500,
+    "summary": 2500,
+    "flashcards": 1500,
+    "explain": 1000,
+    "study_plan": None,  # the chapter list the user typed is sent as-is
+    "section_summary": 3000,
+    "combine_summaries": 3000
+}
+DEFAULT_BUDGET = 2000
+
+
+class ContextPacker:
+    """
+    Turns retrieved chunks into the context of one prompt: merges chunks that
+    overlap (neighbouring windows), drops near-duplicates, and keeps passages
+    in relevance order until the feature's token budget is full. When the
+    chunks come with their vectors (RetrievedChunks), MMR can reorder them.
+
+    Overlaps are found from the chunks' character spans when the retrieval
+    carries them; otherwise from matching words, allowing the first and
+    last word of the overlap to be cut mid-word (token windows start and
+    end on subword boundaries).
+    """
+
+    def __init__(
+        self,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        min_overlap_words: int = 8,
+        duplicate_threshold: float = 0.8,
+        use_mmr: Optional[bool] = None,
+        mmr_lambda: float = 0.7
+    ):
+        self.count_tokens = count_tokens or estimate_tokens
+        self.min_overlap_words = min_overlap_words
+        self.duplicate_threshold = duplicate_threshold
+        self.use_mmr = use_mmr if use_mmr is not None else os.getenv("NOTEMATE_CONTEXT_MMR", "0") == "1"
+        self.mmr_lambda = mmr_lambda
+
+    def budget_for(self, feature: Optional[str]) -> Optional[int]:
+        value = os.getenv(f"NOTEMATE_CONTEXT_BUDGET_{(feature or 'default').upper()}")
+        if value:
+            return int(value)
+        return FEATURE_BUDGETS.get(feature, DEFAULT_BUDGET)
+
+    def pack(self, context: List[str], feature: Optional[str] = None) -> List[str]:
+        budget = self.budget_for(feature)
+        if budget is None or not context:
+            return list(context)
+
+        order = list(range(len(context)))
+        embeddings = getattr(context, "embeddings", None)
+        if self.use_mmr and embeddings is not None and len(embeddings) == len(context):
+            order = mmr_order(embeddings, getattr(context, "query_embedding", None), self.mmr_lambda)
+
+        spans = getattr(context, "spans", None)
+        if spans is not None and len(spans) == len(context) and all(start >= 0 for start, _ in spans):
+            passages = [text.split() for text in self._merge_spans([(context[i], spans[i]) for i in order])]
+        else:
+            passages = self._merge_overlaps([context[i].split() for i in order])
+        passages = self._drop_duplicates(passages)
+
+        packed = []
+        used = 0
+        for words in passages:
+            text = " ".join(words)
+            tokens = self.count_tokens(text)
+            if used + tokens <= budget:
+                packed.append(text)
+                used += tokens
+            elif not packed:
+                # Even the best passage is too long: keep its head
+                packed.append(" ".join(words[:max(1, int(len(words) * budget / tokens))]))
+                break
+        return packed
+
+    def _merge_spans(self, chunks: List[Tuple[str, Tuple[int, int]]]) -> List[str]:
+        # Chunk text is the document's characters [start, end), so windows
+        # that overlap or touch join exactly; the merged passage keeps the
+        # better (earlier) rank
+        passages = [(text, int(start), int(end)) for text, (start, end) in chunks]
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(passages)):
+                for j in range(len(passages)):
+                    if i == j:
+                        continue
+                    text, start, end = passages[i]
+                    other, other_start, other_end = passages[j]
+                    if start <= other_start <= end:
+                        if other_end > end:
+                            text, end = text + other[end - other_start:], other_end
+                        keep, drop = min(i, j), max(i, j)
+                        passages[keep] = (text, start, end)
+                        del passages[drop]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return [text for text, _, _ in passages]
+
+    def _merge_overlaps(self, passages: List[List[str]]) -> List[List[str]]:
+        # Repeatedly join any pair where one's tail is the other's head;
+        # the merged passage keeps the better (earlier) rank
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(passages)):
+                for j in range(len(passages)):
+                    if i == j:
+                        continue
+                    overlap = self._overlap(passages[i], passages[j])
+                    if overlap:
+                        # The tail's copy of the last shared word is whole where the head's may be cut
+                        joined = passages[i][:-1] + passages[j][overlap - 1:]
+                        keep, drop = min(i, j), max(i, j)
+                        passages[keep] = joined
+                        del passages[drop]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return passages
+
+    def _overlap(self, head: List[str], tail: List[str]) -> int:
+        """
+        Length of the longest suffix of head that is a prefix of tail (0 if
+        under the minimum). The tail's first word may be the end of a head
+        word and the head's last word the start of a tail word.
+        """
+        n = self.min_overlap_words
+        if len(head) < n or len(tail) < n:
+            return 0
+        for start in range(max(0, len(head) - len(tail)), len(head) - n + 1):
+            length = len(head) - start
+            if head[start + 1:start + n] != tail[1:n]:
+                continue
+            if head[start + 1:-1] == tail[1:length - 1] and head[start].endswith(tail[0]) \
+                    and tail[length - 1].startswith(head[-1]):
+                return length
+        return 0
+
+    def _drop_duplicates(self, passages: List[List[str]]) -> List[List[str]]:
+        kept = []
+        kept_shingles = []
+        for words in passages:
+            shingles = _shingles(words)
+            duplicate = False
+            for other in kept_shingles:
+                common = len(shingles & other)
+                # Jaccard for look-alikes, containment for a passage inside a longer one
+                if common >= self.duplicate_threshold * len(shingles | other) or \
+                        common >= self.duplicate_threshold * min(len(shingles), len(other)):
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append(words)
+                kept_shingles.append(shingles)
+        return kept
+
+
+def estimate_tokens(text: str) -> int:
+    # Llama-style tokenizers average ~1.3 tokens per English word
+    return max(1, int(len(text.split()) * 1.3))
+
+
+def _shingles(words: List[str], size: int = 3) -> set:
+    lowered = [w.lower() for w in words]
+    if len(lowered) < size:
+        return {tuple(lowered)}
+    return {tuple(lowered[i:i + size]) for i in range(len(lowered) - size + 1)}
+
+
+def mmr_order(embeddings: np.ndarray, query_embedding: Optional[np.ndarray] = None, lambda_: float = 0.7) -> List[int]:
+    """
+    Maximal marginal relevance ordering over the chunks' own vectors. Without
+    a query vector, relevance falls back to the retrieval rank.
+    """
+    vectors = np.asarray(embeddings, dtype='float32')
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    n = len(vectors)
+    if query_embedding is not None:
+        query = np.asarray(query_embedding, dtype='float32').reshape(-1)
+        relevance = vectors @ (query / max(np.linalg.norm(query), 1e-12))
+    else:
+        relevance = 1.0 - np.arange(n, dtype='float32') / max(n, 1)
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    max_sim = similarity[selected[0]].copy()
+    remaining = np.ones(n, dtype=bool)
+    remaining[selected[0]] = False
+    while remaining.any():
+        scores = lambda_ * relevance - (1 - lambda_) * max_sim
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        remaining[best] = False
+        max_sim = np.maximum(max_sim, similarity[best])
+    return selected
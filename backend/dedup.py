@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def shingles(text: str, size: int = 3) -> np.ndarray:
+    """32-bit hashes of the text's overlapping word size-grams (the words themselves for shorter texts)."""
+    words = _WORD.findall(text.lower())
+    if len(words) >= size:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    else:
+        grams = words
+    return np.unique(np.array([zlib.crc32(gram.encode('utf-8')) for gram in grams], dtype='uint64'))
+
+
+class NearDuplicateFilter:
+    """
+    MinHash + LSH near-duplicate detection for chunks as they stream out of
+    the chunker: repeated headers and footers, slide boilerplate, pasted
+    paragraphs. A chunk is a duplicate of an earlier kept one when their
+    estimated Jaccard similarity over word shingles is at least threshold.
+
+    The num_perm signature is split into bands; two chunks become
+    candidates when any band matches exactly, which with the defaults
+    (16 bands of 8) catches pairs from about 0.7 similarity. Candidates are
+    then checked against the threshold on the full signatures.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16, shingle_size: int = 3,
+                 seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # Multiply-shift hash family: h(x) = (a * x + b) mod 2^64, top 32 bits; a is odd
+        self._a = rng.randint(1, 2 ** 62, size=num_perm, dtype='int64').astype('uint64') * np.uint64(2) + np.uint64(1)
+        self._b = rng.randint(0, 2 ** 62, size=num_perm, dtype='int64').astype('uint64')
+
+        self._exact: Dict[bytes, int] = {}  # digest of the whitespace/case-normalized text
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[int, np.ndarray] = {}
+        self.removed = 0
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        hashes = shingles(text, self.shingle_size)
+        if not len(hashes):
+            return None
+        with np.errstate(over='ignore'):
+            permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) >> np.uint64(32)
+        return (permuted & _MASK32).min(axis=0).astype('uint32')
+
+    def add(self, text: str, chunk_id: int) -> Optional[int]:
+        """
+        The id of the kept chunk text duplicates, or None after keeping text
+        under chunk_id.
+        """
+        normalized = hashlib.sha1(" ".join(text.lower().split()).encode('utf-8')).digest()
+        if normalized in self._exact:
+            self.removed += 1
+            return self._exact[normalized]
+
+        signature = self.signature(text)
+        if signature is not None:
+            keys = [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+            candidates = {idx for band, key in enumerate(keys) for idx in self._buckets[band].get(key, ())}
+            best, best_similarity = None, self.threshold
+            for idx in sorted(candidates):
+                similarity = float((self._signatures[idx] == signature).mean())
+                if similarity >= best_similarity:
+                    best, best_similarity = idx, similarity
+            if best is not None:
+                self.removed += 1
+                return best
+
+            for band, key in enumerate(keys):
+                self._buckets[band].setdefault(key, []).append(chunk_id)
+            self._signatures[chunk_id] = signature
+
+        self._exact[normalized] = chunk_id
+        return None
+
+
+def duplicates_path(db_path: str, collection_name: str) -> str:
+    return os.path.join(db_path, f"{collection_name}_duplicates.json")
+
+
+def save_duplicate_refs(db_path: str, collection_name: str, refs: Dict[int, List[Tuple[int, int]]], removed: int):
+    """Back-references: for each kept chunk id, the (start, end) source spans of the copies dropped in its favour."""
+    with open(duplicates_path(db_path, collection_name), 'w') as f:
+        json.dump({"removed": removed, "refs": {str(idx): spans for idx, spans in refs.items()}}, f)
+
+
+def load_duplicate_refs(db_path: str, collection_name: str) -> Dict[int, List[Tuple[int, int]]]:
+    try:
+        with open(duplicates_path(db_path, collection_name), 'r') as f:
+            data = json.load(f)
+        return {int(idx): [tuple(span) for span in spans] for idx, spans in data["refs"].items()}
+    except:
+        return {}
@@ -1,35 +1,126 @@
-import PyPDF2
-import docx
-from typing import List
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from backend.tracing import get_tracer
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[Tuple[str, float]]:
+    # Runs in a worker process: each worker opens its own reader.
+    # Page timings travel back with the text; spans are recorded in the parent
+    import PyPDF2
+
+    pages = []
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for i in range(start, end):
+            t0 = time.perf_counter()
+            text = pdf_reader.pages[i].extract_text() or ""
+            pages.append((text, time.perf_counter() - t0))
+    return pages
+
+
+def _traced_pages(pages: List[Tuple[str, float]], start: int) -> Iterator[str]:
+    tracer = get_tracer()
+    for page_number, (text, seconds) in enumerate(pages, start=start):
+        tracer.record("parse.page", seconds, page=str(page_number), chars=len(text))
+        yield text
+
 
 class DocumentParser:
     @staticmethod
     def parse_pdf(file_path: str) -> str:
-        text = ""
+        import PyPDF2
+
+        with get_tracer().span("parse", format="pdf") as span:
+            try:
+                with open(file_path, 'rb') as file:
+                    pdf_reader = PyPDF2.PdfReader(file)
+                    # Collect pages and join once; += on a growing string is quadratic
+                    pages = [page.extract_text() or "" for page in pdf_reader.pages]
+                text = "".join(pages)
+                span.set(pages=len(pages), chars=len(text))
+                return text
+            except Exception as e:
+                span.set_error(e)
+                return "Error reading PDF"
+
+    @staticmethod
+    def iter_pdf_pages(file_path: str, workers: Optional[int] = None, pages_per_task: int = 8) -> Iterator[str]:
+        """
+        Yield page texts in order while page ranges are extracted in a process pool.
+        At most 2 ranges per worker are in flight, so a large book never sits in memory.
+        A range that can't be read yields "Error reading PDF" and ends the document,
+        as parse_pdf returns it for a file it can't read.
+        """
+        import PyPDF2
+
         try:
             with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
+                n_pages = len(PyPDF2.PdfReader(file).pages)
         except:
-            text = "Error reading PDF"
-        return text
+            yield "Error reading PDF"
+            return
+
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or n_pages <= pages_per_task:
+            try:
+                pages = _extract_page_range(file_path, 0, n_pages)
+            except Exception:
+                yield "Error reading PDF"
+                return
+            yield from _traced_pages(pages, 0)
+            return
+
+        ranges = deque((start, min(start + pages_per_task, n_pages)) for start in range(0, n_pages, pages_per_task))
+        # spawn, not fork: the parent runs Streamlit and embedder threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            in_flight = deque()
+            while ranges or in_flight:
+                while ranges and len(in_flight) < 2 * workers:
+                    start, end = ranges.popleft()
+                    in_flight.append((start, pool.submit(_extract_page_range, file_path, start, end)))
+                start, future = in_flight.popleft()
+                try:
+                    pages = future.result()
+                except Exception:
+                    # A range that fails in a worker ends the document like a failed read does
+                    for _, pending in in_flight:
+                        pending.cancel()
+                    yield "Error reading PDF"
+                    return
+                yield from _traced_pages(pages, start)
     
     @staticmethod
     def parse_docx(file_path: str) -> str:
-        try:
-            doc = docx.Document(file_path)
-            return "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        except:
-            return "Error reading DOCX"
+        import docx
+
+        with get_tracer().span("parse", format="docx") as span:
+            try:
+                doc = docx.Document(file_path)
+                text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+                span.set(chars=len(text))
+                return text
+            except Exception as e:
+                span.set_error(e)
+                return "Error reading DOCX"
     
     @staticmethod
     def parse_txt(file_path: str) -> str:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
-        except:
-            return "Error reading TXT"
+        with get_tracer().span("parse", format="txt") as span:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    text = file.read()
+                span.set(chars=len(text))
+                return text
+            except Exception as e:
+                span.set_error(e)
+                return "Error reading TXT"
     
     @staticmethod
     def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
@@ -38,4 +129,105 @@ class DocumentParser:
         for i in range(0, len(words), chunk_size - overlap):
             chunk = " ".join(words[i:i + chunk_size])
             chunks.append(chunk)
-        return chunks if chunks else ["No content to process"]
\ No newline at end of file
+        return chunks if chunks else ["No content to process"]
+
+    @staticmethod
+    def stream_chunks(texts: Iterable[str], chunk_size: int = 500, overlap: int = 50) -> Iterator[str]:
+        """
+        Generator version of chunk_text over pieces of text (e.g. pages) that are
+        concatenated as-is; yields exactly the chunks chunk_text("".join(texts))
+        would return, but as soon as each window is full.
+        """
+        step = chunk_size - overlap
+        window = []
+        carry = ""  # a word cut off at the end of the previous piece
+        for text in texts:
+            if not text:
+                continue
+            words = text.split()
+            if carry:
+                if words and not text[0].isspace():
+                    words[0] = carry + words[0]
+                else:
+                    words.insert(0, carry)
+                carry = ""
+            if words and not text[-1].isspace():
+                carry = words.pop()
+            window.extend(words)
+
+            while len(window) >= chunk_size:
+                yield " ".join(window[:chunk_size])
+                del window[:step]
+
+        if carry:
+            window.append(carry)
+        for i in range(0, len(window), step):
+            yield " ".join(window[i:i + chunk_size])
+
+    @staticmethod
+    def chunk_tokens(text: str, tokenizer, max_tokens: int = 254, overlap: int = 32) -> List[Dict]:
+        """
+        Split text into windows of at most max_tokens tokens of the embedding
+        model's own tokenizer, overlapping by `overlap` tokens.
+        Returns [{"text", "start", "end"}] with character offsets into text.
+        """
+        return list(DocumentParser.stream_token_chunks([text], tokenizer, max_tokens, overlap))
+
+    @staticmethod
+    def stream_token_chunks(
+        texts: Iterable[str],
+        tokenizer,
+        max_tokens: int = 254,
+        overlap: int = 32,
+        batch_pages: int = 16
+    ) -> Iterator[Dict]:
+        """
+        Streaming chunk_tokens over pieces of text (e.g. pages) concatenated as-is.
+        Pieces are tokenized batch_pages at a time in one tokenizer call, and
+        offsets are relative to the concatenated text.
+        """
+        step = max_tokens - overlap
+        texts = iter(texts)
+        spans = []      # (start, end) of each pending token, in document offsets
+        buffer = ""     # document text from buffer_start onwards
+        buffer_start = 0
+        doc_end = 0
+        emitted = False
+
+        def window(tokens):
+            start, end = tokens[0][0], tokens[-1][1]
+            return {
+                "text": buffer[start - buffer_start:end - buffer_start],
+                "start": start,
+                "end": end
+            }
+
+        while True:
+            group = list(islice(texts, batch_pages))
+            if not group:
+                break
+            group = [text for text in group if text]
+            if not group:
+                continue
+
+            with get_tracer().span("chunk", pages=len(group)) as trace_span:
+                pending = len(spans)
+                encoded = tokenizer(group, add_special_tokens=False, return_offsets_mapping=True)
+                for text, offsets in zip(group, encoded["offset_mapping"]):
+                    spans.extend((doc_end + start, doc_end + end) for start, end in offsets if end > start)
+                    doc_end += len(text)
+                buffer += "".join(group)
+                trace_span.set(tokens=len(spans) - pending, chars=sum(len(text) for text in group))
+
+            while len(spans) >= max_tokens:
+                yield window(spans[:max_tokens])
+                emitted = True
+                del spans[:step]
+                # Forget text no pending token can reach any more
+                cut = spans[0][0] if spans else doc_end
+                buffer = buffer[cut - buffer_start:]
+                buffer_start = cut
+
+        # The tail is only worth a chunk if it holds tokens the last window didn't
+        if spans and (not emitted or len(spans) > overlap):
+            yield window(spans)
\ No newline at end of file
@@ -0,0 +1,101 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.embedding_backends import TORCH, load_backend
+from backend.tracing import get_tracer
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+
+class BatchingEmbedder:
+    """
+    One embedding model shared by every caller in the process.
+
+    encode() calls are put on a queue; a single worker thread gathers them
+    into one forward pass (up to max_batch_size texts, waiting at most
+    max_wait_ms for more callers) and hands each caller its own rows back.
+    The model runs on an embedding backend (backend.embedding_backends):
+    PyTorch sentence-transformers by default, or ONNX Runtime.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, max_batch_size: int = 64, max_wait_ms: float = 10.0,
+                 backend: Optional[str] = None, threads: Optional[int] = None):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.backend = load_backend(model_name, backend, threads)
+        # Identifies the vectors (e.g. in the embedding cache); the int8 backend has its own
+        self.model_name = self.backend.name
+        self.dimension = self.backend.dimension
+        # Chunkers size their windows to what the model actually reads
+        self.tokenizer = self.backend.tokenizer
+        self.max_tokens = self.backend.max_seq_length - self.tokenizer.num_special_tokens_to_add(pair=False)
+
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedder", daemon=True)
+        self._worker.start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype='float32')
+
+        future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+
+            # Keep collecting callers until the batch is full or the wait runs out
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                with get_tracer().span("embed.encode", texts=len(texts), requests=len(batch)):
+                    vectors = self.backend.encode(texts, self.max_batch_size)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            # Split the forward pass back into per-caller results
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+_embedders: Dict[Tuple[str, str], BatchingEmbedder] = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embedder(model_name: str = MODEL_NAME, backend: Optional[str] = None) -> BatchingEmbedder:
+    """Return the process-wide embedder for model_name, loading it on first use."""
+    backend = backend or os.getenv("NOTEMATE_EMBED_BACKEND") or TORCH
+    with _embedders_lock:
+        if (model_name, backend) not in _embedders:
+            _embedders[(model_name, backend)] = BatchingEmbedder(
+                model_name,
+                max_batch_size=int(os.getenv("NOTEMATE_EMBED_BATCH_SIZE", "64")),
+                max_wait_ms=float(os.getenv("NOTEMATE_EMBED_MAX_WAIT_MS", "10")),
+                backend=backend
+            )
+        return _embedders[(model_name, backend)]
@@ -0,0 +1,153 @@
+import json
+import os
+from typing import List, Optional
+
+import numpy as np
+
+TORCH = "torch"
+ONNX = "onnx"
+ONNX_INT8 = "onnx-int8"
+EMBEDDING_BACKENDS = (TORCH, ONNX, ONNX_INT8)
+
+# Files written by scripts/export_onnx.py next to the tokenizer files
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+ONNX_META_FILE = "notemate_embedder.json"
+
+
+class SentenceTransformerBackend:
+    """The default: the sentence-transformers model running on PyTorch."""
+
+    def __init__(self, model_name: str, threads: Optional[int] = None):
+        # Imported here so the ONNX path never loads torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name)
+        self.name = model_name
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.tokenizer = self.model.tokenizer
+        self.max_seq_length = self.model.max_seq_length
+
+    def encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True).astype('float32')
+
+
+class TokenizerFiles:
+    """
+    The part of the transformers tokenizer API the chunkers use, over the
+    bare tokenizers library, so the ONNX path never imports transformers
+    (which loads torch when it is installed).
+    """
+
+    def __init__(self, model_dir: str):
+        from tokenizers import Tokenizer
+
+        path = os.path.join(model_dir, "tokenizer.json")
+        self._plain = Tokenizer.from_file(path)
+        self._plain.no_truncation()
+        self._plain.no_padding()
+
+    def num_special_tokens_to_add(self, pair: bool = False) -> int:
+        processor = self._plain.post_processor
+        return processor.num_special_tokens_to_add(pair) if processor else 0
+
+    def __call__(self, texts: List[str], add_special_tokens: bool = True, return_offsets_mapping: bool = False):
+        encodings = self._plain.encode_batch(texts, add_special_tokens=add_special_tokens)
+        result = {"input_ids": [e.ids for e in encodings]}
+        if return_offsets_mapping:
+            result["offset_mapping"] = [e.offsets for e in encodings]
+        return result
+
+
+class OnnxBackend:
+    """
+    The same transformer exported to ONNX by scripts/export_onnx.py, run on
+    ONNX Runtime. Mean pooling and L2 normalization are done in numpy the
+    way sentence-transformers does them, so the vectors match the PyTorch
+    path and existing indexes stay valid. quantized=True loads the int8
+    dynamic-quantized export instead.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = False, threads: Optional[int] = None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The ONNX embedding backend needs onnxruntime: pip install onnxruntime")
+        from tokenizers import Tokenizer
+
+        meta_path = os.path.join(model_dir, ONNX_META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"No ONNX export in {model_dir}; run scripts/export_onnx.py first")
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE),
+            options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+        self.max_seq_length = meta["max_seq_length"]
+        self.dimension = meta["dimension"]
+        self.normalize = meta.get("normalize", True)
+        # int8 vectors are close but not identical, so they get their own embedding-cache rows
+        self.name = meta["model_name"] + ("-onnx-int8" if quantized else "")
+
+        self.tokenizer = TokenizerFiles(model_dir)
+        # A second instance set up for model input: truncated like sentence-transformers, padded per batch
+        self._encoder = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._encoder.enable_truncation(self.max_seq_length)
+        pad_token = meta.get("pad_token", "[PAD]")
+        self._encoder.enable_padding(pad_id=self._encoder.token_to_id(pad_token) or 0, pad_token=pad_token)
+
+    def encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        vectors = np.empty((len(texts), self.dimension), dtype='float32')
+        # Longest first, so each batch pads to texts of similar length
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            encodings = self._encoder.encode_batch([texts[i] for i in rows])
+            inputs = {
+                "input_ids": np.array([e.ids for e in encodings], dtype='int64'),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype='int64'),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype='int64')
+            }
+            hidden = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+
+            weights = inputs["attention_mask"][..., None].astype('float32')
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors[rows] = pooled
+        return vectors
+
+
+def default_onnx_dir(model_name: str) -> str:
+    return os.path.join("models", f"{model_name.replace('/', '_')}-onnx")
+
+
+def load_backend(model_name: str, backend: Optional[str] = None, threads: Optional[int] = None):
+    """
+    Backend by name: torch (default), onnx or onnx-int8, from
+    NOTEMATE_EMBED_BACKEND when not given. NOTEMATE_EMBED_THREADS sets the
+    CPU threads; NOTEMATE_ONNX_MODEL_DIR where the ONNX export lives.
+    """
+    backend = backend or os.getenv("NOTEMATE_EMBED_BACKEND") or TORCH
+    if threads is None and os.getenv("NOTEMATE_EMBED_THREADS"):
+        threads = int(os.getenv("NOTEMATE_EMBED_THREADS"))
+
+    if backend == TORCH:
+        return SentenceTransformerBackend(model_name, threads)
+    if backend in (ONNX, ONNX_INT8):
+        model_dir = os.getenv("NOTEMATE_ONNX_MODEL_DIR") or default_onnx_dir(model_name)
+        return OnnxBackend(model_dir, quantized=backend == ONNX_INT8, threads=threads)
+    raise ValueError(f"Unknown embedding backend: {backend} (expected one of {', '.join(EMBEDDING_BACKENDS)})")
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+KEY_SIZE = 16  # bytes of blake2b digest per cached row
+
+
+class EmbeddingCache:
+    """
+    Content-addressed store of chunk embeddings on local disk.
+
+    Vectors live in one raw matrix file per dtype (vectors.<dtype>) that is
+    memory-mapped for reads; keys.<dtype>.bin holds one digest of (model
+    name, chunk text) per row of that matrix, in row order, so the hash ->
+    row index is rebuilt by reading a single file. info.<dtype>.json records
+    the dimension the rows were written with.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dimension: int, dtype: str = 'float32'):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.path = os.path.join(cache_dir, model_name.replace('/', '_'))
+        self.vectors_file = os.path.join(self.path, f"vectors.{self.dtype.name}")
+        # Each matrix has its own key list: rows of one dtype mean nothing to another
+        self.keys_file = os.path.join(self.path, f"keys.{self.dtype.name}.bin")
+        self.info_file = os.path.join(self.path, f"info.{self.dtype.name}.json")
+
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._vectors = None
+
+        os.makedirs(self.path, exist_ok=True)
+        self._migrate_shared_keys()
+        self._check_info()
+        self._load_keys()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.blake2b(
+            f"{self.model_name}\0{text}".encode('utf-8'),
+            digest_size=KEY_SIZE
+        ).digest()
+
+    def _migrate_shared_keys(self):
+        # Caches written before per-dtype key files shared one keys.bin, and
+        # float32 was the only dtype then; keep it only where it fits that matrix
+        legacy = os.path.join(self.path, "keys.bin")
+        if not os.path.exists(legacy):
+            return
+        float32_vectors = os.path.join(self.path, "vectors.float32")
+        float32_keys = os.path.join(self.path, "keys.float32.bin")
+        n_vectors = os.path.getsize(float32_vectors) // (self.dimension * 4) if os.path.exists(float32_vectors) else 0
+        if not os.path.exists(float32_keys) and os.path.getsize(legacy) // KEY_SIZE <= n_vectors:
+            os.replace(legacy, float32_keys)
+        else:
+            os.remove(legacy)
+
+    def _check_info(self):
+        info = {"model": self.model_name, "dimension": self.dimension, "dtype": self.dtype.name}
+        try:
+            with open(self.info_file, 'r') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = None
+        if stored == info:
+            return
+        if stored is not None or not os.path.exists(self.keys_file):
+            # Rows written for another shape (or with no record of it) can't be trusted: start over
+            for path in (self.vectors_file, self.keys_file):
+                if os.path.exists(path):
+                    os.remove(path)
+        with open(self.info_file, 'w') as f:
+            json.dump(info, f)
+
+    def _load_keys(self):
+        if not os.path.exists(self.keys_file):
+            return
+        with open(self.keys_file, 'rb') as f:
+            data = f.read()
+
+        # Vectors are written before keys, so more rows than keys is a torn
+        # append; more keys than rows means the files don't belong together
+        row_bytes = self.dimension * self.dtype.itemsize
+        n_vectors = os.path.getsize(self.vectors_file) // row_bytes if os.path.exists(self.vectors_file) else 0
+        n_keys = len(data) // KEY_SIZE
+        if n_keys > n_vectors:
+            for path in (self.vectors_file, self.keys_file):
+                if os.path.exists(path):
+                    os.truncate(path, 0)
+            return
+        n_rows = n_keys
+
+        # Drop any half-written tail (down to a partial row) so the next append lands on row n_rows
+        if os.path.exists(self.vectors_file) and os.path.getsize(self.vectors_file) != n_rows * row_bytes:
+            os.truncate(self.vectors_file, n_rows * row_bytes)
+        if len(data) != n_rows * KEY_SIZE:
+            os.truncate(self.keys_file, n_rows * KEY_SIZE)
+
+        for row in range(n_rows):
+            self._rows[data[row * KEY_SIZE:(row + 1) * KEY_SIZE]] = row
+
+    def _matrix(self) -> np.ndarray:
+        # Re-map whenever rows were appended since the last mapping
+        if self._vectors is None or len(self._vectors) < len(self._rows):
+            self._vectors = np.memmap(
+                self.vectors_file,
+                dtype=self.dtype,
+                mode='r',
+                shape=(len(self._rows), self.dimension)
+            )
+        return self._vectors
+
+    def lookup(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Returns a float32 matrix with one row per text (zeros where the text is
+        not cached) and the positions of the texts that still need encoding.
+        """
+        embeddings = np.zeros((len(texts), self.dimension), dtype='float32')
+        with self._lock:
+            rows = [self._rows.get(self._key(text)) for text in texts]
+            hits = [(i, row) for i, row in enumerate(rows) if row is not None]
+            if hits:
+                positions, cached_rows = zip(*hits)
+                embeddings[list(positions)] = self._matrix()[list(cached_rows)]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        return embeddings, missing
+
+    def add(self, texts: List[str], embeddings: np.ndarray):
+        with self._lock:
+            new_keys = []
+            new_rows = []
+            seen = set()
+            for text, vector in zip(texts, embeddings):
+                key = self._key(text)
+                if key in self._rows or key in seen:
+                    continue
+                seen.add(key)
+                new_keys.append(key)
+                new_rows.append(vector)
+            if not new_keys:
+                return
+
+            with open(self.vectors_file, 'ab') as f:
+                f.write(np.asarray(new_rows, dtype=self.dtype).tobytes())
+            with open(self.keys_file, 'ab') as f:
+                f.write(b"".join(new_keys))
+
+            start = len(self._rows)
+            for offset, key in enumerate(new_keys):
+                self._rows[key] = start + offset
+
+
+_caches: Dict[Tuple[str, str, str], EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(cache_dir: str, model_name: str, dimension: int) -> EmbeddingCache:
+    """Return the process-wide cache for (cache_dir, model_name) so appends never race."""
+    dtype = os.getenv("NOTEMATE_EMBED_CACHE_DTYPE", "float32")
+    key = (os.path.abspath(cache_dir), model_name, dtype)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(cache_dir, model_name, dimension, dtype=dtype)
+        return _caches[key]
@@ -1,14 +1,67 @@
-from groq import Groq
-from typing import List, Dict
+from typing import TYPE_CHECKING, List, Dict, Iterator, Optional
+import asyncio
 import os
+import time
+
+from backend.context_packer import ContextPacker
+from backend.llm_client import get_llm_pool
+from backend.response_cache import ResponseCache
+from backend.tracing import get_tracer
+
+if TYPE_CHECKING:
+    from groq import AsyncGroq, Groq
+
+# Calls return (or, streaming, yield) this instead of raising
+ERROR_PREFIX = "Error generating content"
+
+
+def is_error_reply(text: str) -> bool:
+    # Anywhere, not just at the start: a stream that fails midway appends it to the partial reply
+    return ERROR_PREFIX in text
+
+
+def _usage_attributes(usage) -> Dict[str, int]:
+    # Token counts Groq reports for a call (absent on some error paths)
+    if usage is None:
+        return {}
+    return {"prompt_tokens": usage.prompt_tokens or 0, "completion_tokens": usage.completion_tokens or 0}
+
 
 class ContentGenerator:
-    def __init__(self, api_key: str):
-        self.client = Groq(api_key=api_key)
+    def __init__(self, api_key: str, cache: Optional[ResponseCache] = None, base_url: Optional[str] = None):
+        self.api_key = api_key
+        # None falls back to GROQ_BASE_URL / api.groq.com; benchmarks point it at a local stub
+        self.base_url = base_url
+        # Shared by every generator with the same key: one pooled client,
+        # a global concurrency cap, coalescing of identical calls, retries
+        self.pool = get_llm_pool(api_key, base_url)
         self.model = "llama-3.3-70b-versatile"   # fast + free + powerful
+        self.temperature = 0.7
+        self.max_tokens = 2000
+        # Identical prompts on the same notes come back from disk instead of Groq
+        self.cache = cache if cache is not None else ResponseCache()
+        # Dedups and trims retrieved chunks to a per-feature token budget
+        self.packer = ContextPacker()
+
+    @property
+    def client(self) -> "Groq":
+        # groq (and httpx) are imported on the first call, not when the page loads
+        return self.pool.client
+
+    def _request(self, full_prompt: str) -> Dict:
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": full_prompt}],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+
+    def _complete(self, full_prompt: str):
+        resp, retries = self.pool.create(**self._request(full_prompt))
+        return resp.choices[0].message.content, {"retries": retries, **_usage_attributes(resp.usage)}
 
-    def generate_with_context(self, prompt: str, context: List[str]) -> str:
-        context_text = "\n\n".join(context)
+    def _build_prompt(self, prompt: str, context: List[str], feature: Optional[str] = None) -> str:
+        context_text = "\n\n".join(self.packer.pack(context, feature))
 
         full_prompt = f"""
 Use ONLY the following context extracted from notes:
@@ -21,25 +74,149 @@ Now perform this task:
 
 Your answer must stay grounded in the context.
 """
-
-        try:
-            resp = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": full_prompt}],
-                temperature=0.7,
-                max_tokens=2000
-            )
-            return resp.choices[0].message.content
-        except Exception as e:
-            return f"Error generating content: {e}"
+        return full_prompt
+
+    def generate_with_context(self, prompt: str, context: List[str], use_cache: bool = True,
+                              feature: Optional[str] = None) -> str:
+        full_prompt = self._build_prompt(prompt, context, feature)
+
+        # use_cache=False asks for a new variation; it still refreshes the cache
+        cache_key = ResponseCache.make_key(self.model, self.temperature, self.max_tokens, full_prompt)
+        with get_tracer().span("llm.call", feature=feature or "", model=self.model, stream=False) as span:
+            if use_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    span.set(cache_hits=1)
+                    return cached
+            span.set(cache_hits=0)
+
+            try:
+                if use_cache:
+                    # Identical requests already in flight (a class opening the same notes) share one call
+                    (content, usage), coalesced = self.pool.flights.do(cache_key, lambda: self._complete(full_prompt))
+                else:
+                    (content, usage), coalesced = self._complete(full_prompt), False
+            except Exception as e:
+                span.set(retries=getattr(e, "retries", 0))
+                span.set_error(e)
+                return f"{ERROR_PREFIX}: {e}"
+            span.set(coalesced=int(coalesced), **({} if coalesced else usage))
+
+        if not coalesced:
+            self.cache.put(cache_key, content)
+        return content
+
+    def stream_with_context(self, prompt: str, context: List[str], use_cache: bool = True,
+                            feature: Optional[str] = None) -> Iterator[str]:
+        """
+        Same as generate_with_context, but yields text deltas as Groq produces
+        them. A cache hit is yielded in one piece; a completed stream is cached.
+        Readers of an identical stream already in flight join it and replay it
+        from the start.
+        """
+        full_prompt = self._build_prompt(prompt, context, feature)
+
+        cache_key = ResponseCache.make_key(self.model, self.temperature, self.max_tokens, full_prompt)
+        # Timed by hand: a span can't stay open across yields to the caller
+        tracer = get_tracer()
+        start = time.perf_counter()
+        attributes = {"feature": feature or "", "model": self.model, "stream": True}
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                tracer.record("llm.call", time.perf_counter() - start, cache_hits=1, **attributes)
+                yield cached
+                return
+        # The upstream call runs on its own thread and caches the reply when it
+        # completes, even if this reader stops early (e.g. a Streamlit rerun)
+        flight, coalesced = self.pool.stream(
+            cache_key if use_cache else None,
+            on_complete=lambda text: self.cache.put(cache_key, text),
+            **self._request(full_prompt)
+        )
+        attributes.update(cache_hits=0, coalesced=int(coalesced))
+
+        for i, delta in enumerate(flight.follow()):
+            if i == 0:
+                attributes["first_token_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            yield delta
+
+        if flight.error is not None:
+            tracer.record("llm.call", time.perf_counter() - start, error=flight.error, **attributes)
+            yield f"{ERROR_PREFIX}: {flight.error}"
+            return
+        if not coalesced:
+            attributes.update(flight.usage)
+        tracer.record("llm.call", time.perf_counter() - start, **attributes)
+
+    def async_client(self) -> "AsyncGroq":
+        # Bound to the running event loop, so create one per asyncio.run()
+        return self.pool.async_client()
+
+    async def agenerate_with_context(
+        self,
+        prompt: str,
+        context: List[str],
+        client: "AsyncGroq",
+        semaphore: Optional[asyncio.Semaphore] = None,
+        use_cache: bool = True,
+        feature: Optional[str] = None,
+        max_retries: Optional[int] = None
+    ) -> str:
+        """
+        Async generate_with_context for running several features at once.
+        semaphore caps this caller's concurrent Groq calls, on top of the
+        pool's global limit; rate-limit (429) and 5xx replies are retried
+        with backoff (see backend.llm_client), up to max_retries times
+        (default: the pool's NOTEMATE_LLM_MAX_RETRIES).
+        """
+        full_prompt = self._build_prompt(prompt, context, feature)
+
+        cache_key = ResponseCache.make_key(self.model, self.temperature, self.max_tokens, full_prompt)
+        with get_tracer().span("llm.call", feature=feature or "", model=self.model, stream=False) as span:
+            if use_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    span.set(cache_hits=1)
+                    return cached
+            span.set(cache_hits=0)
+
+            async def complete():
+                resp, retries = await self.pool.acreate(
+                    client, semaphore, max_retries=max_retries, **self._request(full_prompt)
+                )
+                return resp.choices[0].message.content, {"retries": retries, **_usage_attributes(resp.usage)}
+
+            try:
+                if use_cache:
+                    (content, usage), coalesced = await self.pool.flights.ado(cache_key, complete)
+                else:
+                    (content, usage), coalesced = await complete(), False
+            except Exception as e:
+                span.set(retries=getattr(e, "retries", 0))
+                span.set_error(e)
+                return f"{ERROR_PREFIX}: {e}"
+            span.set(coalesced=int(coalesced), **({} if coalesced else usage))
+
+        if not coalesced:
+            self.cache.put(cache_key, content)
+        return content
+
+    def _generate(self, prompt: str, context: List[str], use_cache: bool, stream: bool, feature: str):
+        if stream:
+            return self.stream_with_context(prompt, context, use_cache, feature)
+        return self.generate_with_context(prompt, context, use_cache, feature)
 
     # QUIZ
-    def generate_quiz(self, context: List[str], num_questions: int = 5, quiz_type: str = "mcq") -> Dict:
+    def generate_quiz(self, context: List[str], num_questions: int = 5, quiz_type: str = "mcq", use_cache: bool = True) -> Dict:
         """
         Generate a quiz with a strict, clean structure.
         Returns: {"content": <formatted string>}
         """
+        response = self.generate_with_context(self.quiz_prompt(num_questions, quiz_type), context, use_cache, "quiz")
+        return {"content": response}
 
+    def quiz_prompt(self, num_questions: int = 5, quiz_type: str = "mcq") -> str:
         if quiz_type == "mcq":
             prompt = f"""
 You are an exam generator.
@@ -108,14 +285,15 @@ Answer: <2–4 line answer>
 
 No introductions, no extra commentary.
 """
-
-        response = self.generate_with_context(prompt, context)
-        return {"content": response}
+        return prompt
 
 
     # LESSON
-    def generate_lesson(self, topic, context):
-        prompt = f"""
+    def generate_lesson(self, topic, context, use_cache=True, stream=False):
+        return self._generate(self.lesson_prompt(topic), context, use_cache, stream, "lesson")
+
+    def lesson_prompt(self, topic):
+        return f"""
 Create a full lesson on '{topic}' including:
 - Learning objectives
 - Introduction
@@ -125,13 +303,17 @@ Create a full lesson on '{topic}' including:
 - Summary
 - Exercise
 """
-        return self.generate_with_context(prompt, context)
 
     # STUDY PLAN
-    def generate_study_plan(self, chapters, days, difficulty):
+    def generate_study_plan(self, chapters, days, difficulty, use_cache=True):
         chapter_text = "\n".join(f"- {c}" for c in chapters)
+        prompt = self.study_plan_prompt(chapters, days, difficulty)
+        return self.generate_with_context(prompt, [chapter_text], use_cache, "study_plan")
 
-        prompt = f"""
+    def study_plan_prompt(self, chapters, days, difficulty):
+        chapter_text = "\n".join(f"- {c}" for c in chapters)
+
+        return f"""
     Create a {days}-day study plan.
     Student level: {difficulty}
 
@@ -142,18 +324,21 @@ Create a full lesson on '{topic}' including:
     Day X | Topics | Activities | Expected Outcomes
     """
 
-        return self.generate_with_context(prompt, [chapter_text])
-
 
     # EXPLAIN AT LEVELS
-    def explain_at_levels(self, concept, context):
-        prompt = f"""
+    def explain_at_levels(self, concept, context, use_cache=True):
+        resp = self.generate_with_context(self.explain_prompt(concept), context, use_cache, "explain")
+        return self.split_levels(resp)
+
+    def explain_prompt(self, concept):
+        return f"""
 Explain '{concept}' at 3 levels:
 BEGINNER:
 INTERMEDIATE:
 ADVANCED:
 """
-        resp = self.generate_with_context(prompt, context)
+
+    def split_levels(self, resp):
         parts = resp.split("\n\n")
         return {
             "beginner": parts[0] if len(parts) else resp,
@@ -162,26 +347,54 @@ ADVANCED:
         }
 
     # STORY
-    def generate_story_mode(self, concept, context):
-        return self.generate_with_context(
-            f"Explain '{concept}' as a creative story.",
-            context
-        )
+    def generate_story_mode(self, concept, context, use_cache=True, stream=False):
+        return self._generate(self.story_prompt(concept), context, use_cache, stream, "story")
+
+    def story_prompt(self, concept):
+        return f"Explain '{concept}' as a creative story."
 
     # MIND MAP
-    def generate_mindmap(self, context):
-        return self.generate_with_context(
-            "Generate a hierarchical mindmap of key concepts.",
-            context
-        )
+    def generate_mindmap(self, context, use_cache=True, stream=False):
+        return self._generate(self.mindmap_prompt(), context, use_cache, stream, "mindmap")
+
+    def mindmap_prompt(self):
+        return "Generate a hierarchical mindmap of key concepts."
 
     # SUMMARY
-    def generate_summary(self, context):
-        return self.generate_with_context("Summarize all key ideas.", context)
+    def generate_summary(self, context, use_cache=True, stream=False):
+        return self._generate(self.summary_prompt(), context, use_cache, stream, "summary")
+
+    def summary_prompt(self):
+        return "Summarize all key ideas."
+
+    # HIERARCHICAL SUMMARIES (built once at ingest)
+    def section_summary_prompt(self):
+        return """
+Summarize this section of the notes in 5-8 sentences.
+Keep every key concept, definition and formula it mentions; do not add anything else.
+"""
+
+    def combine_summaries_prompt(self):
+        return """
+The context is a sequence of summaries of consecutive parts of the notes.
+Combine them into one summary of the whole, in order, keeping every key concept.
+"""
 
     # FLASHCARDS
-    def generate_flashcards(self, context, num_cards=10):
-        return self.generate_with_context(
-            f"Generate {num_cards} flashcards (front/back).",
-            context
-        )
+    def generate_flashcards(self, context, num_cards=10, use_cache=True, stream=False):
+        return self._generate(self.flashcards_prompt(num_cards), context, use_cache, stream, "flashcards")
+
+    def flashcards_prompt(self, num_cards=10):
+        return f"Generate {num_cards} flashcards (front/back)."
+
+    def structured_flashcards_prompt(self, num_cards=10):
+        # Strict layout so sharded runs can parse and merge the cards
+        return f"""
+Create exactly {num_cards} flashcards based ONLY on the context above.
+
+STRICT FORMAT:
+Front: <term or question>
+Back: <definition or answer, 1-2 sentences>
+
+Leave one blank line between cards. No numbering, introductions or extra commentary.
+"""
@@ -0,0 +1,180 @@
+import math
+import os
+from typing import List, Optional
+
+import numpy as np
+
+# faiss is imported inside the functions that need it, so importing this
+# module (e.g. for IndexConfig) doesn't load it before the first index is built
+
+FLAT = "flat"
+HNSW = "hnsw"
+IVF_FLAT = "ivf_flat"
+IVF_PQ = "ivf_pq"
+INDEX_KINDS = (FLAT, HNSW, IVF_FLAT, IVF_PQ)
+
+# How vectors are stored inside the resident index. The segment files always
+# keep float32, which is what re-ranking reads. IVF-PQ has its own codes.
+FLOAT32 = "float32"
+FLOAT16 = "float16"
+INT8 = "int8"
+STORAGE_TYPES = (FLOAT32, FLOAT16, INT8)
+_SCALAR_QUANTIZERS = {FLOAT16: "SQfp16", INT8: "SQ8"}
+
+
+class IndexConfig:
+    """
+    Size thresholds (in vectors) at which a collection switches index type,
+    plus the build and search parameters for each type. A threshold of 0
+    disables that index type.
+
+    storage is the default vector encoding for new collections (float32,
+    float16 or int8 scalar quantization). Searches on a lossy index fetch
+    rerank times more candidates and re-rank them with the exact float32
+    vectors; rerank <= 1 turns that off.
+    """
+
+    def __init__(
+        self,
+        hnsw_min: int = 50_000,
+        ivf_flat_min: int = 200_000,
+        ivf_pq_min: int = 1_000_000,
+        hnsw_m: int = 32,
+        ef_construction: int = 80,
+        ef_search: int = 64,
+        nprobe: int = 16,
+        pq_m: int = 48,
+        train_sample: int = 100_000,
+        storage: str = FLOAT32,
+        rerank: int = 4
+    ):
+        self.hnsw_min = hnsw_min
+        self.ivf_flat_min = ivf_flat_min
+        self.ivf_pq_min = ivf_pq_min
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.train_sample = train_sample
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown vector storage: {storage}")
+        self.storage = storage
+        self.rerank = rerank
+
+    @classmethod
+    def from_env(cls) -> "IndexConfig":
+        config = cls(storage=os.getenv("NOTEMATE_INDEX_STORAGE") or FLOAT32)
+        for name in ("hnsw_min", "ivf_flat_min", "ivf_pq_min", "hnsw_m", "ef_construction",
+                     "ef_search", "nprobe", "pq_m", "train_sample", "rerank"):
+            value = os.getenv(f"NOTEMATE_INDEX_{name.upper()}")
+            if value:
+                setattr(config, name, int(value))
+        return config
+
+    def choose_kind(self, n_vectors: int) -> str:
+        kind = FLAT
+        for candidate, threshold in ((HNSW, self.hnsw_min), (IVF_FLAT, self.ivf_flat_min), (IVF_PQ, self.ivf_pq_min)):
+            if threshold and n_vectors >= threshold:
+                kind = candidate
+        return kind
+
+
+def _nlist(n_vectors: int) -> int:
+    # Rule of thumb from the FAISS wiki: ~4*sqrt(n) lists, at least 39 points each to train
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def _pq_m(dimension: int, wanted: int) -> int:
+    # PQ needs the sub-quantizer count to divide the dimension
+    m = min(wanted, dimension)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def is_lossy(kind: str, storage: str) -> bool:
+    """Whether search distances are approximate, i.e. worth re-ranking."""
+    return kind == IVF_PQ or storage != FLOAT32
+
+
+def build_index(kind: str, dimension: int, vectors: np.ndarray, config: IndexConfig, storage: Optional[str] = None):
+    """
+    Build an index of the given kind and vector storage over vectors (an
+    array or a memmap of float32 rows). An int8 index built over no vectors
+    is left untrained; build it again once there is data.
+    """
+    import faiss
+
+    n_vectors = len(vectors)
+    storage = storage or config.storage
+    codec = _SCALAR_QUANTIZERS.get(storage)
+    if kind == FLAT:
+        index = faiss.index_factory(dimension, codec) if codec else faiss.IndexFlatL2(dimension)
+    elif kind == HNSW:
+        if codec:
+            index = faiss.index_factory(dimension, f"HNSW{config.hnsw_m},{codec}")
+        else:
+            index = faiss.IndexHNSWFlat(dimension, config.hnsw_m)
+        index.hnsw.efConstruction = config.ef_construction
+    elif kind == IVF_FLAT:
+        index = faiss.index_factory(dimension, f"IVF{_nlist(n_vectors)},{codec or 'Flat'}")
+    elif kind == IVF_PQ:
+        index = faiss.index_factory(dimension, f"IVF{_nlist(n_vectors)},PQ{_pq_m(dimension, config.pq_m)}")
+    else:
+        raise ValueError(f"Unknown index kind: {kind}")
+
+    if not index.is_trained:
+        if not n_vectors:
+            return index
+        # Train the coarse quantizer (and PQ codebooks / SQ ranges) on a random sample
+        sample_size = min(n_vectors, config.train_sample)
+        rows = np.sort(np.random.default_rng(0).choice(n_vectors, sample_size, replace=False))
+        index.train(np.ascontiguousarray(vectors[rows], dtype='float32'))
+
+    add_in_blocks(index, vectors)
+    return index
+
+
+def add_in_blocks(index, vectors: np.ndarray, start: int = 0, block: int = 65_536):
+    # Page memmapped vectors in a block at a time instead of all at once
+    for offset in range(start, len(vectors), block):
+        index.add(np.ascontiguousarray(vectors[offset:offset + block], dtype='float32'))
+
+
+def search_params(kind: str, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """
+    Per-call FAISS search parameters, so concurrent queries with different
+    settings never have to mutate the shared index.
+    """
+    import faiss
+
+    if kind == HNSW and ef_search:
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    if kind in (IVF_FLAT, IVF_PQ) and nprobe:
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    return None
+
+
+def exact_rerank(vectors: np.ndarray, query_embedding: np.ndarray, ids: List[int], n_results: int) -> List[int]:
+    """Re-order candidate ids by exact L2 distance to their float32 vectors and keep n_results."""
+    if not ids:
+        return ids
+    candidates = np.asarray(vectors[ids], dtype='float32')
+    distances = ((candidates - query_embedding) ** 2).sum(axis=1)
+    return [ids[i] for i in np.argsort(distances, kind='stable')[:n_results]]
+
+
+def index_memory_bytes(index, kind: str) -> int:
+    import faiss
+
+    n_vectors = index.ntotal
+    dimension = index.d
+    if kind == HNSW:
+        # Vector codes plus roughly 2*M neighbour ids per vector on level 0
+        code_size = faiss.downcast_index(index.storage).code_size
+        return n_vectors * (code_size + index.hnsw.nb_neighbors(0) * 4)
+    if kind in (IVF_FLAT, IVF_PQ):
+        ivf = faiss.extract_index_ivf(index)
+        return n_vectors * (ivf.code_size + 8) + ivf.nlist * dimension * 4
+    return n_vectors * index.code_size
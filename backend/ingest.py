@@ -0,0 +1,151 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import os
+
+from backend.catalog import CollectionCatalog
+from backend.dedup import NearDuplicateFilter, save_duplicate_refs
+from backend.document_parser import DocumentParser
+from backend.rag_engine import RAGEngine
+from backend.summary_tree import build_summary_tree, load_summary_tree
+from backend.tracing import get_tracer
+
+# Stored for a document with no text, so its collection still opens and answers queries
+EMPTY_DOCUMENT = "No content to process"
+
+
+def iter_document_text(file_path: str, workers: Optional[int] = None) -> Iterator[str]:
+    """Yield a document's text piece by piece: page by page for PDFs, whole for DOCX/TXT."""
+    if file_path.endswith('.pdf'):
+        yield from DocumentParser.iter_pdf_pages(file_path, workers=workers)
+    elif file_path.endswith('.docx'):
+        yield DocumentParser.parse_docx(file_path)
+    else:
+        yield DocumentParser.parse_txt(file_path)
+
+
+def ingest_file(
+    rag_engine: RAGEngine,
+    collection_name: str,
+    file_path: str,
+    batch_size: int = 256,
+    workers: Optional[int] = None,
+    on_progress: Optional[Callable[..., None]] = None,
+    storage: Optional[str] = None,
+    dedup_threshold: Optional[float] = None
+) -> int:
+    """
+    Parse, chunk and index a file as a stream: pages are extracted in parallel,
+    chunked as they arrive, and every batch_size chunks go to add_documents,
+    so embedding starts after the first pages instead of after the last.
+
+    Chunks are sized in the embedding model's own tokens, so no chunk is
+    longer than what the model reads; their character offsets are stored.
+
+    on_progress(stage, **counters), if given, is called after every page and
+    every batch with pages_parsed / chunks_embedded / duplicates_removed /
+    bytes_written; it may raise to abort the ingest (e.g. a cancelled
+    background job).
+    storage is the collection's vector encoding (see RAGEngine.create_collection).
+
+    Near-duplicate chunks (repeated headers, footers, copied paragraphs) are
+    dropped before embedding: only the first copy is stored, and the spans
+    of the others are saved as back-references to it (backend.dedup).
+    dedup_threshold is the similarity that counts as a duplicate, default
+    NOTEMATE_DEDUP_THRESHOLD or 0.8; 0 keeps every chunk.
+    Returns the number of chunks indexed.
+    """
+    if dedup_threshold is None:
+        dedup_threshold = float(os.getenv("NOTEMATE_DEDUP_THRESHOLD", "0.8"))
+    with get_tracer().span("ingest", collection=collection_name) as span:
+        total, removed = _ingest(
+            rag_engine, collection_name, file_path, batch_size, workers, on_progress, storage, dedup_threshold
+        )
+        span.set(chunks=total, duplicates=removed)
+    return total
+
+
+def _ingest(rag_engine, collection_name, file_path, batch_size, workers, on_progress, storage,
+            dedup_threshold) -> Tuple[int, int]:
+    report = on_progress or (lambda stage, **counters: None)
+    rag_engine.create_collection(collection_name, storage)
+
+    def pages():
+        for pages_parsed, text in enumerate(iter_document_text(file_path, workers), start=1):
+            report("parsing", pages_parsed=pages_parsed)
+            yield text
+
+    embedder = rag_engine.embedder
+    chunks = DocumentParser.stream_token_chunks(pages(), embedder.tokenizer, max_tokens=embedder.max_tokens)
+
+    dedup = NearDuplicateFilter(dedup_threshold) if dedup_threshold > 0 else None
+    refs = {}
+
+    total = 0
+    batch = []
+    for chunk in unique_chunks(chunks, dedup, refs):
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            _add_batch(rag_engine, collection_name, batch)
+            total += len(batch)
+            batch = []
+            report("embedding", chunks_embedded=total, duplicates_removed=dedup.removed if dedup else 0,
+                   bytes_written=rag_engine.disk_bytes(collection_name))
+
+    if batch:
+        _add_batch(rag_engine, collection_name, batch)
+        total += len(batch)
+    elif total == 0:
+        # Same placeholder chunk_text returns for an empty document
+        rag_engine.add_documents(collection_name, [EMPTY_DOCUMENT])
+        total = 1
+
+    removed = dedup.removed if dedup else 0
+    save_duplicate_refs(rag_engine.db_path, collection_name, refs, removed)
+    report("embedding", chunks_embedded=total, duplicates_removed=removed,
+           bytes_written=rag_engine.disk_bytes(collection_name))
+    return total, removed
+
+
+def unique_chunks(chunks: Iterable[Dict], dedup: Optional[NearDuplicateFilter],
+                  refs: Dict[int, List[Tuple[int, int]]]) -> Iterator[Dict]:
+    """
+    The chunks that are not near-duplicates of an earlier one. A dropped
+    chunk's span is added to refs under the id of the chunk it repeats.
+    """
+    kept = 0
+    for chunk in chunks:
+        # Ids are assigned in order, so the next kept chunk gets id kept
+        duplicate_of = dedup.add(chunk["text"], kept) if dedup else None
+        if duplicate_of is not None:
+            refs.setdefault(duplicate_of, []).append((chunk["start"], chunk["end"]))
+            continue
+        kept += 1
+        yield chunk
+
+
+def _add_batch(rag_engine: RAGEngine, collection_name: str, batch):
+    rag_engine.add_documents(
+        collection_name,
+        [chunk["text"] for chunk in batch],
+        spans=[(chunk["start"], chunk["end"]) for chunk in batch]
+    )
+
+
+def make_ingest_job(rag_engine: RAGEngine, file_path: str, file_name: str, content_hash: str, generator=None):
+    """
+    Target for backend.jobs.WorkerPool.submit: ingests the file with progress
+    reported on the job, records it in the catalog and, when a generator is
+    given, builds the summary tree. The job's result is the collection name.
+    """
+    def run(job):
+        collection_name = CollectionCatalog.collection_name_for(file_name, content_hash)
+        num_chunks = ingest_file(rag_engine, collection_name, file_path, on_progress=job.update)
+        rag_engine.catalog.add(content_hash, collection_name, file_name, num_chunks)
+
+        if generator is not None and not load_summary_tree(rag_engine.db_path, collection_name):
+            job.update("summarizing")
+            # job.update also stops the build if the job is cancelled meanwhile
+            build_summary_tree(rag_engine, generator, collection_name, on_progress=job.update)
+        return collection_name
+
+    return run
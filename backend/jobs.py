@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """One background job: its state, per-stage progress counters and a cancel flag."""
+
+    def __init__(self, owner: str, target: Callable[["Job"], object], description: str = "", key: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner  # whose queue it waits in
+        self.owners = {owner}  # everyone waiting on it, including owners whose duplicate submit joined it
+        self.key = key
+        self.description = description
+        self.target = target
+
+        self.state = QUEUED
+        self.stage = "queued"
+        self.progress: Dict[str, int] = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def finished_state(self) -> bool:
+        return self.state in (DONE, FAILED, CANCELLED)
+
+    def update(self, stage: Optional[str] = None, **counters):
+        """Record progress; also the point where a running job notices cancellation."""
+        if stage:
+            self.stage = stage
+        self.progress.update(counters)
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        self._cancel.set()
+
+
+class WorkerPool:
+    """
+    Shared pool of worker threads with one queue per owner (e.g. a browser
+    session). Workers take jobs round-robin across owners, so one user
+    uploading many files can't starve everyone else.
+    """
+
+    def __init__(self, workers: int = 2, keep_finished: int = 200):
+        self.keep_finished = keep_finished
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, owner: str, target: Callable[[Job], object], description: str = "",
+               key: Optional[str] = None) -> Job:
+        with self._cond:
+            # The same work (e.g. the same file content) is only ever queued once
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and not job.finished_state:
+                        job.owners.add(owner)
+                        return job
+
+            job = Job(owner, target, description, key)
+            self._jobs[job.id] = job
+            self._queues.setdefault(owner, deque()).append(job)
+            self._cond.notify()
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str, owner: str) -> bool:
+        """
+        Withdraw owner from the job; it is only cancelled once no owner is
+        left waiting on it. Returns False if owner wasn't waiting on it.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or owner not in job.owners:
+                return False
+            job.owners.discard(owner)
+            if job.owners or job.finished_state:
+                return True
+            job.cancel()
+            if job.state == QUEUED:
+                self._queues[job.owner].remove(job)
+                self._finish(job, CANCELLED)
+            return True
+
+    def queue_position(self, job_id: str) -> int:
+        """How many queued jobs will be started before this one."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != QUEUED:
+                return 0
+            ahead = 0
+            own_index = self._queues[job.owner].index(job)
+            before_me = True
+            for owner, queue in self._queues.items():
+                if owner == job.owner:
+                    before_me = False
+                    ahead += own_index
+                else:
+                    # Owners earlier in the rotation get one more turn first
+                    ahead += min(len(queue), own_index + before_me)
+            return ahead
+
+    def _next_job(self) -> Job:
+        with self._cond:
+            while True:
+                for owner in list(self._queues):
+                    queue = self._queues[owner]
+                    if not queue:
+                        del self._queues[owner]
+                        continue
+                    job = queue.popleft()
+                    # Rotate: this owner goes to the back of the line
+                    self._queues.move_to_end(owner)
+                    job.state = RUNNING
+                    job.started = time.time()
+                    return job
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            try:
+                job.check_cancelled()
+                job.result = job.target(job)
+                state = DONE
+            except JobCancelled:
+                state = CANCELLED
+            except Exception as e:
+                job.error = str(e)
+                state = FAILED
+            with self._cond:
+                self._finish(job, state)
+
+    def _finish(self, job: Job, state: str):
+        job.state = state
+        job.stage = state
+        job.finished = time.time()
+        # Keep a bounded history so pollers can still read recent results
+        finished = [j for j in self._jobs.values() if j.finished_state]
+        for old in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[old.id]
+
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> WorkerPool:
+    """Process-wide pool shared by every session (NOTEMATE_INGEST_WORKERS threads)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(workers=int(os.getenv("NOTEMATE_INGEST_WORKERS", "2")))
+        return _pool
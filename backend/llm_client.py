@@ -0,0 +1,376 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Retry policy for 429 / 5xx / connection errors: bounded exponential backoff with jitter
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+RETRY_AFTER_CAP = 60.0
+
+
+def is_retryable(error: BaseException) -> bool:
+    from groq import APIConnectionError, APIStatusError, RateLimitError
+
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def backoff_delay(attempt: int, error: Optional[BaseException] = None) -> float:
+    """
+    Seconds to wait before retry number attempt + 1: the server's
+    retry-after when it sent one, else half of min(cap, base * 2^attempt)
+    plus up to the other half at random, so waiting clients spread out.
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(RETRY_AFTER_CAP, float(retry_after)) + random.uniform(0, 0.1)
+    except (TypeError, ValueError):
+        delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+class ConcurrencyLimit:
+    """
+    A semaphore shared by threads and by any number of event loops (the
+    Streamlit script thread, asyncio.run() study packs, the API's loop), so
+    one cap covers every Groq call the process makes. Waiters are served
+    first come, first served.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+        self._waiters = deque()  # threading.Event or (loop, future)
+
+    def acquire(self):
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()  # release() hands its slot over
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+                    raise
+            # The slot was handed over just as we were cancelled: pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, future = waiter
+                if loop.is_closed():
+                    continue
+                loop.call_soon_threadsafe(self._hand_over, future)
+                return
+            self.active -= 1
+
+    def _hand_over(self, future: asyncio.Future):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        await self.aacquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class StreamFlight:
+    """
+    One upstream streaming completion, run on its own thread, that any
+    number of readers follow: each gets every delta from the start, so a
+    reader that joins late still sees the whole reply. The upstream call
+    finishes (and is cached) even if every reader goes away.
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.usage: Dict[str, int] = {}
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.readers = 0
+        self._cond = threading.Condition()
+
+    def push(self, delta: str):
+        with self._cond:
+            self.parts.append(delta)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def follow(self) -> Iterator[str]:
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.parts) and not self.done:
+                    self._cond.wait()
+                if i >= len(self.parts):
+                    return
+                delta = self.parts[i]
+            i += 1
+            yield delta
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight requests: the first caller for a key runs
+    the call, everyone arriving before it finishes gets the same result.
+    Works across threads and event loops.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._streams: Dict[str, StreamFlight] = {}
+
+    def do(self, key: str, fn: Callable[[], object]) -> Tuple[object, bool]:
+        """fn()'s result and whether it came from another caller's flight."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key: str, fn) -> Tuple[object, bool]:
+        """Async do(): fn is a coroutine function."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return await asyncio.wrap_future(future), True
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stream(self, key: Optional[str], run: Callable[[StreamFlight], None]) -> Tuple[StreamFlight, bool]:
+        """
+        The StreamFlight for key, started with run(flight) on a new thread
+        unless one is already in flight; key=None never coalesces.
+        """
+        with self._lock:
+            flight = self._streams.get(key) if key is not None else None
+            shared = flight is not None
+            if not shared:
+                flight = StreamFlight()
+                if key is not None:
+                    self._streams[key] = flight
+            flight.readers += 1
+
+        if not shared:
+            def target():
+                try:
+                    run(flight)
+                    flight.finish()
+                except Exception as e:
+                    flight.finish(e)
+                finally:
+                    if key is not None:
+                        with self._lock:
+                            self._streams.pop(key, None)
+
+            threading.Thread(target=target, name="llm-stream", daemon=True).start()
+        return flight, shared
+
+
+class LLMPool:
+    """
+    Process-wide access to one Groq endpoint: a single client whose HTTP
+    connections are kept alive and reused by every session, a global cap
+    on concurrent calls, singleflight coalescing of identical requests and
+    retries with backoff. ContentGenerator gets it from get_llm_pool().
+    """
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, max_concurrency: int = 8,
+                 max_retries: int = 5, timeout: float = 120.0):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.limit = ConcurrencyLimit(max_concurrency)
+        self.flights = SingleFlight()
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _limits(self):
+        import httpx
+        # Enough idle connections for every concurrent call to reuse one
+        return httpx.Limits(max_connections=self.limit.limit * 2, max_keepalive_connections=self.limit.limit,
+                            keepalive_expiry=120)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from groq import DefaultHttpxClient, Groq
+                    self._client = Groq(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        max_retries=0,  # retried here, with the concurrency slot released
+                        timeout=self.timeout,
+                        http_client=DefaultHttpxClient(limits=self._limits())
+                    )
+        return self._client
+
+    def async_client(self):
+        """An AsyncGroq client with the same settings; bound to the running event loop."""
+        from groq import AsyncGroq, DefaultAsyncHttpxClient
+        return AsyncGroq(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            max_retries=0,
+            timeout=self.timeout,
+            http_client=DefaultAsyncHttpxClient(limits=self._limits())
+        )
+
+    def create(self, **params):
+        """chat.completions.create under the global limit, retried; returns (response, retries)."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.limit:
+                    return self.client.chat.completions.create(**params), attempt
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    e.retries = attempt
+                    raise
+                error = e
+            # Sleep outside the limit so other calls can use the slot
+            time.sleep(backoff_delay(attempt, error))
+
+    async def acreate(self, client, semaphore: Optional[asyncio.Semaphore] = None,
+                      max_retries: Optional[int] = None, **params):
+        """Async create() on client; semaphore is an extra, caller-local cap."""
+        semaphore = semaphore or asyncio.Semaphore(1)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in range(max_retries + 1):
+            try:
+                async with semaphore, self.limit:
+                    return await client.chat.completions.create(**params), attempt
+            except Exception as e:
+                if not is_retryable(e) or attempt == max_retries:
+                    e.retries = attempt
+                    raise
+                error = e
+            await asyncio.sleep(backoff_delay(attempt, error))
+
+    def stream(self, key: Optional[str], on_complete: Optional[Callable[[str], None]] = None,
+               **params) -> Tuple[StreamFlight, bool]:
+        """
+        A streaming completion as a StreamFlight, joined if an identical one
+        (same key) is already running. Opening the stream is retried like
+        create(); the call holds a concurrency slot while it streams.
+        on_complete(text) runs once with the full reply.
+        """
+        def run(flight: StreamFlight):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with self.limit:
+                        stream = self.client.chat.completions.create(stream=True, **params)
+                        for chunk in stream:
+                            x_groq = getattr(chunk, "x_groq", None)
+                            if x_groq is not None and x_groq.usage is not None:
+                                flight.usage = {
+                                    "prompt_tokens": x_groq.usage.prompt_tokens or 0,
+                                    "completion_tokens": x_groq.usage.completion_tokens or 0
+                                }
+                            delta = chunk.choices[0].delta.content if chunk.choices else None
+                            if delta:
+                                flight.push(delta)
+                    flight.usage["retries"] = attempt
+                    break
+                except Exception as e:
+                    # Only retry before anything reached the readers
+                    if flight.parts or not is_retryable(e) or attempt == self.max_retries:
+                        raise
+                    error = e
+                time.sleep(backoff_delay(attempt, error))
+            if on_complete is not None:
+                on_complete("".join(flight.parts))
+
+        return self.flights.stream(key, run)
+
+
+_pools: Dict[Tuple[str, Optional[str]], LLMPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_llm_pool(api_key: str, base_url: Optional[str] = None) -> LLMPool:
+    """
+    Process-wide pool per (api key, base url). NOTEMATE_LLM_MAX_CONCURRENCY
+    caps concurrent Groq calls across all sessions (default 8);
+    NOTEMATE_LLM_MAX_RETRIES bounds retries of 429/5xx replies (default 5).
+    """
+    key = (api_key, base_url)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = LLMPool(
+                api_key,
+                base_url,
+                max_concurrency=int(os.getenv("NOTEMATE_LLM_MAX_CONCURRENCY", "8")),
+                max_retries=int(os.getenv("NOTEMATE_LLM_MAX_RETRIES", "5"))
+            )
+        return _pools[key]
@@ -1,77 +1,457 @@
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import json
+import logging
 import pickle
 import os
+import threading
+
+from backend.catalog import CollectionCatalog
+from backend.embedder import get_embedder
+from backend.embedding_cache import get_embedding_cache
+from backend.index_factory import (FLAT, FLOAT32, INDEX_KINDS, INT8, IVF_FLAT, IVF_PQ, STORAGE_TYPES, IndexConfig,
+                                   add_in_blocks, build_index, exact_rerank, index_memory_bytes, is_lossy,
+                                   search_params)
+from backend.segment_store import SegmentStore
+from backend.sparse_index import BM25Index, reciprocal_rank_fusion
+from backend.tracing import get_tracer
+
+DENSE = "dense"    # FAISS search over the chunk embeddings
+SPARSE = "sparse"  # BM25 over the chunk terms; never embeds the query
+HYBRID = "hybrid"  # both, merged with reciprocal rank fusion
+RETRIEVAL_MODES = (DENSE, HYBRID, SPARSE)
+# Each side of a hybrid query ranks this many times n_results candidates for the fusion
+HYBRID_CANDIDATES = 4
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievedChunks(list):
+    """
+    The chunk texts of one query, as a plain list, carrying the vectors the
+    search already has so later stages (MMR) never re-embed them, and each
+    chunk's (start, end) character span in its document, so the context
+    packer can join neighbouring windows exactly.
+    """
+
+    def __init__(self, chunks, embeddings: Optional[np.ndarray] = None, query_embedding: Optional[np.ndarray] = None,
+                 spans: Optional[np.ndarray] = None):
+        super().__init__(chunks)
+        self.embeddings = embeddings
+        self.query_embedding = query_embedding
+        self.spans = spans
+
+
+class Collection:
+    """An open collection: its resident FAISS and BM25 indexes plus the mapped segment files."""
+
+    def __init__(self, name: str, index, store: SegmentStore, sparse: BM25Index, kind: str = FLAT,
+                 storage: str = FLOAT32):
+        self.name = name
+        self.index = index
+        self.kind = kind
+        self.storage = storage  # vector encoding inside the index; the segment files stay float32
+        self.built_on = index.ntotal  # vectors the index was trained/built on
+        self.store = store
+        self.sparse = sparse
+        self.documents = store.texts()
+        self.lock = threading.RLock()
+
+    def memory_bytes(self) -> int:
+        return index_memory_bytes(self.index, self.kind) + self.sparse.memory_bytes()
+
+    @property
+    def lossy(self) -> bool:
+        return is_lossy(self.kind, self.storage)
+
 
 class RAGEngine:
-    def __init__(self, db_path: str = "./vector_db"):
+    def __init__(self, db_path: str = "./vector_db", embedder=None, max_resident_mb: Optional[float] = None,
+                 index_config: Optional[IndexConfig] = None, retrieval_mode: Optional[str] = None):
         self.db_path = db_path
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
-        self.dimension = 384  # all-MiniLM-L6-v2 dimension
-        self.index = None
-        self.documents = []
-        self.collection_name = None
-        
+        # Shared across sessions; encode() calls are micro-batched. Loaded on
+        # first use, so creating an engine never waits for the model
+        self._embedder = embedder
+        self._embedding_cache = None
+        self.index_config = index_config or IndexConfig.from_env()
+        # Default for query(); NOTEMATE_RETRIEVAL_MODE picks dense, hybrid or sparse
+        self.retrieval_mode = retrieval_mode or os.getenv("NOTEMATE_RETRIEVAL_MODE") or DENSE
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {self.retrieval_mode}")
+
         os.makedirs(db_path, exist_ok=True)
-        
-    def create_collection(self, collection_name: str):
-        self.collection_name = collection_name
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.documents = []
+
+        # File content hash -> collection, plus an LRU of resident indexes
+        self.catalog = CollectionCatalog(db_path)
+        if max_resident_mb is None:
+            max_resident_mb = float(os.getenv("NOTEMATE_INDEX_MEMORY_MB", "1024"))
+        self.max_resident_bytes = int(max_resident_mb * 1024 * 1024)
+        self._collections: "OrderedDict[str, Collection]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = get_embedder()
+        return self._embedder
+
+    @property
+    def dimension(self) -> int:
+        return self.embedder.dimension  # 384 for all-MiniLM-L6-v2
+
+    @property
+    def embedding_cache(self):
+        # Chunk embeddings keyed by (model, text) so re-uploads skip the model
+        if self._embedding_cache is None:
+            self._embedding_cache = get_embedding_cache(
+                os.path.join(self.db_path, "embedding_cache"),
+                self.embedder.model_name,
+                self.dimension
+            )
+        return self._embedding_cache
+
+    def create_collection(self, collection_name: str, storage: Optional[str] = None):
+        """
+        Start an empty collection. storage picks how its vectors are held in
+        memory: float32 (default from IndexConfig), float16 or int8.
+        """
+        storage = storage or self.index_config.storage
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown vector storage: {storage}")
+
+        store = SegmentStore(self.db_path, collection_name, self.dimension).create()
+        sparse = BM25Index(self.db_path, collection_name).create()
+        for kind in INDEX_KINDS:
+            if os.path.exists(self._ann_path(collection_name, kind)):
+                os.remove(self._ann_path(collection_name, kind))
+        with open(self._meta_path(collection_name), 'w') as f:
+            json.dump({"storage": storage}, f)
+
+        empty = np.zeros((0, self.dimension), dtype='float32')
+        index = build_index(FLAT, self.dimension, empty, self.index_config, storage)
+        self._register(Collection(collection_name, index, store, sparse, FLAT, storage))
         return True
-    
-    def add_documents(self, collection_name: str, chunks: List[str]):
+
+    def has_collection(self, collection_name: str) -> bool:
+        return collection_name in self._collections or SegmentStore.exists(self.db_path, collection_name)
+
+    def add_documents(self, collection_name: str, chunks: List[str], spans: Optional[List[Tuple[int, int]]] = None,
+                      embeddings: Optional[np.ndarray] = None):
         if not chunks:
             return
-            
-        # Generate embeddings
-        embeddings = self.embedder.encode(chunks)
-        
-        # Add to Faiss index
-        self.index.add(embeddings.astype('float32'))
-        
-        # Store documents
-        self.documents.extend(chunks)
-        
-        # Save to disk
-        self._save_collection()
-        
-    def query(self, collection_name: str, query_text: str, n_results: int = 3) -> List[str]:
-        if not self.index or not self.documents:
-            return []
-            
-        # Generate query embedding
-        query_embedding = self.embedder.encode([query_text])
-        
+        collection = self._get_collection(collection_name)
+        if collection is None:
+            self.create_collection(collection_name)
+            collection = self._get_collection(collection_name)
+
+        tracer = get_tracer()
+        # Generate embeddings (cached chunks skip the model) unless add_documents_many already did
+        if embeddings is None:
+            with tracer.span("embed", chunks=len(chunks)) as span:
+                embeddings, cache_hits = self._embed_chunks(chunks)
+                span.set(cache_hits=cache_hits)
+
+        with collection.lock:
+            # Add to Faiss index
+            # An int8 index can't take vectors before it has data to train on;
+            # _maybe_rebuild builds it from the segment files instead
+            if collection.index.is_trained:
+                with tracer.span("index.add", vectors=len(chunks), kind=collection.kind):
+                    collection.index.add(embeddings.astype('float32'))
+
+            # Append only the new chunks to disk
+            with tracer.span("persist", chunks=len(chunks)) as span:
+                before = collection.store.disk_bytes()
+                self._save_collection(collection, chunks, embeddings, spans)
+                span.set(bytes=collection.store.disk_bytes() - before)
+
+            # Terms of the same chunks, for sparse and hybrid queries
+            with tracer.span("index.sparse", chunks=len(chunks)):
+                collection.sparse.append(chunks)
+
+            # Switch index type once the collection crosses a size threshold
+            self._maybe_rebuild(collection)
+
+        # The index grew, so other collections may no longer fit
+        with self._lock:
+            self._evict(keep=collection_name)
+
+    def add_documents_many(self, batches: List[Tuple[str, List[str], Optional[List[Tuple[int, int]]]]]):
+        """
+        add_documents for several (collection, chunks, spans) at once, with a
+        single embedding call for all of them: many small files (bulk ingest)
+        fill the model's batches instead of each sending a few chunks.
+        """
+        chunks = [chunk for _, texts, _ in batches for chunk in texts]
+        if not chunks:
+            return
+        with get_tracer().span("embed", chunks=len(chunks), collections=len(batches)) as span:
+            embeddings, cache_hits = self._embed_chunks(chunks)
+            span.set(cache_hits=cache_hits)
+        offset = 0
+        for collection_name, texts, spans in batches:
+            self.add_documents(collection_name, texts, spans, embeddings[offset:offset + len(texts)])
+            offset += len(texts)
+
+    def _embed_chunks(self, chunks: List[str]) -> Tuple[np.ndarray, int]:
+        """Embeddings for chunks, and how many of them came from the cache."""
+        embeddings, missing = self.embedding_cache.lookup(chunks)
+        if missing:
+            new_chunks = [chunks[i] for i in missing]
+            new_embeddings = self.embedder.encode(new_chunks)
+            embeddings[missing] = new_embeddings
+            self.embedding_cache.add(new_chunks, new_embeddings)
+        return embeddings, len(chunks) - len(missing)
+
+    def query(self, collection_name: str, query_text: str, n_results: int = 3,
+              nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+              mode: Optional[str] = None) -> "RetrievedChunks":
+        return self.query_batch(collection_name, [query_text], n_results, nprobe, ef_search, mode)[0]
+
+    def query_batch(self, collection_name: str, query_texts: List[str], n_results=3,
+                    nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                    mode: Optional[str] = None) -> List["RetrievedChunks"]:
+        """
+        Run several queries against one collection with a single encode call
+        and a single FAISS search. n_results is an int or one count per query.
+
+        mode is dense (FAISS), sparse (BM25 only, the query is never
+        embedded) or hybrid (both rankings merged with reciprocal rank
+        fusion, which catches exact terms such as formula names and
+        acronyms); it defaults to self.retrieval_mode.
+        """
+        mode = mode or self.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        counts = n_results if isinstance(n_results, (list, tuple)) else [n_results] * len(query_texts)
+        collection = self._get_collection(collection_name)
+        if collection is None or not collection.documents or not query_texts:
+            return [RetrievedChunks([]) for _ in query_texts]
+
+        tracer = get_tracer()
+        vectors = collection.store.vectors()
+        if mode == SPARSE:
+            results = []
+            for query_text, count in zip(query_texts, counts):
+                ids = self._sparse_search(collection, query_text, count)
+                results.append(RetrievedChunks(
+                    [collection.documents[idx] for idx in ids],
+                    embeddings=np.asarray(vectors[ids]),
+                    spans=collection.store.spans(ids)
+                ))
+            return results
+
+        # Generate query embeddings
+        with tracer.span("query.embed", queries=len(query_texts)):
+            query_embeddings = self.embedder.encode(query_texts)
+
         # Search
-        distances, indices = self.index.search(query_embedding.astype('float32'), n_results)
-        
-        # Return documents
+        params = search_params(
+            collection.kind,
+            nprobe=nprobe or self.index_config.nprobe,
+            ef_search=ef_search or self.index_config.ef_search
+        )
+        # A hybrid query ranks more candidates on each side than it returns
+        depth = HYBRID_CANDIDATES if mode == HYBRID else 1
+        # A lossy index (float16/int8/PQ codes) fetches extra candidates to re-rank exactly
+        k = max(counts) * depth
+        rerank = collection.lossy and self.index_config.rerank > 1
+        fetch = k * self.index_config.rerank if rerank else k
+        with collection.lock, tracer.span("query.search", queries=len(query_texts), k=fetch,
+                                          vectors=collection.index.ntotal, kind=collection.kind,
+                                          storage=collection.storage):
+            distances, indices = collection.index.search(query_embeddings.astype('float32'), fetch, params=params)
+
+        # Return documents, with their stored vectors for MMR-style reranking
         results = []
-        for idx in indices[0]:
-            if idx < len(self.documents) and idx >= 0:
-                results.append(self.documents[idx])
-                
+        for row, count, query_embedding, query_text in zip(indices, counts, query_embeddings, query_texts):
+            ids = [int(idx) for idx in row if idx < len(collection.documents) and idx >= 0]
+            if rerank:
+                with tracer.span("query.rerank", candidates=len(ids)):
+                    ids = exact_rerank(vectors, query_embedding, ids, count * depth)
+            else:
+                ids = ids[:count * depth]
+            if mode == HYBRID:
+                sparse_ids = self._sparse_search(collection, query_text, count * depth)
+                ids = reciprocal_rank_fusion([ids, sparse_ids], count)
+            results.append(RetrievedChunks(
+                [collection.documents[idx] for idx in ids],
+                embeddings=np.asarray(vectors[ids]),
+                query_embedding=query_embedding,
+                spans=collection.store.spans(ids)
+            ))
+
         return results
-    
-    def _save_collection(self):
-        if self.index and self.documents and self.collection_name:
-            # Save index
-            faiss.write_index(self.index, f"{self.db_path}/{self.collection_name}_index.faiss")
-            # Save documents
-            with open(f"{self.db_path}/{self.collection_name}_docs.pkl", 'wb') as f:
-                pickle.dump(self.documents, f)
-    
+
+    def _sparse_search(self, collection: Collection, query_text: str, n_results: int) -> List[int]:
+        with get_tracer().span("query.sparse", terms=len(collection.sparse.terms)) as span:
+            ids, _ = collection.sparse.search(query_text, n_results)
+            span.set(hits=len(ids))
+        return ids
+
+    def query_ranges(self, collection_name: str, query_text: str, ranges: List[Tuple[int, int]],
+                     n_results: int = 3, query_embedding: Optional[np.ndarray] = None) -> "RetrievedChunks":
+        """
+        Exact search restricted to chunk id ranges [start, end), e.g. the
+        sections a coarse first-level lookup picked. Reads only those rows
+        of the mapped vectors file instead of searching the whole index.
+        """
+        collection = self._get_collection(collection_name)
+        if collection is None or not ranges:
+            return RetrievedChunks([])
+
+        ids = np.concatenate([np.arange(start, min(end, collection.store.count)) for start, end in ranges])
+        if not len(ids):
+            return RetrievedChunks([])
+        vectors = np.asarray(collection.store.vectors()[ids])
+        if query_embedding is None:
+            query_embedding = self.embedder.encode([query_text])[0]
+
+        distances = ((vectors - query_embedding) ** 2).sum(axis=1)
+        best = np.argsort(distances)[:n_results]
+        return RetrievedChunks(
+            [collection.documents[int(ids[i])] for i in best],
+            embeddings=vectors[best],
+            query_embedding=query_embedding,
+            spans=collection.store.spans(ids[best])
+        )
+
+    def disk_bytes(self, collection_name: str) -> int:
+        collection = self._get_collection(collection_name)
+        return collection.store.disk_bytes() if collection else 0
+
+    def collection_version(self, collection_name: str) -> Optional[str]:
+        # For caches of answers derived from the collection (backend.semantic_cache)
+        return SegmentStore.version(self.db_path, collection_name)
+
+    def chunk_count(self, collection_name: str) -> int:
+        collection = self._get_collection(collection_name)
+        return collection.store.count if collection else 0
+
+    def chunks(self, collection_name: str, start: int = 0, end: Optional[int] = None) -> List[str]:
+        collection = self._get_collection(collection_name)
+        if collection is None:
+            return []
+        return collection.documents[start:end]
+
+    def _get_collection(self, collection_name: str) -> Optional[Collection]:
+        with self._lock:
+            if collection_name in self._collections:
+                self._collections.move_to_end(collection_name)
+                return self._collections[collection_name]
+            if not self._load_collection(collection_name):
+                return None
+            return self._collections[collection_name]
+
+    def _register(self, collection: Collection):
+        with self._lock:
+            self._collections[collection.name] = collection
+            self._collections.move_to_end(collection.name)
+            self._evict(keep=collection.name)
+
+    def _evict(self, keep: str):
+        # Drop least recently used indexes until the resident set fits the budget;
+        # the segment files stay on disk, so an evicted collection just reloads lazily
+        total = sum(c.memory_bytes() for c in self._collections.values())
+        for name in list(self._collections):
+            if total <= self.max_resident_bytes:
+                break
+            if name == keep:
+                continue
+            total -= self._collections.pop(name).memory_bytes()
+
+    def _save_collection(self, collection: Collection, chunks: List[str], embeddings: np.ndarray,
+                         spans: Optional[List[Tuple[int, int]]] = None):
+        collection.store.append(chunks, embeddings, spans)
+
+    def _ann_path(self, collection_name: str, kind: str) -> str:
+        return f"{self.db_path}/{collection_name}_{kind}.faiss"
+
+    def _meta_path(self, collection_name: str) -> str:
+        return f"{self.db_path}/{collection_name}_meta.json"
+
+    def _read_storage(self, collection_name: str) -> str:
+        # Collections written before per-collection storage are float32
+        try:
+            with open(self._meta_path(collection_name), 'r') as f:
+                return json.load(f).get("storage", FLOAT32)
+        except:
+            return FLOAT32
+
+    def _maybe_rebuild(self, collection: Collection):
+        count = collection.store.count
+        kind = self.index_config.choose_kind(count)
+        # IVF centroids and int8 value ranges trained on a much smaller
+        # collection stop fitting the data
+        retrain = (kind in (IVF_FLAT, IVF_PQ) or collection.storage == INT8) and count > 4 * collection.built_on
+        if kind == collection.kind and not retrain and collection.index.is_trained:
+            return
+
+        with get_tracer().span("index.rebuild", vectors=count, kind=kind, storage=collection.storage):
+            collection.index = build_index(
+                kind, self.dimension, collection.store.vectors(), self.index_config, collection.storage
+            )
+        collection.kind = kind
+        collection.built_on = collection.index.ntotal
+
+        # Non-flat indexes are slow to build, so keep the built one next to the
+        # segments; later appends are added from the vectors file on load
+        for other in INDEX_KINDS:
+            if other != kind and os.path.exists(self._ann_path(collection.name, other)):
+                os.remove(self._ann_path(collection.name, other))
+        if kind != FLAT:
+            import faiss
+            faiss.write_index(collection.index, self._ann_path(collection.name, kind))
+
+    def _open_index(self, collection_name: str, store: SegmentStore, storage: str):
+        kind = self.index_config.choose_kind(store.count)
+        ann_path = self._ann_path(collection_name, kind)
+        if kind == FLAT or not os.path.exists(ann_path):
+            return build_index(kind, self.dimension, store.vectors(), self.index_config, storage), kind, None
+
+        import faiss
+        index = faiss.read_index(ann_path)
+        built_on = index.ntotal
+        add_in_blocks(index, store.vectors(), start=index.ntotal)
+        return index, kind, built_on
+
     def _load_collection(self, collection_name: str):
+        legacy = not SegmentStore.exists(self.db_path, collection_name)
+        if legacy and not os.path.exists(self._legacy_index_path(collection_name)):
+            return False  # never created
         try:
-            # Load index
-            self.index = faiss.read_index(f"{self.db_path}/{collection_name}_index.faiss")
-            # Load documents
-            with open(f"{self.db_path}/{collection_name}_docs.pkl", 'rb') as f:
-                self.documents = pickle.load(f)
-            self.collection_name = collection_name
+            if legacy:
+                self._migrate_legacy_collection(collection_name)
+
+            # Map the segment files; texts are decoded only when a query hits them
+            with get_tracer().span("index.load") as span:
+                store = SegmentStore(self.db_path, collection_name, self.dimension).open()
+                storage = self._read_storage(collection_name)
+                index, kind, built_on = self._open_index(collection_name, store, storage)
+                # Collections from before the BM25 index (or cut short by a crash) are caught up here
+                sparse = BM25Index(self.db_path, collection_name).open()
+                sparse.sync(store.texts())
+                span.set(vectors=store.count, kind=kind, storage=storage)
+
+            collection = Collection(collection_name, index, store, sparse, kind, storage)
+            if built_on is not None:
+                collection.built_on = built_on
+            self._register(collection)
             return True
-        except:
-            return False
\ No newline at end of file
+        except (OSError, ValueError, RuntimeError, EOFError, pickle.UnpicklingError):
+            # Unreadable files (faiss raises RuntimeError): treated as missing, but not silently
+            logger.warning("Could not load collection %s from %s", collection_name, self.db_path, exc_info=True)
+            return False
+
+    def _legacy_index_path(self, collection_name: str) -> str:
+        return f"{self.db_path}/{collection_name}_index.faiss"
+
+    def _migrate_legacy_collection(self, collection_name: str):
+        # Collections written before the segment format: FAISS file + pickled chunk list
+        import faiss
+        index = faiss.read_index(self._legacy_index_path(collection_name))
+        with open(f"{self.db_path}/{collection_name}_docs.pkl", 'rb') as f:
+            documents = pickle.load(f)
+        store = SegmentStore(self.db_path, collection_name, self.dimension).create()
+        store.append(documents, index.reconstruct_n(0, index.ntotal))
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of LLM completions with a TTL and a size-bounded LRU.
+    Keys are hashes of everything that determines the completion, so a hit
+    is only ever returned for an identical request.
+    """
+
+    def __init__(self, path: str = "./vector_db/llm_cache.sqlite", ttl_seconds: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("NOTEMATE_LLM_CACHE_TTL", "604800"))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("NOTEMATE_LLM_CACHE_MAX_ENTRIES", "5000"))
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            # WAL lets several app processes read while one writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    @staticmethod
+    def make_key(model: str, temperature: float, max_tokens: int, prompt: str) -> str:
+        payload = json.dumps([model, temperature, max_tokens, prompt])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            # Evict expired rows, then the least recently used beyond the size bound
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
@@ -0,0 +1,162 @@
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+class ChunkTexts:
+    """Read-only, list-like view of a store's chunk texts, decoded on access."""
+
+    def __init__(self, store: "SegmentStore"):
+        self._store = store
+
+    def __len__(self):
+        return self._store.count
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("chunk index out of range")
+        return self._store.text(idx)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class SegmentStore:
+    """
+    Append-only on-disk layout of one collection:
+
+    <name>_vectors.f32   raw float32 rows, memory-mapped on open
+    <name>_texts.bin     UTF-8 chunk texts, back to back
+    <name>_offsets.u64   end offset of each chunk in texts.bin
+    <name>_spans.i64     (start, end) character offsets of each chunk in its
+                         source document, -1 when unknown
+
+    The offsets file is written last, so it is the commit point: a chunk
+    exists once its offset is on disk, and any longer tail left by a crash
+    in the other two files is cut off the next time the store is opened.
+    """
+
+    def __init__(self, db_path: str, collection_name: str, dimension: int):
+        self.dimension = dimension
+        prefix = os.path.join(db_path, collection_name)
+        self.vectors_file = f"{prefix}_vectors.f32"
+        self.texts_file = f"{prefix}_texts.bin"
+        self.offsets_file = f"{prefix}_offsets.u64"
+        self.spans_file = f"{prefix}_spans.i64"
+
+        self.count = 0
+        self._offsets = np.zeros(0, dtype='uint64')
+        self._vectors = None
+        self._texts = None
+
+    @classmethod
+    def exists(cls, db_path: str, collection_name: str) -> bool:
+        return os.path.exists(os.path.join(db_path, f"{collection_name}_offsets.u64"))
+
+    @classmethod
+    def version(cls, db_path: str, collection_name: str) -> Optional[str]:
+        """Changes whenever chunks are committed or the store is recreated; None if there is no store."""
+        try:
+            stat = os.stat(os.path.join(db_path, f"{collection_name}_offsets.u64"))
+        except OSError:
+            return None
+        return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+    def create(self):
+        for path in (self.vectors_file, self.texts_file, self.spans_file, self.offsets_file):
+            open(path, 'wb').close()
+        self.count = 0
+        self._offsets = np.zeros(0, dtype='uint64')
+        self._vectors = None
+        self._texts = None
+        return self
+
+    def open(self):
+        self._offsets = np.fromfile(self.offsets_file, dtype='uint64')
+        self.count = len(self._offsets)
+        if os.path.getsize(self.offsets_file) != self.count * 8:
+            # A torn offset write; later appends would land out of alignment
+            os.truncate(self.offsets_file, self.count * 8)
+
+        # Trim anything written after the last committed offset
+        row_bytes = self.dimension * 4
+        text_end = int(self._offsets[-1]) if self.count else 0
+        if os.path.getsize(self.vectors_file) != self.count * row_bytes:
+            os.truncate(self.vectors_file, self.count * row_bytes)
+        if os.path.getsize(self.texts_file) != text_end:
+            os.truncate(self.texts_file, text_end)
+        if not os.path.exists(self.spans_file):
+            # Stores written before spans were recorded
+            np.full((self.count, 2), -1, dtype='int64').tofile(self.spans_file)
+        elif os.path.getsize(self.spans_file) != self.count * 16:
+            os.truncate(self.spans_file, self.count * 16)
+
+        self._vectors = None
+        self._texts = None
+        return self
+
+    def append(self, chunks: List[str], embeddings: np.ndarray, spans: Optional[List[Tuple[int, int]]] = None):
+        if not chunks:
+            return
+        if spans is None:
+            spans = [(-1, -1)] * len(chunks)
+        encoded = [chunk.encode('utf-8') for chunk in chunks]
+        start = int(self._offsets[-1]) if self.count else 0
+        ends = start + np.cumsum([len(b) for b in encoded], dtype='uint64')
+
+        with open(self.vectors_file, 'ab') as f:
+            f.write(np.ascontiguousarray(embeddings, dtype='float32').tobytes())
+        with open(self.texts_file, 'ab') as f:
+            f.write(b"".join(encoded))
+        with open(self.spans_file, 'ab') as f:
+            f.write(np.asarray(spans, dtype='int64').reshape(-1, 2).tobytes())
+        with open(self.offsets_file, 'ab') as f:
+            f.write(ends.tobytes())
+
+        self._offsets = np.concatenate([self._offsets, ends])
+        self.count = len(self._offsets)
+
+    def vectors(self) -> np.ndarray:
+        if self.count == 0:
+            return np.zeros((0, self.dimension), dtype='float32')
+        if self._vectors is None or len(self._vectors) != self.count:
+            self._vectors = np.memmap(self.vectors_file, dtype='float32', mode='r', shape=(self.count, self.dimension))
+        return self._vectors
+
+    def text(self, idx: int) -> str:
+        start = int(self._offsets[idx - 1]) if idx else 0
+        end = int(self._offsets[idx])
+        if start == end:
+            return ""
+        if self._texts is None or len(self._texts) < end:
+            self._texts = np.memmap(self.texts_file, dtype='uint8', mode='r')
+        return self._texts[start:end].tobytes().decode('utf-8')
+
+    def disk_bytes(self) -> int:
+        return sum(
+            os.path.getsize(path)
+            for path in (self.vectors_file, self.texts_file, self.spans_file, self.offsets_file)
+            if os.path.exists(path)
+        )
+
+    def span(self, idx: int) -> Tuple[int, int]:
+        with open(self.spans_file, 'rb') as f:
+            f.seek(idx * 16)
+            start, end = np.frombuffer(f.read(16), dtype='int64')
+        return int(start), int(end)
+
+    def spans(self, ids) -> Optional[np.ndarray]:
+        """(start, end) rows for the chunk ids, or None for stores written without spans."""
+        if not self.count or not os.path.exists(self.spans_file) or os.path.getsize(self.spans_file) < self.count * 16:
+            return None
+        rows = np.memmap(self.spans_file, dtype='int64', mode='r', shape=(self.count, 2))
+        return np.asarray(rows[ids])
+
+    def texts(self) -> ChunkTexts:
+        return ChunkTexts(self)
@@ -0,0 +1,198 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.generator import is_error_reply
+from backend.rag_engine import RAGEngine
+from backend.tracing import get_tracer
+
+# Features asked with a free-text topic, whose answer depends only on the topic and the notes
+SEMANTIC_FEATURES = ("lesson", "story", "explain")
+# Past requests kept per collection and feature; the oldest go first
+MAX_ENTRIES = 500
+
+_WORD = re.compile(r"\w+")
+# Phrasing around the topic that doesn't change what is asked for
+_LEADING = re.compile(
+    r"^(?:(?:please|can you|could you|what is|what are|whats|what s|how does|how do|tell me about|teach me|"
+    r"explain|describe|define|a|an|the)\s+)+"
+)
+_TRAILING = re.compile(r"(?:\s+(?:explained|explanation|in simple terms|simply|please|work|works))+$")
+
+
+def normalize_request(text: str) -> str:
+    """Lower-cased words of the request without filler: "What is Recursion?" -> "recursion"."""
+    words = " ".join(_WORD.findall(text.lower()))
+    return _TRAILING.sub("", _LEADING.sub("", words)) or words
+
+
+class _Scope:
+    """Past requests for one collection and feature, with their answers and a FAISS index of their embeddings."""
+
+    def __init__(self, entries: List[Dict], vectors: np.ndarray):
+        self.entries = entries
+        self.vectors = vectors
+        self._index = None
+
+    def search(self, vector: np.ndarray):
+        """(similarity, entry position) of the closest past request."""
+        import faiss
+
+        if self._index is None:
+            self._index = faiss.IndexFlatIP(self.vectors.shape[1])
+            self._index.add(self.vectors)
+        similarities, ids = self._index.search(vector.reshape(1, -1), 1)
+        return float(similarities[0][0]), int(ids[0][0])
+
+    def replace(self, entries: List[Dict], vectors: np.ndarray):
+        self.entries, self.vectors, self._index = entries, vectors, None
+
+
+class SemanticCache:
+    """
+    Answers to the free-text features (lesson, story, explain) reused for
+    requests that mean the same thing: "recursion", "Recursion explained"
+    and "what is recursion" on the same notes get one answer. Checked before
+    retrieval, so a hit skips both RAGEngine.query and the LLM call.
+
+    A request is normalized and embedded with the engine's model; if the
+    closest past request for that collection and feature has a cosine
+    similarity of at least threshold (NOTEMATE_SEMANTIC_CACHE_THRESHOLD,
+    default 0.9; 1 reuses only identical wording), its answer is returned.
+
+    Entries are stored per collection next to its segment files
+    (<name>_semantic_cache.json / .npz) together with the collection's
+    version, and are all dropped once the collection changes.
+    """
+
+    def __init__(self, rag_engine: RAGEngine, threshold: Optional[float] = None, max_entries: int = MAX_ENTRIES):
+        self.rag_engine = rag_engine
+        self.threshold = threshold if threshold is not None else float(
+            os.getenv("NOTEMATE_SEMANTIC_CACHE_THRESHOLD", "0.9")
+        )
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # collection -> {"version": ..., "scopes": {feature: _Scope}}
+        self._collections: Dict[str, Dict] = {}
+
+    def get(self, collection_name: str, feature: str, request: str) -> Optional[Dict]:
+        """
+        The cached answer for a request like this one, as {"request": the
+        original request, "response", "similarity"}, or None.
+        """
+        normalized = normalize_request(request)
+        with get_tracer().span("cache.semantic", feature=feature) as span:
+            with self._lock:
+                scope = self._scope(collection_name, feature)
+                if scope is None or not scope.entries:
+                    span.set(cache_hits=0)
+                    return None
+                # Same wording after normalization: no need to embed
+                for entry in scope.entries:
+                    if entry["normalized"] == normalized:
+                        span.set(cache_hits=1)
+                        return {"request": entry["request"], "response": entry["response"], "similarity": 1.0}
+
+            vector = self._embed(normalized)
+            with self._lock:
+                scope = self._scope(collection_name, feature)
+                if scope is None or not scope.entries:
+                    span.set(cache_hits=0)
+                    return None
+                similarity, position = scope.search(vector)
+                entry = scope.entries[position]
+            hit = similarity >= self.threshold
+            span.set(cache_hits=int(hit))
+            if not hit:
+                return None
+            return {"request": entry["request"], "response": entry["response"], "similarity": round(similarity, 3)}
+
+    def put(self, collection_name: str, feature: str, request: str, response: str):
+        """
+        Remember response for request; it replaces the answer to a request
+        that means the same. Failed or cut-off replies are never stored.
+        """
+        if not response or is_error_reply(response):
+            return
+        normalized = normalize_request(request)
+        vector = self._embed(normalized)
+        entry = {"request": request, "normalized": normalized, "response": response, "created": time.time()}
+
+        with self._lock:
+            scope = self._scope(collection_name, feature)
+            if scope is None:
+                return  # the collection is gone
+            entries, vectors = list(scope.entries), scope.vectors
+            if entries:
+                similarity, position = scope.search(vector)
+                if similarity >= self.threshold:
+                    del entries[position]
+                    vectors = np.delete(vectors, position, axis=0)
+            entries.append(entry)
+            vectors = np.vstack([vectors, vector.reshape(1, -1)])
+            if len(entries) > self.max_entries:
+                entries, vectors = entries[-self.max_entries:], vectors[-self.max_entries:]
+            scope.replace(entries, np.ascontiguousarray(vectors, dtype='float32'))
+            self._save(collection_name)
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = self.rag_engine.embedder.encode([text])[0].astype('float32')
+        # Unit length, so inner product is cosine similarity
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _paths(self, collection_name: str):
+        prefix = os.path.join(self.rag_engine.db_path, f"{collection_name}_semantic_cache")
+        return f"{prefix}.json", f"{prefix}.npz"
+
+    def _scope(self, collection_name: str, feature: str) -> Optional[_Scope]:
+        # Called with the lock held
+        version = self.rag_engine.collection_version(collection_name)
+        if version is None:
+            self._collections.pop(collection_name, None)
+            return None
+        cached = self._collections.get(collection_name)
+        if cached is None or cached["version"] != version:
+            cached = self._collections[collection_name] = self._load(collection_name, version)
+        scopes = cached["scopes"]
+        if feature not in scopes:
+            scopes[feature] = _Scope([], np.zeros((0, self.rag_engine.dimension), dtype='float32'))
+        return scopes[feature]
+
+    def _load(self, collection_name: str, version: str) -> Dict:
+        json_path, vectors_path = self._paths(collection_name)
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data["version"] != version:
+                # Answers were grounded in chunks that have changed since
+                for path in (json_path, vectors_path):
+                    os.remove(path)
+                return {"version": version, "scopes": {}}
+            with np.load(vectors_path) as vectors:
+                scopes = {
+                    feature: _Scope(entries, vectors[feature].astype('float32'))
+                    for feature, entries in data["features"].items()
+                    if len(entries) == len(vectors[feature])
+                }
+            return {"version": version, "scopes": scopes}
+        except:
+            return {"version": version, "scopes": {}}
+
+    def _save(self, collection_name: str):
+        cached = self._collections[collection_name]
+        json_path, vectors_path = self._paths(collection_name)
+        # Vectors first, then the JSON that references them; each write-then-rename
+        with open(f"{vectors_path}.tmp", 'wb') as f:
+            np.savez(f, **{feature: scope.vectors for feature, scope in cached["scopes"].items()})
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        with open(f"{json_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": cached["version"],
+                "features": {feature: scope.entries for feature, scope in cached["scopes"].items()}
+            }, f)
+        os.replace(f"{json_path}.tmp", json_path)
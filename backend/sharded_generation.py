@@ -0,0 +1,226 @@
+import asyncio
+import math
+import os
+import re
+from typing import Dict, List, Optional
+
+from backend.dedup import NearDuplicateFilter
+from backend.generator import ContentGenerator, is_error_reply
+from backend.rag_engine import RAGEngine, RetrievedChunks
+from backend.study_pack import PACK_RETRIEVALS
+from backend.tracing import get_tracer
+
+# Items one LLM call is asked for; larger requests are split into shards of about this size
+SHARD_SIZE = int(os.getenv("NOTEMATE_SHARD_SIZE", "5"))
+# Quizzes and decks up to this size stay one (streamed) call; only larger ones are sharded
+SHARD_THRESHOLD = int(os.getenv("NOTEMATE_SHARD_THRESHOLD", "15"))
+# Extra attempts for a shard whose call failed, after the pool's own 429/5xx backoff
+SHARD_RETRIES = 1
+# Retrieved chunks per shard: each shard writes from its own slice of a wider retrieval
+CHUNKS_PER_SHARD = 5
+# Questions this similar (MinHash estimate over word 3-grams) count as repeats across shards
+QUESTION_DUPLICATE_THRESHOLD = 0.7
+
+_QUESTION = re.compile(r"^\s*\**Q(\d+)[.):]\**\s*", re.MULTILINE)
+_OPTION = re.compile(r"^\s*([A-Da-d])[).]\s*(.*)")
+_ANSWER = re.compile(r"^\s*\**Answer\**\s*:\**\s*(.*)", re.IGNORECASE)
+_CARD = re.compile(r"\**Front\**\s*:\**\s*(.*?)\s*\n\s*\**Back\**\s*:\**\s*(.*?)(?=\n\s*\n|\n\s*\**Front|\Z)",
+                   re.IGNORECASE | re.DOTALL)
+
+
+def parse_quiz(text: str) -> List[Dict]:
+    """Q1./Answer: blocks (the quiz_prompt formats) as {"question", "options", "answer"} records."""
+    starts = list(_QUESTION.finditer(text))
+    records = []
+    for match, following in zip(starts, starts[1:] + [None]):
+        block = text[match.end():following.start() if following else len(text)]
+        question, options, answer = [], [], ""
+        for line in block.strip().splitlines():
+            option, answer_match = _OPTION.match(line), _ANSWER.match(line)
+            if answer_match:
+                answer = answer_match.group(1).strip()
+            elif option and not answer:
+                options.append(option.group(2).strip())
+            elif not options and not answer and line.strip():
+                question.append(line.strip())
+            elif answer and line.strip():
+                answer += "\n" + line.strip()  # multi-line short answers
+        if question:
+            records.append({"question": " ".join(question), "options": options, "answer": answer})
+    return records
+
+
+def parse_flashcards(text: str) -> List[Dict]:
+    """Front:/Back: pairs as {"front", "back"} records."""
+    return [
+        {"front": front.strip(), "back": " ".join(back.split())}
+        for front, back in _CARD.findall(text)
+        if front.strip() and back.strip()
+    ]
+
+
+def format_quiz(records: List[Dict]) -> str:
+    blocks = []
+    for number, record in enumerate(records, start=1):
+        lines = [f"Q{number}. {record['question']}"]
+        lines += [f"{letter}) {option}" for letter, option in zip("ABCD", record["options"])]
+        if record["answer"]:
+            lines.append(f"Answer: {record['answer']}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def format_flashcards(records: List[Dict]) -> str:
+    return "\n\n".join(
+        f"Card {number}\nFront: {record['front']}\nBack: {record['back']}"
+        for number, record in enumerate(records, start=1)
+    )
+
+
+def merge_records(shards: List[List[Dict]], key: str, limit: int) -> List[Dict]:
+    """Shard outputs in order, without near-duplicate items, capped at limit."""
+    seen = NearDuplicateFilter(QUESTION_DUPLICATE_THRESHOLD)
+    merged = []
+    for records in shards:
+        for record in records:
+            if seen.add(record[key], len(merged)) is None:
+                merged.append(record)
+    return merged[:limit]
+
+
+def shard_outcome(outputs: List[str], records: List[Dict], requested: int) -> Dict:
+    """How many requested items are missing from the merge, and the errors of shards that still failed."""
+    return {
+        "missing": max(0, requested - len(records)),
+        "errors": [output for output in outputs if is_error_reply(output)]
+    }
+
+
+def shard_counts(total: int, shard_size: int) -> List[int]:
+    """Split total items into near-equal shards of at most shard_size."""
+    shards = max(1, math.ceil(total / max(1, shard_size)))
+    return [total // shards + (1 if i < total % shards else 0) for i in range(shards)]
+
+
+def slice_context(context: RetrievedChunks, shards: int) -> List[RetrievedChunks]:
+    """
+    Deal the ranked chunks out round-robin, so every shard gets some of the
+    best matches and a different part of the wider retrieval.
+    """
+    slices = []
+    for i in range(shards):
+        ids = list(range(i, len(context), shards)) or list(range(len(context)))
+        embeddings = context.embeddings[ids] if context.embeddings is not None and len(context) else None
+        spans = context.spans[ids] if context.spans is not None and len(context) else None
+        slices.append(RetrievedChunks([context[j] for j in ids], embeddings, context.query_embedding, spans))
+    return slices
+
+
+async def _run_shards(rag_engine, generator, collection_name, query_text, counts, make_prompt, feature, client,
+                      semaphore, use_cache) -> List[str]:
+    context = await asyncio.to_thread(
+        rag_engine.query, collection_name, query_text, CHUNKS_PER_SHARD * len(counts)
+    )
+    slices = slice_context(context, len(counts))
+    # One extra item per shard makes up for repeats dropped in the merge
+    extra = 1 if len(counts) > 1 else 0
+
+    async def generate(client, count, part):
+        prompt = make_prompt(count + extra)
+        output = await generator.agenerate_with_context(prompt, part, client, semaphore, use_cache, feature)
+        for _ in range(SHARD_RETRIES):
+            if not is_error_reply(output):
+                break
+            output = await generator.agenerate_with_context(prompt, part, client, semaphore, use_cache, feature)
+        return output
+
+    async def generate_all(client):
+        return await asyncio.gather(*[generate(client, count, part) for count, part in zip(counts, slices)])
+
+    if client is not None:
+        return await generate_all(client)
+    async with generator.async_client() as client:
+        return await generate_all(client)
+
+
+async def agenerate_quiz_sharded(
+    rag_engine: RAGEngine,
+    generator: ContentGenerator,
+    collection_name: str,
+    num_questions: int = 20,
+    quiz_type: str = "mcq",
+    shard_size: Optional[int] = None,
+    use_cache: bool = True,
+    client=None,
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> Dict:
+    """
+    A quiz of num_questions written by concurrent LLM calls of about
+    shard_size questions each, every one from its own slice of the
+    retrieved chunks. The shards are parsed into records, merged without
+    near-duplicate questions and renumbered. A shard whose call fails is
+    tried again once; if it still fails, its error is reported rather than
+    its questions silently left out.
+    Returns {"content": <formatted quiz>, "questions": [records], "shards": n,
+    "missing": questions short of num_questions, "errors": [failed shards' errors]}.
+    """
+    counts = shard_counts(num_questions, shard_size or SHARD_SIZE)
+    semaphore = semaphore or asyncio.Semaphore(int(os.getenv("NOTEMATE_LLM_CONCURRENCY", "4")))
+    with get_tracer().span("sharded.quiz", questions=num_questions, shards=len(counts)) as span:
+        outputs = await _run_shards(
+            rag_engine, generator, collection_name, PACK_RETRIEVALS["quiz"][0], counts,
+            lambda count: generator.quiz_prompt(count, quiz_type), "quiz", client, semaphore, use_cache
+        )
+        records = merge_records([parse_quiz(output) for output in outputs], "question", num_questions)
+        outcome = shard_outcome(outputs, records, num_questions)
+        span.set(parsed=len(records), failed_shards=len(outcome["errors"]))
+    # Replies that ignored the format are shown as they came rather than dropped
+    content = format_quiz(records) if records else "\n\n".join(outputs)
+    return {"content": content, "questions": records, "shards": len(counts), **outcome}
+
+
+async def agenerate_flashcards_sharded(
+    rag_engine: RAGEngine,
+    generator: ContentGenerator,
+    collection_name: str,
+    num_cards: int = 20,
+    shard_size: Optional[int] = None,
+    use_cache: bool = True,
+    client=None,
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> Dict:
+    """
+    Flashcards the same way as agenerate_quiz_sharded.
+    Returns {"content": <formatted cards>, "cards": [records], "shards": n,
+    "missing": cards short of num_cards, "errors": [failed shards' errors]}.
+    """
+    counts = shard_counts(num_cards, shard_size or SHARD_SIZE)
+    semaphore = semaphore or asyncio.Semaphore(int(os.getenv("NOTEMATE_LLM_CONCURRENCY", "4")))
+    with get_tracer().span("sharded.flashcards", cards=num_cards, shards=len(counts)) as span:
+        outputs = await _run_shards(
+            rag_engine, generator, collection_name, PACK_RETRIEVALS["flashcards"][0], counts,
+            generator.structured_flashcards_prompt, "flashcards", client, semaphore, use_cache
+        )
+        records = merge_records([parse_flashcards(output) for output in outputs], "front", num_cards)
+        outcome = shard_outcome(outputs, records, num_cards)
+        span.set(parsed=len(records), failed_shards=len(outcome["errors"]))
+    content = format_flashcards(records) if records else "\n\n".join(outputs)
+    return {"content": content, "cards": records, "shards": len(counts), **outcome}
+
+
+def generate_quiz_sharded(rag_engine: RAGEngine, generator: ContentGenerator, collection_name: str,
+                          num_questions: int = 20, quiz_type: str = "mcq", shard_size: Optional[int] = None,
+                          use_cache: bool = True) -> Dict:
+    """Blocking wrapper around agenerate_quiz_sharded for the Streamlit script thread."""
+    return asyncio.run(agenerate_quiz_sharded(
+        rag_engine, generator, collection_name, num_questions, quiz_type, shard_size, use_cache
+    ))
+
+
+def generate_flashcards_sharded(rag_engine: RAGEngine, generator: ContentGenerator, collection_name: str,
+                                num_cards: int = 20, shard_size: Optional[int] = None,
+                                use_cache: bool = True) -> Dict:
+    """Blocking wrapper around agenerate_flashcards_sharded for the Streamlit script thread."""
+    return asyncio.run(agenerate_flashcards_sharded(
+        rag_engine, generator, collection_name, num_cards, shard_size, use_cache
+    ))
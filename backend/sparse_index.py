@@ -0,0 +1,191 @@
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+# Too common to help a BM25 ranking; dropping them keeps the postings small
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in is it its of on or that the this to was were which with
+""".split())
+
+RRF_K = 60  # reciprocal rank fusion constant from the original RRF paper
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], n_results: int, k: int = RRF_K) -> List[int]:
+    """Merge ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking):
+            scores[idx] = scores.get(idx, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda idx: (-scores[idx], idx))[:n_results]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a collection's chunks, stored next to its segment files:
+
+    <name>_bm25_terms.txt     vocabulary, one term per line (line number = term id)
+    <name>_bm25_postings.u32  (term id, term frequency) pairs, chunk after chunk
+    <name>_bm25_offsets.u64   end of each chunk's pairs in postings.u32
+
+    Append-only like SegmentStore, with the offsets file as the commit
+    point. The inverted (term -> chunks) arrays are rebuilt in memory from
+    the pairs the first time a search follows an append.
+    """
+
+    def __init__(self, db_path: str, collection_name: str, k1: float = 1.2, b: float = 0.75):
+        prefix = os.path.join(db_path, collection_name)
+        self.terms_file = f"{prefix}_bm25_terms.txt"
+        self.postings_file = f"{prefix}_bm25_postings.u32"
+        self.offsets_file = f"{prefix}_bm25_offsets.u64"
+        self.k1 = k1
+        self.b = b
+
+        self.count = 0
+        self.terms: List[str] = []
+        self.vocab: Dict[str, int] = {}
+        self._offsets = np.zeros(0, dtype='uint64')
+        self._pairs: List[np.ndarray] = []
+        self._inverted = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def exists(cls, db_path: str, collection_name: str) -> bool:
+        return os.path.exists(os.path.join(db_path, f"{collection_name}_bm25_offsets.u64"))
+
+    def create(self):
+        for path in (self.terms_file, self.postings_file, self.offsets_file):
+            open(path, 'wb').close()
+        self.count = 0
+        self.terms, self.vocab = [], {}
+        self._offsets = np.zeros(0, dtype='uint64')
+        self._pairs = []
+        self._inverted = None
+        return self
+
+    def open(self):
+        if not os.path.exists(self.offsets_file):
+            return self.create()
+
+        with open(self.terms_file, 'rb') as f:
+            data = f.read()
+        # A term cut off mid-line by a crash was never referenced by a committed chunk
+        complete = data[:data.rfind(b"\n") + 1]
+        if len(complete) != len(data):
+            os.truncate(self.terms_file, len(complete))
+        self.terms = complete.decode('utf-8').splitlines()
+        self.vocab = {term: i for i, term in enumerate(self.terms)}
+
+        self._offsets = np.fromfile(self.offsets_file, dtype='uint64')
+        self.count = len(self._offsets)
+        if os.path.getsize(self.offsets_file) != self.count * 8:
+            os.truncate(self.offsets_file, self.count * 8)
+        pair_end = int(self._offsets[-1]) if self.count else 0
+        if os.path.getsize(self.postings_file) != pair_end * 8:
+            os.truncate(self.postings_file, pair_end * 8)
+        self._pairs = [np.fromfile(self.postings_file, dtype='uint32').reshape(-1, 2)]
+        self._inverted = None
+        return self
+
+    def sync(self, texts: Sequence[str]):
+        """Match the chunk count of the segment store: index missing chunks, drop extra ones."""
+        if self.count > len(texts):
+            self._truncate(len(texts))
+        elif self.count < len(texts):
+            self.append([texts[i] for i in range(self.count, len(texts))])
+
+    def _truncate(self, count: int):
+        pair_end = int(self._offsets[count - 1]) if count else 0
+        os.truncate(self.postings_file, pair_end * 8)
+        os.truncate(self.offsets_file, count * 8)
+        self.open()
+
+    def append(self, chunks: List[str]):
+        if not chunks:
+            return
+        new_terms = []
+        rows, lengths = [], []
+        for chunk in chunks:
+            counts: Dict[int, int] = {}
+            for token in tokenize(chunk):
+                term_id = self.vocab.get(token)
+                if term_id is None:
+                    term_id = self.vocab[token] = len(self.terms)
+                    self.terms.append(token)
+                    new_terms.append(token)
+                counts[term_id] = counts.get(term_id, 0) + 1
+            rows.extend(counts.items())
+            lengths.append(len(counts))
+        pairs = np.array(rows, dtype='uint32').reshape(-1, 2)
+        start = int(self._offsets[-1]) if self.count else 0
+        ends = start + np.cumsum(lengths, dtype='uint64')
+
+        with open(self.terms_file, 'ab') as f:
+            f.write("".join(term + "\n" for term in new_terms).encode('utf-8'))
+        with open(self.postings_file, 'ab') as f:
+            f.write(pairs.tobytes())
+        with open(self.offsets_file, 'ab') as f:
+            f.write(ends.tobytes())
+
+        with self._lock:
+            self._pairs.append(pairs)
+            self._offsets = np.concatenate([self._offsets, ends])
+            self.count = len(self._offsets)
+            self._inverted = None
+
+    def _build(self):
+        pairs = np.concatenate(self._pairs) if self._pairs else np.zeros((0, 2), dtype='uint32')
+        self._pairs = [pairs]
+        term_ids, tfs = pairs[:, 0], pairs[:, 1].astype('float32')
+        docs = np.repeat(np.arange(self.count, dtype='uint32'), np.diff(self._offsets, prepend=np.uint64(0)).astype('int64'))
+
+        # Postings grouped by term: term t owns [starts[t], starts[t + 1])
+        order = np.argsort(term_ids, kind='stable')
+        starts = np.zeros(len(self.terms) + 1, dtype='int64')
+        starts[1:] = np.cumsum(np.bincount(term_ids, minlength=len(self.terms)))
+
+        lengths = np.bincount(docs, weights=tfs, minlength=self.count).astype('float32')
+        average = lengths.mean() if self.count else 1.0
+        # The document-length part of the BM25 denominator, per chunk
+        norms = self.k1 * (1 - self.b + self.b * lengths / max(average, 1e-9))
+        self._inverted = (starts, docs[order], tfs[order], norms)
+
+    def search(self, query: str, n_results: int) -> Tuple[List[int], List[float]]:
+        """Top n_results chunk ids by BM25 score, and their scores; chunks sharing no term are left out."""
+        term_ids = {self.vocab[token] for token in tokenize(query) if token in self.vocab}
+        if not term_ids or not self.count or n_results <= 0:
+            return [], []
+        with self._lock:
+            if self._inverted is None:
+                self._build()
+            starts, docs, tfs, norms = self._inverted
+
+        # Sized from the built arrays, in case an append landed since
+        count = len(norms)
+        scores = np.zeros(count, dtype='float32')
+        for term_id in term_ids:
+            if term_id + 1 >= len(starts):
+                continue  # term first seen in a newer append
+            start, end = starts[term_id], starts[term_id + 1]
+            postings, tf = docs[start:end], tfs[start:end]
+            idf = math.log(1 + (count - (end - start) + 0.5) / ((end - start) + 0.5))
+            scores[postings] += idf * tf * (self.k1 + 1) / (tf + norms[postings])
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > n_results:
+            hits = hits[np.argpartition(-scores[hits], n_results - 1)[:n_results]]
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return hits.tolist(), scores[hits].tolist()
+
+    def memory_bytes(self) -> int:
+        pairs = sum(p.nbytes for p in self._pairs)
+        inverted = sum(a.nbytes for a in self._inverted) if self._inverted else 0
+        return pairs + inverted + self._offsets.nbytes + sum(len(t) + 50 for t in self.terms)
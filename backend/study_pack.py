@@ -0,0 +1,116 @@
+import asyncio
+import os
+from typing import Dict, Optional
+
+from backend.generator import ContentGenerator
+from backend.rag_engine import RAGEngine
+from backend.tracing import get_tracer
+
+# Retrieval query and context size per artifact, as used by the individual tabs
+PACK_RETRIEVALS = {
+    "quiz": ("main concepts and important topics", 5),
+    "lesson": (None, 5),
+    "summary": ("comprehensive overview all main topics key points", 10),
+    "mindmap": ("all topics subtopics concepts hierarchy structure", 10),
+    "flashcards": ("key terms definitions important concepts", 5),
+    "explanations": (None, 3)
+}
+
+# Context-packing budget each artifact uses (see backend.context_packer)
+PACK_FEATURES = {name: name for name in PACK_RETRIEVALS}
+PACK_FEATURES["explanations"] = "explain"
+
+DEFAULT_TOPIC = "the main concepts in these notes"
+
+
+def build_study_pack(
+    rag_engine: RAGEngine,
+    generator: ContentGenerator,
+    collection_name: str,
+    topic: Optional[str] = None,
+    num_questions: int = 5,
+    quiz_type: str = "mcq",
+    num_cards: int = 10,
+    concurrency: Optional[int] = None,
+    use_cache: bool = True
+) -> Dict:
+    """
+    Build quiz, lesson, summary, mind map, flashcards and multi-level
+    explanation for one document in one go. Blocking wrapper around
+    abuild_study_pack for the Streamlit script thread.
+    """
+    return asyncio.run(abuild_study_pack(
+        rag_engine, generator, collection_name, topic, num_questions, quiz_type, num_cards, concurrency, use_cache
+    ))
+
+
+async def abuild_study_pack(
+    rag_engine: RAGEngine,
+    generator: ContentGenerator,
+    collection_name: str,
+    topic: Optional[str] = None,
+    num_questions: int = 5,
+    quiz_type: str = "mcq",
+    num_cards: int = 10,
+    concurrency: Optional[int] = None,
+    use_cache: bool = True,
+    client=None,
+    semaphore: Optional[asyncio.Semaphore] = None
+) -> Dict:
+    """
+    client and semaphore let a long-running server share one AsyncGroq
+    client and one LLM concurrency cap across requests; by default the
+    call opens its own client, capped at concurrency.
+    """
+    with get_tracer().span("study_pack", collection=collection_name):
+        return await _build(
+            rag_engine, generator, collection_name, topic, num_questions, quiz_type, num_cards, concurrency, use_cache,
+            client, semaphore
+        )
+
+
+async def _build(rag_engine, generator, collection_name, topic, num_questions, quiz_type, num_cards, concurrency,
+                 use_cache, client=None, semaphore=None) -> Dict:
+    topic = topic or DEFAULT_TOPIC
+    if concurrency is None:
+        concurrency = int(os.getenv("NOTEMATE_LLM_CONCURRENCY", "4"))
+
+    # All retrievals go out as one batch: one encode call, one FAISS search
+    names = list(PACK_RETRIEVALS)
+    queries = [PACK_RETRIEVALS[name][0] or topic for name in names]
+    counts = [PACK_RETRIEVALS[name][1] for name in names]
+    contexts = dict(zip(names, await asyncio.to_thread(
+        rag_engine.query_batch, collection_name, queries, counts
+    )))
+
+    prompts = {
+        "quiz": generator.quiz_prompt(num_questions, quiz_type),
+        "lesson": generator.lesson_prompt(topic),
+        "summary": generator.summary_prompt(),
+        "mindmap": generator.mindmap_prompt(),
+        "flashcards": generator.flashcards_prompt(num_cards),
+        "explanations": generator.explain_prompt(topic)
+    }
+
+    # Every LLM call runs concurrently, capped by the semaphore
+    semaphore = semaphore or asyncio.Semaphore(concurrency)
+
+    async def generate_all(client):
+        return await asyncio.gather(*[
+            generator.agenerate_with_context(
+                prompts[name], contexts[name], client, semaphore, use_cache, PACK_FEATURES[name]
+            )
+            for name in names
+        ])
+
+    if client is not None:
+        outputs = await generate_all(client)
+    else:
+        async with generator.async_client() as client:
+            outputs = await generate_all(client)
+    pack = dict(zip(names, outputs))
+
+    pack["quiz"] = {"content": pack["quiz"]}
+    pack["explanations"] = generator.split_levels(pack["explanations"])
+    pack["topic"] = topic
+    return pack
@@ -0,0 +1,162 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from backend.generator import ERROR_PREFIX, ContentGenerator
+from backend.rag_engine import RAGEngine, RetrievedChunks
+
+
+def summary_tree_path(db_path: str, collection_name: str) -> str:
+    return os.path.join(db_path, f"{collection_name}_summary.json")
+
+
+def build_summary_tree(
+    rag_engine: RAGEngine,
+    generator: ContentGenerator,
+    collection_name: str,
+    group_size: int = 8,
+    fan_in: int = 4,
+    workers: int = 4,
+    on_progress: Optional[Callable[..., None]] = None
+) -> Optional[Dict]:
+    """
+    Map-reduce summary of a whole collection, built once at ingest:
+
+    map     every group_size consecutive chunks -> one section summary
+    reduce  every fan_in summaries -> one summary, repeated until one remains
+    finally a mind map generated from the section summaries
+
+    Calls in one level run in parallel. The tree is saved next to the
+    collection as <name>_summary.json, with the section summary vectors in
+    <name>_summary.npy for coarse retrieval. Returns None if any call failed,
+    so a half-built tree is never cached.
+
+    on_progress("summarizing", summaries_done=..., summary_level=...),
+    if given, is called after every summary; it may raise to abort the
+    build (e.g. a cancelled background job), and calls not yet started are
+    then dropped.
+    """
+    chunks = rag_engine.chunks(collection_name)
+    if not chunks:
+        return None
+
+    sections = []
+    for start in range(0, len(chunks), group_size):
+        end = min(start + group_size, len(chunks))
+        sections.append({"start": start, "end": end, "chunks": chunks[start:end]})
+
+    report = on_progress or (lambda stage, **counters: None)
+    done = 0
+
+    def summarize(prompt, contexts, feature, level):
+        # In order, reporting each summary as it arrives
+        nonlocal done
+        summaries = []
+        for summary in pool.map(lambda context: generator.generate_with_context(prompt, context, feature=feature),
+                                contexts):
+            summaries.append(summary)
+            done += 1
+            report("summarizing", summaries_done=done, summary_level=level)
+        return summaries
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        # Map
+        summaries = summarize(
+            generator.section_summary_prompt(), [section["chunks"] for section in sections], "section_summary", 0
+        )
+        if any(summary.startswith(ERROR_PREFIX) for summary in summaries):
+            return None
+        levels = [[
+            {"summary": summary, "start": section["start"], "end": section["end"]}
+            for section, summary in zip(sections, summaries)
+        ]]
+
+        # Reduce
+        while len(levels[-1]) > 1:
+            groups = [levels[-1][i:i + fan_in] for i in range(0, len(levels[-1]), fan_in)]
+            summaries = summarize(
+                generator.combine_summaries_prompt(), [[node["summary"] for node in group] for group in groups],
+                "combine_summaries", len(levels)
+            )
+            if any(summary.startswith(ERROR_PREFIX) for summary in summaries):
+                return None
+            levels.append([
+                {"summary": summary, "start": group[0]["start"], "end": group[-1]["end"]}
+                for group, summary in zip(groups, summaries)
+            ])
+    finally:
+        # On an abort, queued calls are dropped rather than waited for
+        pool.shutdown(cancel_futures=True)
+    report("summarizing", summaries_done=done, summary_level=len(levels))
+
+    # Mind map over the section summaries covers the whole document
+    mindmap = generator.generate_mindmap(_top_sections(levels))
+    if mindmap.startswith(ERROR_PREFIX):
+        mindmap = None
+
+    tree = {
+        "collection": collection_name,
+        "chunks": len(chunks),
+        "levels": levels,
+        "document": levels[-1][0]["summary"],
+        "mindmap": mindmap
+    }
+
+    path = summary_tree_path(rag_engine.db_path, collection_name)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(tree, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+    section_vectors = rag_engine.embedder.encode([node["summary"] for node in levels[0]])
+    np.save(path.replace(".json", ".npy"), section_vectors.astype('float32'))
+    return tree
+
+
+def _top_sections(levels: List[List[Dict]], max_nodes: int = 12) -> List[str]:
+    # The most detailed level that still fits in one prompt
+    for level in levels:
+        if len(level) <= max_nodes:
+            return [node["summary"] for node in level]
+    return [node["summary"] for node in levels[-1]]
+
+
+def load_summary_tree(db_path: str, collection_name: str) -> Optional[Dict]:
+    path = summary_tree_path(db_path, collection_name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except:
+        return None
+
+
+def coarse_query(
+    rag_engine: RAGEngine,
+    collection_name: str,
+    query_text: str,
+    tree: Dict,
+    n_sections: int = 3,
+    n_results: int = 5
+) -> RetrievedChunks:
+    """
+    Two-level retrieval: pick the sections whose summaries best match the
+    query, then search only the chunks inside those sections.
+    """
+    vectors_path = summary_tree_path(rag_engine.db_path, collection_name).replace(".json", ".npy")
+    if not os.path.exists(vectors_path) or len(tree["levels"][0]) < 2 * n_sections:
+        # Too few sections for the first level to narrow anything down
+        return rag_engine.query(collection_name, query_text, n_results)
+
+    section_vectors = np.load(vectors_path, mmap_mode='r')
+    query_embedding = rag_engine.embedder.encode([query_text])[0]
+    distances = ((section_vectors - query_embedding) ** 2).sum(axis=1)
+    best = np.argsort(distances)[:n_sections]
+
+    sections = tree["levels"][0]
+    ranges = [(sections[i]["start"], sections[i]["end"]) for i in sorted(best)]
+    return rag_engine.query_ranges(collection_name, query_text, ranges, n_results, query_embedding)
@@ -0,0 +1,226 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# Histogram buckets (seconds) for span durations: sub-ms searches up to long LLM calls
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_span = contextvars.ContextVar("notemate_span", default=None)
+
+
+class Span:
+    """One timed step. Numeric attributes are also summed into the metrics."""
+
+    def __init__(self, name: str, attributes: Dict, parent: Optional["Span"] = None):
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.parent_id = parent.id if parent else None
+        self.attributes = dict(attributes)
+        self.error = None
+        self.start = time.time()
+        self.duration = 0.0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def set_error(self, error):
+        self.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class _SpanStats:
+    def __init__(self, keep: int):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.attributes: Dict[str, float] = {}
+        self.recent = deque(maxlen=keep)  # durations, for percentiles
+
+
+class Tracer:
+    """
+    In-process tracing for the ingest, retrieval and generation paths.
+
+    Spans nest through a context variable, so child spans opened in the same
+    thread or asyncio task share their parent's trace id. Every finished span
+    updates per-name metrics (count, duration histogram, summed numeric
+    attributes) exported in Prometheus text format; with jsonl_path set it is
+    also appended there as one JSON line.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None, keep_recent: int = 500):
+        self.jsonl_path = jsonl_path
+        self.keep_recent = keep_recent
+        self._stats: Dict[str, _SpanStats] = {}
+        self._recent = deque(maxlen=keep_recent)
+        self._lock = threading.Lock()
+        self._jsonl = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        span = Span(name, attributes, _current_span.get())
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration = time.perf_counter() - start
+            self._finish(span)
+
+    def record(self, name: str, seconds: float, error=None, **attributes) -> Span:
+        """Add a span timed elsewhere, e.g. in a worker process or across generator yields."""
+        span = Span(name, attributes, _current_span.get())
+        span.start = time.time() - seconds
+        span.duration = seconds
+        if error is not None:
+            span.set_error(error)
+        self._finish(span)
+        return span
+
+    def _finish(self, span: Span):
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = _SpanStats(self.keep_recent)
+            stats.count += 1
+            stats.total += span.duration
+            stats.recent.append(span.duration)
+            if span.error:
+                stats.errors += 1
+            for i, bound in enumerate(BUCKETS):
+                if span.duration <= bound:
+                    stats.buckets[i] += 1
+            for key, value in span.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stats.attributes[key] = stats.attributes.get(key, 0) + value
+            self._recent.append(span)
+            if self._jsonl:
+                self._jsonl.write(json.dumps(span.to_dict(), default=str) + "\n")
+                self._jsonl.flush()
+
+    def stats(self) -> List[Dict]:
+        """Per-span summary, slowest total first (what the debug panel shows)."""
+        with self._lock:
+            rows = []
+            for name, stats in self._stats.items():
+                recent = sorted(stats.recent)
+                rows.append({
+                    "span": name,
+                    "count": stats.count,
+                    "total_s": round(stats.total, 3),
+                    "mean_ms": round(stats.total / stats.count * 1000, 2),
+                    "p50_ms": round(recent[len(recent) // 2] * 1000, 2),
+                    "p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 2),
+                    "errors": stats.errors,
+                    **{key: round(value, 2) for key, value in stats.attributes.items()}
+                })
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+    def recent(self, n: int = 50) -> List[Dict]:
+        with self._lock:
+            return [span.to_dict() for span in list(self._recent)[-n:]]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._recent.clear()
+
+    def prometheus_text(self) -> str:
+        lines = [
+            "# HELP notemate_span_duration_seconds Time spent in each traced step.",
+            "# TYPE notemate_span_duration_seconds histogram"
+        ]
+        with self._lock:
+            items = sorted(self._stats.items())
+            for name, stats in items:
+                # Prometheus buckets are cumulative; ours are already counted as <= bound
+                for bound, count in zip(BUCKETS, stats.buckets):
+                    lines.append(f'notemate_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+                lines.append(f'notemate_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {stats.count}')
+                lines.append(f'notemate_span_duration_seconds_sum{{span="{name}"}} {stats.total:.6f}')
+                lines.append(f'notemate_span_duration_seconds_count{{span="{name}"}} {stats.count}')
+
+            lines.append("# HELP notemate_span_errors_total Spans that ended in an error.")
+            lines.append("# TYPE notemate_span_errors_total counter")
+            for name, stats in items:
+                lines.append(f'notemate_span_errors_total{{span="{name}"}} {stats.errors}')
+
+            lines.append("# HELP notemate_span_attribute_total Sum of a numeric span attribute (chunks, tokens, cache hits, ...).")
+            lines.append("# TYPE notemate_span_attribute_total counter")
+            for name, stats in items:
+                for key, value in sorted(stats.attributes.items()):
+                    lines.append(f'notemate_span_attribute_total{{span="{name}",attribute="{key}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def start_metrics_server(self, port: int, host: str = "0.0.0.0"):
+        """Serve prometheus_text() on http://host:port/metrics from a daemon thread."""
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, name="metrics", daemon=True).start()
+        return httpd
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """
+    Process-wide tracer. NOTEMATE_TRACE_JSONL appends every span to that
+    file; NOTEMATE_METRICS_PORT serves Prometheus metrics on that port.
+    """
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(jsonl_path=os.getenv("NOTEMATE_TRACE_JSONL") or None)
+            port = os.getenv("NOTEMATE_METRICS_PORT")
+            if port:
+                try:
+                    _tracer.start_metrics_server(int(port))
+                except OSError:
+                    # Another process (e.g. a second Streamlit worker) already serves it
+                    pass
+        return _tracer
@@ -0,0 +1,63 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from backend.tracing import get_tracer
+
+# Imported as early as possible, so startup times count from (nearly) process start
+PROCESS_START = time.perf_counter()
+
+_state: Dict = {"status": "idle", "seconds": None, "error": None, "interactive_s": None}
+_lock = threading.Lock()
+
+
+def start_warmup(model_name: Optional[str] = None, backend: Optional[str] = None) -> bool:
+    """
+    Load the embedding model and run one dummy encode on a daemon thread,
+    so the first upload or question doesn't pay for it. Runs once per
+    process; NOTEMATE_WARMUP=0 turns it off. Returns True if it started.
+    """
+    if os.getenv("NOTEMATE_WARMUP", "1") == "0":
+        return False
+    with _lock:
+        if _state["status"] != "idle":
+            return False
+        _state["status"] = "running"
+    threading.Thread(target=_warmup, args=(model_name, backend), name="warmup", daemon=True).start()
+    return True
+
+
+def _warmup(model_name: Optional[str], backend: Optional[str]):
+    from backend.embedder import MODEL_NAME, get_embedder
+
+    start = time.perf_counter()
+    try:
+        with get_tracer().span("startup.warmup", model=model_name or MODEL_NAME):
+            import faiss  # noqa: F401  (first import is a few hundred ms)
+            get_embedder(model_name or MODEL_NAME, backend).encode(["warm up"])
+        status, error = "ready", None
+    except Exception as e:
+        # Not fatal: the model is loaded again on first use and the error shows up there
+        status, error = "failed", f"{type(e).__name__}: {e}"
+    with _lock:
+        _state.update(status=status, seconds=round(time.perf_counter() - start, 3), error=error)
+
+
+def mark_interactive() -> Optional[float]:
+    """
+    Record the time from process start to the first finished page render
+    (once per process, as the startup.interactive span). Returns it.
+    """
+    with _lock:
+        if _state["interactive_s"] is not None:
+            return _state["interactive_s"]
+        seconds = time.perf_counter() - PROCESS_START
+        _state["interactive_s"] = round(seconds, 3)
+    get_tracer().record("startup.interactive", seconds)
+    return _state["interactive_s"]
+
+
+def warmup_status() -> Dict:
+    with _lock:
+        return dict(_state)
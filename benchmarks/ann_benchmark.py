@@ -0,0 +1,145 @@
+"""
+Recall-vs-latency benchmark for the index types RAGEngine can build.
+
+Compares every index kind from backend.index_factory against the exact
+flat baseline and reports recall@k with p50/p99 single-query latency for a
+sweep of nprobe / efSearch values, so the size thresholds in IndexConfig
+can be tuned from real numbers.
+
+Each kind is also built with float16 and int8 vector storage; those rows
+show the memory saved against float32 and the recall with and without
+exact re-ranking (IndexConfig.rerank times k candidates).
+
+    python -m benchmarks.ann_benchmark --synthetic 200000
+    python -m benchmarks.ann_benchmark --db-path ./vector_db --collection notes_pdf_1a2b3c4d5e6f
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from backend.index_factory import (FLAT, FLOAT32, HNSW, IVF_FLAT, IVF_PQ, STORAGE_TYPES, IndexConfig, build_index,
+                                   exact_rerank, index_memory_bytes, is_lossy, search_params)
+from backend.segment_store import SegmentStore
+
+SWEEPS = {
+    FLAT: [None],
+    HNSW: [16, 32, 64, 128, 256],
+    IVF_FLAT: [1, 4, 8, 16, 32, 64],
+    IVF_PQ: [1, 4, 8, 16, 32, 64]
+}
+
+
+def synthetic_vectors(n_vectors: int, dimension: int = 384, n_clusters: int = 200, seed: int = 0) -> np.ndarray:
+    # Unit-norm points around random topic centres, roughly how MiniLM embeddings cluster
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_clusters, dimension)).astype('float32')
+    labels = rng.integers(0, n_clusters, n_vectors)
+    vectors = centres[labels] + 0.6 * rng.standard_normal((n_vectors, dimension)).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, n_queries: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.choice(len(vectors), n_queries, replace=False)]
+    queries = picks + 0.1 * rng.standard_normal(picks.shape).astype('float32')
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.ascontiguousarray(queries, dtype='float32')
+
+
+def run(vectors: np.ndarray, n_queries: int, k: int, config: IndexConfig, storages=STORAGE_TYPES):
+    dimension = vectors.shape[1]
+    queries = make_queries(vectors, n_queries)
+
+    flat = build_index(FLAT, dimension, vectors, config, FLOAT32)
+    _, truth = flat.search(queries, k)
+
+    results = []
+    for kind, sweep in SWEEPS.items():
+        float32_bytes = None
+        for storage in storages:
+            if kind == IVF_PQ and storage != FLOAT32:
+                continue  # PQ codes are already compressed
+            start = time.perf_counter()
+            if kind == FLAT and storage == FLOAT32:
+                index = flat
+            else:
+                index = build_index(kind, dimension, vectors, config, storage)
+            build_seconds = time.perf_counter() - start
+            memory = index_memory_bytes(index, kind)
+            if storage == FLOAT32:
+                float32_bytes = memory
+
+            reranks = [1, config.rerank] if is_lossy(kind, storage) and config.rerank > 1 else [1]
+            for value in sweep:
+                params = search_params(kind, nprobe=value, ef_search=value)
+                for rerank in reranks:
+                    latencies = []
+                    found = []
+                    for i in range(n_queries):
+                        t0 = time.perf_counter()
+                        _, ids = index.search(queries[i:i + 1], k * rerank, params=params)
+                        ids = [int(idx) for idx in ids[0] if idx >= 0]
+                        if rerank > 1:
+                            ids = exact_rerank(vectors, queries[i], ids, k)
+                        latencies.append(time.perf_counter() - t0)
+                        found.append(ids[:k])
+
+                    recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(n_queries)])
+                    results.append({
+                        "kind": kind,
+                        "storage": storage,
+                        "rerank": rerank,
+                        "param": None if value is None else ("efSearch" if kind == HNSW else "nprobe"),
+                        "value": value,
+                        f"recall@{k}": round(float(recall), 4),
+                        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 3),
+                        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+                        "build_s": round(build_seconds, 2),
+                        "index_mb": round(memory / 1024 / 1024, 1),
+                        # Memory relative to the float32 build of the same kind
+                        "memory_saved": round(1 - memory / float32_bytes, 3) if float32_bytes else None
+                    })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=100_000, help="number of synthetic vectors")
+    parser.add_argument("--db-path", default=None, help="vector_db directory to read a real collection from")
+    parser.add_argument("--collection", default=None, help="collection name under --db-path")
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--storage", default=",".join(STORAGE_TYPES),
+                        help="comma-separated vector storages to compare (float32 first)")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write results to this file")
+    args = parser.parse_args()
+
+    if args.db_path and args.collection:
+        vectors = SegmentStore(args.db_path, args.collection, args.dimension).open().vectors()
+    else:
+        vectors = synthetic_vectors(args.synthetic, args.dimension)
+
+    storages = [s for s in args.storage.split(",") if s]
+    results = run(vectors, min(args.queries, len(vectors)), args.k, IndexConfig.from_env(), storages)
+
+    recall_key = f"recall@{args.k}"
+    print(f"{len(vectors)} vectors, {args.queries} queries, k={args.k}")
+    print(f"{'index':<10}{'storage':>9}{'rerank':>8}{'param':>14}{recall_key:>12}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'build s':>10}{'MB':>8}{'saved':>8}")
+    for row in results:
+        param = "" if row["value"] is None else f"{row['param']}={row['value']}"
+        saved = "" if row["memory_saved"] is None else f"{row['memory_saved']:.0%}"
+        print(f"{row['kind']:<10}{row['storage']:>9}{row['rerank']:>8}{param:>14}{row[recall_key]:>12.4f}"
+              f"{row['p50_ms']:>10.3f}{row['p99_ms']:>10.3f}{row['build_s']:>10.2f}{row['index_mb']:>8.1f}{saved:>8}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({"n_vectors": len(vectors), "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
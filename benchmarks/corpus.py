@@ -0,0 +1,108 @@
+"""
+Synthetic study-notes corpora for the benchmark suite.
+
+Text is generated from a fixed vocabulary with a seeded RNG, so the same
+arguments always give byte-identical files and runs stay comparable. PDFs
+are written directly (one Helvetica text stream per page) so no PDF
+library is needed to produce them.
+"""
+import os
+import random
+import textwrap
+from typing import Dict, List
+
+TOPICS = [
+    "photosynthesis", "cell division", "thermodynamics", "supply and demand", "the french revolution",
+    "linear algebra", "neural networks", "plate tectonics", "organic chemistry", "probability",
+    "the immune system", "electromagnetism", "cognitive biases", "data structures", "climate systems"
+]
+WORDS = (
+    "energy process system model theory structure function example result cause effect "
+    "rate change balance force pressure value measure pattern cycle stage factor level "
+    "input output reaction surface layer network signal response equation proof method "
+    "concept principle definition property evidence experiment variable constant ratio "
+    "increase decrease transfer storage release growth decay boundary region interaction"
+).split()
+CONNECTIVES = ["because", "therefore", "however", "for example", "in contrast", "as a result", "which means"]
+
+FORMATS = ("pdf", "docx", "txt")
+
+
+def make_pages(n_pages: int, words_per_page: int = 350, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    pages = []
+    for page_number in range(n_pages):
+        topic = TOPICS[page_number % len(TOPICS)]
+        sentences = [f"Chapter {page_number + 1}: notes on {topic}."]
+        count = 5
+        while count < words_per_page:
+            length = rng.randint(8, 18)
+            words = [rng.choice(WORDS) for _ in range(length)]
+            words.insert(rng.randint(1, length - 1), topic)
+            if rng.random() < 0.3:
+                words.insert(length // 2, rng.choice(CONNECTIVES))
+            sentences.append(" ".join(words).capitalize() + ".")
+            count += len(words)
+        pages.append(" ".join(sentences))
+    return pages
+
+
+def write_txt(path: str, pages: List[str]):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n\n".join(pages))
+
+
+def write_docx(path: str, pages: List[str]):
+    import docx
+
+    document = docx.Document()
+    for page in pages:
+        document.add_paragraph(page)
+    document.save(path)
+
+
+def write_pdf(path: str, pages: List[str]):
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    for i, page in enumerate(pages):
+        lines = textwrap.wrap(page, 95)
+        escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+        stream = "BT /F1 10 Tf 12 TL 50 750 Td " + " ".join(f"({line}) Tj T*" for line in escaped) + " ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "txt": write_txt}
+
+
+def make_corpus(out_dir: str, n_pages: int, formats=FORMATS, words_per_page: int = 350, seed: int = 0) -> Dict[str, str]:
+    """Write the same n_pages of notes once per format; returns {format: path}."""
+    os.makedirs(out_dir, exist_ok=True)
+    pages = make_pages(n_pages, words_per_page, seed)
+    paths = {}
+    for fmt in formats:
+        path = os.path.join(out_dir, f"notes_{n_pages}p.{fmt}")
+        WRITERS[fmt](path, pages)
+        paths[fmt] = path
+    return paths
@@ -0,0 +1,172 @@
+"""
+Startup-time benchmark: how long NoteMate takes to become interactive.
+
+Every measurement runs in a fresh Python process so nothing is already
+imported or loaded:
+
+- import:   importing the modules app.py needs, and which heavy libraries
+            (torch, faiss, groq, ...) that pulled in (should be none)
+- warmup:   the background warm-up: embedding model load + one encode
+- server:   `streamlit run app.py` until /_stcore/health answers
+
+    python -m benchmarks.startup --runs 3 --output startup.json
+    python -m benchmarks.startup --output new.json --compare startup.json
+
+The results use the benchmark-suite format, so --compare flags the same
+regressions as benchmarks.suite.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List
+
+from benchmarks.suite import compare, percentiles
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("torch", "transformers", "sentence_transformers", "onnxruntime", "faiss", "groq", "PyPDF2", "docx")
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import backend.catalog, backend.ingest, backend.jobs, backend.rag_engine, backend.study_pack
+import backend.summary_tree, backend.tracing, backend.generator, backend.warmup
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+WARMUP_SCRIPT = """
+import json, time
+from backend.warmup import PROCESS_START, start_warmup, warmup_status
+start_warmup(backend=%r)
+while warmup_status()["status"] == "running":
+    time.sleep(0.005)
+status = warmup_status()
+status["total"] = time.perf_counter() - PROCESS_START
+print(json.dumps(status))
+"""
+
+
+def _python(script: str) -> Dict:
+    env = dict(os.environ, NOTEMATE_WARMUP="1")
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "subprocess failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench_import(runs: int) -> Dict:
+    samples = [_python(IMPORT_SCRIPT % (HEAVY_MODULES,)) for _ in range(runs)]
+    return {
+        "name": "import",
+        **percentiles([s["seconds"] for s in samples]),
+        "heavy_loaded": ",".join(samples[0]["loaded"]) or "-"
+    }
+
+
+def bench_warmup(runs: int, backend: str = None) -> Dict:
+    samples = [_python(WARMUP_SCRIPT % (backend,)) for _ in range(runs)]
+    failed = [s["error"] for s in samples if s["status"] != "ready"]
+    if failed:
+        raise RuntimeError(f"warm-up failed: {failed[0]}")
+    return {
+        "name": "warmup",
+        "model_load_encode_s": round(min(s["seconds"] for s in samples), 3),
+        "process_to_ready_s": round(min(s["total"] for s in samples), 3)
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_server(runs: int, timeout: float = 120) -> Dict:
+    samples = []
+    for _ in range(runs):
+        port = _free_port()
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", "app.py", "--server.headless", "true",
+             "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+        )
+        try:
+            while True:
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError(f"streamlit did not become healthy within {timeout}s")
+                if process.poll() is not None:
+                    lines = process.stderr.read().strip().splitlines()
+                    raise RuntimeError(f"streamlit exited with code {process.returncode}: {lines[-1] if lines else ''}")
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                        if response.status == 200:
+                            break
+                except OSError:
+                    time.sleep(0.05)
+            samples.append(time.perf_counter() - start)
+        finally:
+            process.terminate()
+            process.wait()
+    return {"name": "server", "health_s": round(min(samples), 3)}
+
+
+def run(args) -> Dict:
+    results: Dict[str, List[Dict]] = {"startup": [bench_import(args.runs)]}
+    print_row(results["startup"][-1])
+    if not args.skip_warmup:
+        results["startup"].append(bench_warmup(args.runs, args.embed_backend))
+        print_row(results["startup"][-1])
+    if not args.skip_server:
+        results["startup"].append(bench_server(args.runs))
+        print_row(results["startup"][-1])
+    return {
+        "metadata": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args)
+        },
+        "results": results
+    }
+
+
+def print_row(row: Dict):
+    print(f"  {row['name']:<10}" + "  ".join(f"{k}={v}" for k, v in row.items() if k != "name"), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per measurement")
+    parser.add_argument("--embed-backend", default=None, help="embedding backend to warm up")
+    parser.add_argument("--skip-warmup", action="store_true")
+    parser.add_argument("--skip-server", action="store_true", help="don't start streamlit")
+    parser.add_argument("--output", default="startup_results.json")
+    parser.add_argument("--compare", default=None, help="previous results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown for --compare")
+    args = parser.parse_args()
+
+    report = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Local stand-in for the Groq chat completions API, for benchmarks and CI.
+
+Serves POST /openai/v1/chat/completions (the path the groq SDK calls) and
+/v1/chat/completions, plain JSON or SSE when "stream": true. Each reply
+waits latency_ms before the first token, then emits tokens at
+tokens_per_second, so generator timings behave like a real provider
+without any network access. The first fail_requests requests get an
+error reply instead (default 429 with retry-after), to exercise retries.
+
+    python -m benchmarks.stub_llm --port 8008 --latency-ms 300 --tokens-per-second 250
+    python -m benchmarks.stub_llm --fail-requests 3 --fail-status 503
+
+Point the app at it with GROQ_BASE_URL=http://127.0.0.1:8008.
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETION_PATHS = ("/openai/v1/chat/completions", "/v1/chat/completions")
+FILLER = "Answer based on the notes : the key idea is that each concept builds on the previous one".split()
+
+
+class StubLLMServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 200,
+                 tokens_per_second: float = 250, completion_tokens: int = 200, fail_requests: int = 0,
+                 fail_status: int = 429, retry_after: float = 0.1):
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.fail_requests = fail_requests
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.requests = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count_request(self) -> bool:
+        """Count a request; False when it should get the injected error."""
+        with self._lock:
+            self.requests += 1
+            if self.failed < self.fail_requests:
+                self.failed += 1
+                return False
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+
+    def finish_request(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def tokens(self, max_tokens) -> list:
+        n = min(self.completion_tokens, max_tokens or self.completion_tokens)
+        return [FILLER[i % len(FILLER)] for i in range(max(1, n))]
+
+
+def _make_handler(server: StubLLMServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if self.path.split("?")[0] not in COMPLETION_PATHS:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+                return
+            if not server.count_request():
+                headers = {"retry-after": str(server.retry_after)} if server.retry_after is not None else {}
+                kind = "rate_limit_exceeded" if server.fail_status == 429 else "server_error"
+                self._send_json(server.fail_status, {"error": {"message": "Injected failure", "type": kind}}, headers)
+                return
+            try:
+                self._complete(body)
+            finally:
+                server.finish_request()
+
+        def _complete(self, body):
+            tokens = server.tokens(body.get("max_tokens"))
+            prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+            model = body.get("model", "stub")
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            time.sleep(server.latency_ms / 1000)
+
+            if body.get("stream"):
+                self._stream(completion_id, model, tokens, prompt_tokens)
+            else:
+                # Whole reply takes as long as streaming it would
+                time.sleep(len(tokens) / server.tokens_per_second)
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": " ".join(tokens)},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(tokens),
+                        "total_tokens": prompt_tokens + len(tokens)
+                    }
+                })
+
+        def _stream(self, completion_id, model, tokens, prompt_tokens):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def event(delta, finish_reason=None, usage=None):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                }
+                if usage:
+                    chunk["x_groq"] = {"id": completion_id, "usage": usage}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+
+            start = time.perf_counter()
+            event({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                # Pace against the start time so sleep overhead doesn't accumulate
+                delay = start + i / server.tokens_per_second - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                event({"content": token if i == 0 else " " + token})
+            event({}, "stop", {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens)
+            })
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _send_json(self, status, payload, headers=None):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8008)
+    parser.add_argument("--latency-ms", type=float, default=200, help="delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=250)
+    parser.add_argument("--completion-tokens", type=int, default=200, help="reply length (capped by max_tokens)")
+    parser.add_argument("--fail-requests", type=int, default=0, help="error replies before serving normally")
+    parser.add_argument("--fail-status", type=int, default=429)
+    parser.add_argument("--retry-after", type=float, default=0.1, help="retry-after seconds sent with errors")
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.host, args.port, args.latency_ms, args.tokens_per_second, args.completion_tokens,
+                           args.fail_requests, args.fail_status, args.retry_after)
+    print(f"Stub LLM listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+End-to-end performance benchmark for NoteMate, runnable offline.
+
+For each corpus size (in pages) it generates the same synthetic notes as
+PDF, DOCX and TXT, then measures:
+
+  parse    DocumentParser throughput per format (pages/s, MB/s)
+  chunk    token chunking throughput (chunks/s)
+  index    RAGEngine.add_documents embed + index throughput, the time spent
+           in _save_collection, and resident index size (see --storage)
+  load     _load_collection time for the collection from a fresh engine
+  query    query p50/p99 latency at that collection size
+  llm      ContentGenerator against a local stub server (benchmarks.stub_llm):
+           blocking, streaming (time to first token), cache hits, study pack
+
+Results go to a JSON file; --compare flags metrics that got worse than a
+previous run by more than --threshold and exits non-zero, for CI.
+
+    python -m benchmarks.suite --sizes 10,50,200 --output bench.json
+    python -m benchmarks.suite --quick --output new.json --compare bench.json
+
+The embedding model must already be in the local Hugging Face cache.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.document_parser import DocumentParser
+from backend.embedder import get_embedder
+from backend.embedding_backends import EMBEDDING_BACKENDS
+from backend.generator import ContentGenerator
+from backend.index_factory import STORAGE_TYPES
+from backend.ingest import iter_document_text
+from backend.rag_engine import DENSE, RETRIEVAL_MODES, RAGEngine
+from backend.response_cache import ResponseCache
+from backend.study_pack import build_study_pack
+from benchmarks.corpus import FORMATS, TOPICS, make_corpus
+from benchmarks.stub_llm import StubLLMServer
+
+# Suffix of a metric name -> whether a bigger value is better
+DIRECTIONS = {"_per_s": True, "_ms": False, "_s": False}
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(samples, 99)) * 1000, 3)
+    }
+
+
+def bench_parse(paths: Dict[str, str], n_pages: int, workers: int) -> Tuple[List[Dict], List[str]]:
+    rows = []
+    pages = None
+    for fmt, path in paths.items():
+        start = time.perf_counter()
+        texts = list(iter_document_text(path, workers))
+        seconds = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        rows.append({
+            "name": f"{fmt}.{n_pages}p",
+            "file_mb": round(size_mb, 3),
+            "chars": sum(len(t) for t in texts),
+            "seconds_s": round(seconds, 4),
+            "pages_per_s": round(n_pages / seconds, 1),
+            "mb_per_s": round(size_mb / seconds, 3)
+        })
+        if fmt == "pdf" or pages is None:
+            pages = texts
+    return rows, pages
+
+
+def bench_chunk(pages: List[str], n_pages: int, embedder) -> Tuple[Dict, List[Dict]]:
+    start = time.perf_counter()
+    chunks = list(DocumentParser.stream_token_chunks(pages, embedder.tokenizer, max_tokens=embedder.max_tokens))
+    seconds = time.perf_counter() - start
+    return {
+        "name": f"{n_pages}p",
+        "chunks": len(chunks),
+        "seconds_s": round(seconds, 4),
+        "chunks_per_s": round(len(chunks) / seconds, 1)
+    }, chunks
+
+
+def bench_index(engine: RAGEngine, name: str, chunks: List[Dict], n_pages: int, batch_size: int,
+                storage: Optional[str] = None) -> Dict:
+    # Time spent appending to disk, measured inside add_documents
+    save_seconds = []
+    save_collection = engine._save_collection
+
+    def timed_save(*args, **kwargs):
+        t0 = time.perf_counter()
+        save_collection(*args, **kwargs)
+        save_seconds.append(time.perf_counter() - t0)
+
+    engine._save_collection = timed_save
+    try:
+        engine.create_collection(name, storage)
+        start = time.perf_counter()
+        for i in range(0, len(chunks), batch_size):
+            batch = chunks[i:i + batch_size]
+            engine.add_documents(name, [c["text"] for c in batch], spans=[(c["start"], c["end"]) for c in batch])
+        seconds = time.perf_counter() - start
+    finally:
+        del engine._save_collection
+
+    collection = engine._get_collection(name)
+    return {
+        "name": f"{n_pages}p",
+        "chunks": len(chunks),
+        "index_kind": collection.kind,
+        "storage": collection.storage,
+        "seconds_s": round(seconds, 4),
+        "chunks_per_s": round(len(chunks) / seconds, 1),
+        "save_s": round(sum(save_seconds), 4),
+        "disk_mb": round(engine.disk_bytes(name) / 1024 / 1024, 3),
+        "index_mb": round(collection.memory_bytes() / 1024 / 1024, 3)
+    }
+
+
+def bench_load(db_path: str, name: str, embedder, n_pages: int) -> Dict:
+    # A fresh engine has nothing resident, so this is a cold open from disk
+    engine = RAGEngine(db_path, embedder=embedder)
+    start = time.perf_counter()
+    loaded = engine._load_collection(name)
+    seconds = time.perf_counter() - start
+    return {"name": f"{n_pages}p", "loaded": bool(loaded), "load_ms": round(seconds * 1000, 3)}
+
+
+def make_query_texts(n_queries: int, seed: int = 2) -> List[str]:
+    rng = random.Random(seed)
+    templates = ["what is {}", "explain {} with an example", "key definitions in {}", "how does {} change over time"]
+    return [rng.choice(templates).format(rng.choice(TOPICS)) for _ in range(n_queries)]
+
+
+def bench_query(engine: RAGEngine, name: str, queries: List[str], n_pages: int, chunks: int, k: int,
+                mode: str = DENSE) -> Dict:
+    # Warm up the embedder and index before timing
+    engine.query(name, queries[0], k, mode=mode)
+    latencies = []
+    for text in queries:
+        t0 = time.perf_counter()
+        engine.query(name, text, k, mode=mode)
+        latencies.append(time.perf_counter() - t0)
+    # Dense rows keep their original names so older result files still compare
+    label = f"{n_pages}p" if mode == DENSE else f"{n_pages}p-{mode}"
+    return {"name": label, "chunks": chunks, "k": k, **percentiles(latencies)}
+
+
+def bench_llm(engine: RAGEngine, name: str, work_dir: str, args) -> List[Dict]:
+    rows = []
+    with StubLLMServer(latency_ms=args.llm_latency_ms, tokens_per_second=args.llm_tokens_per_second,
+                       completion_tokens=args.llm_completion_tokens) as server:
+        generator = ContentGenerator(
+            api_key="stub",
+            cache=ResponseCache(os.path.join(work_dir, "llm_cache.sqlite")),
+            base_url=server.url
+        )
+        context = engine.query(name, "main concepts and important topics", 5)
+        prompt = generator.summary_prompt()
+
+        latencies = []
+        for _ in range(args.llm_calls):
+            t0 = time.perf_counter()
+            generator.generate_with_context(prompt, context, use_cache=False, feature="summary")
+            latencies.append(time.perf_counter() - t0)
+        rows.append({"name": "generate", "calls": args.llm_calls, **percentiles(latencies)})
+
+        first_token = []
+        totals = []
+        for _ in range(args.llm_calls):
+            t0 = time.perf_counter()
+            for i, _delta in enumerate(generator.stream_with_context(prompt, context, use_cache=False, feature="summary")):
+                if i == 0:
+                    first_token.append(time.perf_counter() - t0)
+            totals.append(time.perf_counter() - t0)
+        rows.append({
+            "name": "stream",
+            "calls": args.llm_calls,
+            "first_token_p50_ms": round(float(np.percentile(first_token, 50)) * 1000, 3),
+            **percentiles(totals)
+        })
+
+        # The calls above left this prompt in the response cache
+        hits = []
+        for _ in range(args.llm_calls):
+            t0 = time.perf_counter()
+            generator.generate_with_context(prompt, context, use_cache=True, feature="summary")
+            hits.append(time.perf_counter() - t0)
+        rows.append({"name": "cache_hit", "calls": args.llm_calls, **percentiles(hits)})
+
+        # Concurrent identical requests for a prompt not yet cached share one upstream call
+        requests_before = server.requests
+        mindmap = generator.mindmap_prompt()
+        with ThreadPoolExecutor(max_workers=args.llm_calls) as pool:
+            t0 = time.perf_counter()
+            list(pool.map(lambda _: generator.generate_with_context(mindmap, context, feature="mindmap"),
+                          range(args.llm_calls)))
+        rows.append({
+            "name": "coalesced",
+            "calls": args.llm_calls,
+            "llm_requests": server.requests - requests_before,
+            "wall_s": round(time.perf_counter() - t0, 4)
+        })
+
+        requests_before = server.requests
+        t0 = time.perf_counter()
+        build_study_pack(engine, generator, name, use_cache=False)
+        rows.append({
+            "name": "study_pack",
+            "llm_requests": server.requests - requests_before,
+            "wall_s": round(time.perf_counter() - t0, 4)
+        })
+    return rows
+
+
+def run(args) -> Dict:
+    sizes = [int(s) for s in args.sizes.split(",")]
+    work_dir = tempfile.mkdtemp(prefix="notemate-bench-")
+    embedder = get_embedder(backend=args.embed_backend)
+    results = {section: [] for section in ("parse", "chunk", "index", "load", "query", "llm")}
+    try:
+        # One fresh db so no run starts with a warm embedding cache
+        db_path = os.path.join(work_dir, "vector_db")
+        engine = RAGEngine(db_path, embedder=embedder)
+        queries = make_query_texts(args.queries)
+
+        name = None
+        for n_pages in sizes:
+            print(f"[{n_pages} pages]", file=sys.stderr)
+            paths = make_corpus(os.path.join(work_dir, "corpus"), n_pages, FORMATS, args.words_per_page, seed=n_pages)
+            rows, pages = bench_parse(paths, n_pages, args.workers)
+            results["parse"].extend(rows)
+
+            chunk_row, chunks = bench_chunk(pages, n_pages, embedder)
+            results["chunk"].append(chunk_row)
+
+            name = f"bench_{n_pages}p"
+            results["index"].append(bench_index(engine, name, chunks, n_pages, args.batch_size, args.storage))
+            results["load"].append(bench_load(db_path, name, embedder, n_pages))
+            for mode in RETRIEVAL_MODES:
+                results["query"].append(bench_query(engine, name, queries, n_pages, len(chunks), args.k, mode))
+
+        if not args.skip_llm and name:
+            print("[llm]", file=sys.stderr)
+            results["llm"] = bench_llm(engine, name, work_dir, args)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {"meta": run_metadata(args, embedder), "results": results}
+
+
+def run_metadata(args, embedder) -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except:
+        commit = None
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "embedder": embedder.model_name,
+        "embed_backend": args.embed_backend,
+        "args": vars(args)
+    }
+
+
+def flatten(report: Dict) -> Dict[str, float]:
+    metrics = {}
+    for section, rows in report["results"].items():
+        for row in rows:
+            for key, value in row.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metrics[f"{section}.{row['name']}.{key}"] = value
+    return metrics
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """Metrics that moved the wrong way by more than threshold (a fraction)."""
+    old = flatten(baseline)
+    regressions = []
+    for key, value in flatten(current).items():
+        if key not in old or not old[key]:
+            continue
+        for suffix, higher_is_better in DIRECTIONS.items():
+            if key.endswith(suffix):
+                change = (value - old[key]) / abs(old[key])
+                if (-change if higher_is_better else change) > threshold:
+                    regressions.append(f"{key}: {old[key]} -> {value} ({change:+.0%})")
+                break
+    return regressions
+
+
+def print_report(report: Dict):
+    for section, rows in report["results"].items():
+        if not rows:
+            continue
+        print(f"\n{section}")
+        for row in rows:
+            fields = "  ".join(f"{k}={v}" for k, v in row.items() if k != "name")
+            print(f"  {row['name']:<14}{fields}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,50,200", help="comma-separated corpus sizes in pages")
+    parser.add_argument("--quick", action="store_true", help="small sizes and few calls, for CI smoke runs")
+    parser.add_argument("--words-per-page", type=int, default=350)
+    parser.add_argument("--workers", type=int, default=None, help="PDF parsing processes")
+    parser.add_argument("--batch-size", type=int, default=256, help="chunks per add_documents call")
+    parser.add_argument("--embed-backend", default=None, choices=EMBEDDING_BACKENDS,
+                        help="embedding backend (default: NOTEMATE_EMBED_BACKEND or torch)")
+    parser.add_argument("--storage", default=None, choices=STORAGE_TYPES, help="vector storage of the collections")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--skip-llm", action="store_true")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=500)
+    parser.add_argument("--llm-completion-tokens", type=int, default=200)
+    parser.add_argument("--llm-calls", type=int, default=10)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="previous results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative slowdown for --compare")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.sizes = "5,20"
+        args.queries = min(args.queries, 50)
+        args.llm_calls = min(args.llm_calls, 3)
+        args.llm_latency_ms = min(args.llm_latency_ms, 50)
+
+    report = run(args)
+    print_report(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%} vs {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0%} vs {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
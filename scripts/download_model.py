@@ -0,0 +1,46 @@
+"""
+Download the embedding model at build time (the Dockerfile runs this), so
+containers start without fetching it from the Hugging Face hub.
+
+    python -m scripts.download_model
+    python -m scripts.download_model --model all-MiniLM-L6-v2 --onnx
+
+The files go to the normal Hugging Face cache (HF_HOME), where
+sentence-transformers finds them at runtime; run the image with
+HF_HUB_OFFLINE=1 to make sure nothing is fetched later. --onnx also
+writes the ONNX export for the onnx / onnx-int8 embedding backends.
+"""
+import argparse
+import time
+
+from backend.embedder import MODEL_NAME
+
+
+def download(model_name: str) -> str:
+    from huggingface_hub import snapshot_download
+
+    # Bare names are shorthand for the sentence-transformers organisation
+    repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    return snapshot_download(repo_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--onnx", action="store_true", help="also export the model to ONNX")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = download(args.model)
+    print(f"Downloaded {args.model} to {path} in {time.perf_counter() - start:.1f}s")
+
+    if args.onnx:
+        from backend.embedding_backends import default_onnx_dir
+        from scripts.export_onnx import check, export
+
+        out_dir = default_onnx_dir(args.model)
+        check(export(args.model, out_dir), out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Export the sentence-transformers embedding model to ONNX for the onnx /
+onnx-int8 embedding backends (NOTEMATE_EMBED_BACKEND).
+
+Writes model.onnx (the transformer, up to its last hidden state), an int8
+dynamic-quantized model_int8.onnx, the tokenizer files and a small
+metadata file, then checks the ONNX vectors against the PyTorch ones.
+
+    python -m scripts.export_onnx
+    python -m scripts.export_onnx --model all-MiniLM-L6-v2 --out models/all-MiniLM-L6-v2-onnx
+
+Needs torch and onnxruntime at export time only.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from backend.embedder import MODEL_NAME
+from backend.embedding_backends import ONNX_FILE, ONNX_INT8_FILE, ONNX_META_FILE, OnnxBackend, default_onnx_dir
+
+INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+CHECK_SENTENCES = [
+    "Photosynthesis converts light energy into chemical energy.",
+    "The French Revolution began in 1789.",
+    "A matrix is invertible when its determinant is non-zero.",
+    "short"
+]
+
+
+def _is_mean_pooling(config) -> bool:
+    # Newer sentence-transformers store one "pooling_mode"; older ones a flag per mode
+    if "pooling_mode" in config:
+        return config["pooling_mode"] == "mean"
+    modes = [key for key, value in config.items() if key.startswith("pooling_mode_") and value]
+    return modes == ["pooling_mode_mean_tokens"]
+
+
+def export(model_name: str, out_dir: str, opset: int = 17, quantize: bool = True):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    modules = [type(module).__name__ for module in model]
+    pooling = next((module for module in model if type(module).__name__ == "Pooling"), None)
+    if pooling is None or not _is_mean_pooling(pooling.get_config_dict()):
+        raise ValueError(f"{model_name}: only mean-pooled models are supported (modules: {modules})")
+
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    dummy = tokenizer(["export this sentence"], return_tensors="pt")
+    input_names = [name for name in INPUT_NAMES if name in dummy]
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs))).last_hidden_state
+
+    os.makedirs(out_dir, exist_ok=True)
+    onnx_path = os.path.join(out_dir, ONNX_FILE)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(),
+            tuple(dummy[name] for name in input_names),
+            onnx_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False
+        )
+    tokenizer.save_pretrained(out_dir)
+
+    with open(os.path.join(out_dir, ONNX_META_FILE), 'w') as f:
+        json.dump({
+            "model_name": model_name,
+            "dimension": model.get_sentence_embedding_dimension(),
+            "max_seq_length": model.max_seq_length,
+            "pooling": "mean",
+            "normalize": "Normalize" in modules,
+            "pad_token": tokenizer.pad_token
+        }, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(onnx_path, os.path.join(out_dir, ONNX_INT8_FILE), weight_type=QuantType.QInt8)
+
+    return model
+
+
+def check(model, out_dir: str, quantize: bool = True):
+    """Compare the exported backends' vectors with the PyTorch model's."""
+    expected = model.encode(CHECK_SENTENCES, convert_to_numpy=True)
+    for quantized in ([False, True] if quantize else [False]):
+        vectors = OnnxBackend(out_dir, quantized=quantized).encode(CHECK_SENTENCES, batch_size=2)
+        cosine = (vectors * expected).sum(axis=1) / (
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(expected, axis=1)
+        )
+        print(f"{'int8' if quantized else 'fp32'}: max abs diff {np.abs(vectors - expected).max():.2e}, "
+              f"min cosine {cosine.min():.5f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--out", default=None, help="output directory (default: models/<model>-onnx)")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--no-quantize", action="store_true", help="skip the int8 model")
+    args = parser.parse_args()
+
+    out_dir = args.out or default_onnx_dir(args.model)
+    model = export(args.model, out_dir, args.opset, quantize=not args.no_quantize)
+    print(f"Exported {args.model} to {out_dir}")
+    check(model, out_dir, quantize=not args.no_quantize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Pre-load a folder of notes (PDF, DOCX, TXT, searched recursively) into
+vector_db/, one collection per file, as if each had been uploaded.
+
+    python -m scripts.ingest_folder ./course-notes
+    python -m scripts.ingest_folder ./course-notes --workers 8 --batch-size 2048 --report ingest.json
+
+Files are parsed in a process pool and embedded in large batches. Progress
+is checkpointed in vector_db/ingest_manifest.json: run the same command
+again after an interruption (or after adding files) and only new or
+changed files are processed. A per-file throughput table is printed at
+the end.
+"""
+import argparse
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from backend.bulk_ingest import format_report, ingest_folder
+from backend.index_factory import STORAGE_TYPES
+from backend.rag_engine import RAGEngine
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder")
+    parser.add_argument("--db", default=os.getenv("NOTEMATE_DB_PATH", "./vector_db"), help="vector_db directory")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=1024, help="chunks per embedding call")
+    parser.add_argument("--storage", choices=STORAGE_TYPES, default=None, help="vector storage for new collections")
+    parser.add_argument("--dedup-threshold", type=float, default=None,
+                        help="near-duplicate chunk similarity (default NOTEMATE_DEDUP_THRESHOLD or 0.8; 0 keeps all)")
+    parser.add_argument("--manifest", default=None, help="checkpoint file (default <db>/ingest_manifest.json)")
+    parser.add_argument("--force", action="store_true", help="re-ingest files that are already done")
+    parser.add_argument("--report", default=None, help="also write the per-file stats as JSON")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        parser.error(f"not a directory: {args.folder}")
+    os.makedirs(args.db, exist_ok=True)
+
+    def progress(stats):
+        print(f"[{stats['state']}] {stats['file']}", flush=True)
+
+    start = time.perf_counter()
+    results = ingest_folder(
+        RAGEngine(args.db),
+        args.folder,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        storage=args.storage,
+        dedup_threshold=args.dedup_threshold,
+        manifest_path=args.manifest,
+        force=args.force,
+        on_file=progress
+    )
+    wall_s = time.perf_counter() - start
+
+    print()
+    print(format_report(results, wall_s))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({"wall_s": round(wall_s, 3), "files": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
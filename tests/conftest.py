@@ -0,0 +1,67 @@
+import hashlib
+import re
+
+import numpy as np
+import pytest
+
+from backend.rag_engine import RAGEngine
+from benchmarks.stub_llm import StubLLMServer
+
+_PIECE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class FakeTokenizer:
+    """Splits words into pieces of up to 4 characters, like a subword tokenizer, with character offsets."""
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=True):
+        return {"offset_mapping": [[m.span() for m in _PIECE.finditer(text)] for text in texts]}
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+
+class FakeEmbedder:
+    """Hashed bag of words: texts sharing words get similar unit vectors, with no model to load."""
+
+    model_name = "fake-minilm"
+    dimension = 64
+    max_tokens = 62
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.calls = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.lower()):
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def make_text(words: int, seed: int = 0) -> str:
+    rng = np.random.RandomState(seed)
+    vocabulary = ("photosynthesis chlorophyll energy light reaction glucose oxygen carbon dioxide plant cell "
+                  "membrane transport enzyme substrate catalysis mitochondria respiration protein").split()
+    sentences = []
+    while sum(len(s.split()) for s in sentences) < words:
+        sentences.append(" ".join(rng.choice(vocabulary, size=rng.randint(6, 14))).capitalize() + ".")
+    return " ".join(sentences)
+
+
+@pytest.fixture
+def embedder():
+    return FakeEmbedder()
+
+
+@pytest.fixture
+def engine(tmp_path, embedder):
+    return RAGEngine(str(tmp_path / "vector_db"), embedder=embedder)
+
+
+@pytest.fixture
+def stub_llm():
+    with StubLLMServer(latency_ms=5, tokens_per_second=5000, completion_tokens=20) as server:
+        yield server
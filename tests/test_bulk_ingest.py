@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+from backend.bulk_ingest import format_report, ingest_folder, scan_folder
+from backend.ingest import EMPTY_DOCUMENT, ingest_file
+from tests.conftest import make_text
+
+
+@pytest.fixture
+def folder(tmp_path):
+    root = tmp_path / "notes"
+    (root / "week2").mkdir(parents=True)
+    (root / ".hidden").mkdir()
+    (root / "week1.txt").write_text(make_text(300, seed=1))
+    (root / "week2" / "cells.txt").write_text(make_text(300, seed=2))
+    (root / "week2" / "copy.TXT").write_text(make_text(300, seed=1))
+    (root / "week2" / "image.png").write_bytes(b"\x89PNG")
+    (root / ".hidden" / "secret.txt").write_text("skip me")
+    return root
+
+
+def states(results):
+    return {os.path.basename(r["file"]): r["state"] for r in results}
+
+
+def test_scan_folder(folder):
+    assert [os.path.relpath(path, folder) for path in scan_folder(str(folder))] == [
+        "week1.txt", os.path.join("week2", "cells.txt"), os.path.join("week2", "copy.TXT")
+    ]
+
+
+def test_ingest_then_resume(engine, folder):
+    results = ingest_folder(engine, str(folder), workers=2, batch_size=8)
+    assert states(results) == {"week1.txt": "done", "cells.txt": "done", "copy.TXT": "skipped"}
+    done = [r for r in results if r["state"] == "done"]
+    assert all(r["chunks"] > 1 and engine.has_collection(r["collection"]) for r in done)
+    # Same content under another name shares the first file's collection
+    collections = {os.path.basename(r["file"]): r["collection"] for r in results}
+    assert collections["copy.TXT"] == collections["week1.txt"]
+    assert "2 ingested, 1 skipped, 0 failed" in format_report(results, 1.0)
+
+    with open(os.path.join(engine.db_path, "ingest_manifest.json")) as f:
+        manifest = json.load(f)
+    assert {entry["state"] for entry in manifest.values()} == {"done"} and len(manifest) == 3
+
+    # Unchanged, touched-but-identical and edited files on the next run
+    os.utime(folder / "week1.txt", (1, 1))
+    (folder / "week2" / "cells.txt").write_text(make_text(200, seed=3))
+    rerun = ingest_folder(engine, str(folder), workers=1)
+    assert states(rerun) == {"week1.txt": "skipped", "cells.txt": "done", "copy.TXT": "skipped"}
+
+
+def test_unreadable_file_is_recorded_as_failed(engine, tmp_path):
+    root = tmp_path / "broken"
+    root.mkdir()
+    (root / "slides.pdf").write_bytes(b"not a pdf")
+    (root / "ok.txt").write_text(make_text(100))
+    results = ingest_folder(engine, str(root), workers=1)
+    assert states(results) == {"slides.pdf": "failed", "ok.txt": "done"}
+    assert [r["error"] for r in results if r["state"] == "failed"] == ["Error reading PDF"]
+
+
+def test_empty_file_gets_the_same_placeholder_as_an_upload(engine, tmp_path):
+    root = tmp_path / "empty"
+    root.mkdir()
+    (root / "blank.txt").write_text("   \n")
+    [result] = ingest_folder(engine, str(root), workers=1)
+    ingest_file(engine, "uploaded", str(root / "blank.txt"))
+
+    for collection in (result["collection"], "uploaded"):
+        context = engine.query(collection, "anything", n_results=1)
+        assert list(context) == [EMPTY_DOCUMENT]
+        assert context.spans.tolist() == [[-1, -1]]
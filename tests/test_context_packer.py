@@ -0,0 +1,72 @@
+import random
+
+from backend.context_packer import ContextPacker
+from backend.document_parser import DocumentParser
+from backend.rag_engine import RetrievedChunks
+from tests.conftest import FakeTokenizer, make_text
+
+
+def _token_chunks(text):
+    return DocumentParser.chunk_tokens(text, FakeTokenizer(), max_tokens=80, overlap=32)  # the chunker's default overlap
+
+
+def test_neighbouring_token_windows_merge_by_words():
+    text = make_text(400)
+    chunks = _token_chunks(text)[2:6]
+    # Windows start and end inside words, which exact word matching missed
+    assert any(not text[c["start"] - 1].isspace() for c in chunks)
+
+    packed = ContextPacker(count_tokens=lambda t: 1).pack([c["text"] for c in chunks], "lesson")
+    assert packed == [" ".join(text[chunks[0]["start"]:chunks[-1]["end"]].split())]
+
+
+def test_neighbouring_token_windows_merge_by_spans_in_any_order():
+    text = make_text(400, seed=1)
+    chunks = _token_chunks(text)[1:6]
+    random.Random(0).shuffle(chunks)
+    context = RetrievedChunks([c["text"] for c in chunks], spans=[(c["start"], c["end"]) for c in chunks])
+
+    packed = ContextPacker(count_tokens=lambda t: 1).pack(context, "lesson")
+    start, end = min(c["start"] for c in chunks), max(c["end"] for c in chunks)
+    assert packed == [" ".join(text[start:end].split())]
+
+
+def test_distant_chunks_stay_separate_in_rank_order():
+    text = make_text(600, seed=2)
+    chunks = _token_chunks(text)
+    picked = [chunks[8], chunks[1]]
+    context = RetrievedChunks([c["text"] for c in picked], spans=[(c["start"], c["end"]) for c in picked])
+
+    packed = ContextPacker(count_tokens=lambda t: 1).pack(context, "lesson")
+    assert packed == [" ".join(c["text"].split()) for c in picked]
+
+
+def test_budget_keeps_best_passages():
+    passages = [f"passage {i} " + " ".join(f"w{i}x{j}" for j in range(20)) for i in range(5)]
+    packer = ContextPacker(count_tokens=lambda t: len(t.split()))
+    assert packer.pack(passages, "lesson") == passages  # 1500 tokens fit all
+    assert ContextPacker(count_tokens=lambda t: len(t.split())).pack(passages, "unknown") == passages
+    small = ContextPacker(count_tokens=lambda t: len(t.split()))
+    small.budget_for = lambda feature: 50
+    assert small.pack(passages, "lesson") == passages[:2]
+
+
+def test_near_duplicates_are_dropped():
+    text = make_text(60, seed=3)
+    packed = ContextPacker(count_tokens=lambda t: 1).pack([text, text.upper(), "unrelated words here"], "lesson")
+    assert packed == [text, "unrelated words here"]
+
+
+def test_query_results_carry_document_spans(tmp_path, engine):
+    from backend.ingest import ingest_file
+
+    text = make_text(500, seed=4)
+    path = tmp_path / "notes.txt"
+    path.write_text(text)
+    ingest_file(engine, "notes", str(path), dedup_threshold=0)
+
+    for mode in ("dense", "sparse", "hybrid"):
+        context = engine.query("notes", "chlorophyll light reaction", n_results=4, mode=mode)
+        assert len(context.spans) == len(context) > 0
+        for chunk, (start, end) in zip(context, context.spans):
+            assert text[start:end] == chunk
@@ -0,0 +1,70 @@
+import pytest
+
+from backend.dedup import NearDuplicateFilter, load_duplicate_refs, save_duplicate_refs, shingles
+from backend.ingest import unique_chunks
+from tests.conftest import make_text
+
+FOOTER = "Copyright 2024 University of Example, Department of Biology. All rights reserved. Page"
+
+
+def jaccard(a, b):
+    a, b = set(shingles(a).tolist()), set(shingles(b).tolist())
+    return len(a & b) / len(a | b)
+
+
+def test_exact_copy_up_to_case_and_whitespace():
+    dedup = NearDuplicateFilter()
+    assert dedup.add("Cells  divide by mitosis", 0) is None
+    assert dedup.add("cells divide\nby MITOSIS", 1) == 0
+    assert dedup.removed == 1
+
+
+def test_near_duplicate_points_at_the_kept_chunk():
+    dedup = NearDuplicateFilter()
+    page = make_text(80, seed=1)
+    assert dedup.add(make_text(80, seed=2), 0) is None
+    assert dedup.add(page, 1) is None
+    assert dedup.add(page.replace(".", "!", 1) + " Extra words at the end.", 2) == 1
+
+
+def test_distinct_and_loosely_similar_chunks_are_kept():
+    dedup = NearDuplicateFilter(threshold=0.8)
+    text = make_text(60, seed=3)
+    words = text.split()
+    half_changed = " ".join(words[:len(words) // 2] + make_text(60, seed=4).split()[:len(words) // 2])
+    assert jaccard(text, half_changed) < 0.6
+    assert dedup.add(text, 0) is None
+    assert dedup.add(half_changed, 1) is None
+    assert dedup.add(make_text(60, seed=5), 2) is None
+    assert dedup.removed == 0
+
+
+def test_signature_estimates_jaccard():
+    dedup = NearDuplicateFilter(num_perm=256, bands=32)
+    a = make_text(150, seed=6)
+    words = a.split()
+    b = " ".join(words[:100] + ["different"] * 3 + words[100:])
+    estimate = float((dedup.signature(a) == dedup.signature(b)).mean())
+    assert estimate == pytest.approx(jaccard(a, b), abs=0.1)
+
+
+def test_invalid_band_split():
+    with pytest.raises(ValueError):
+        NearDuplicateFilter(num_perm=100, bands=16)
+
+
+def test_unique_chunks_records_back_references(tmp_path):
+    chunks = [
+        {"text": "Photosynthesis turns light into chemical energy. " + FOOTER + " 1", "start": 0, "end": 130},
+        {"text": make_text(40, seed=7), "start": 130, "end": 400},
+        {"text": "Photosynthesis turns light into chemical energy. " + FOOTER + " 2", "start": 400, "end": 530},
+    ]
+    refs = {}
+    dedup = NearDuplicateFilter(threshold=0.8)
+    kept = list(unique_chunks(chunks, dedup, refs))
+    assert kept == chunks[:2]
+    assert refs == {0: [(400, 530)]}
+
+    save_duplicate_refs(str(tmp_path), "notes", refs, dedup.removed)
+    assert load_duplicate_refs(str(tmp_path), "notes") == refs
+    assert load_duplicate_refs(str(tmp_path), "missing") == {}
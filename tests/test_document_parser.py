@@ -0,0 +1,48 @@
+import PyPDF2
+import pytest
+from PyPDF2.generic import NameObject, NumberObject
+
+from backend.document_parser import DocumentParser
+from backend.tracing import get_tracer
+
+
+def write_pdf(path, pages, broken_page=None):
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(100, 100)
+    if broken_page is not None:
+        # A content stream that isn't a stream: extract_text raises on this page
+        writer.pages[broken_page][NameObject("/Contents")] = NumberObject(5)
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return str(path)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_pdf_pages_in_order(tmp_path, workers):
+    path = write_pdf(tmp_path / "notes.pdf", 20)
+    assert list(DocumentParser.iter_pdf_pages(path, workers=workers, pages_per_task=4)) == [""] * 20
+
+
+@pytest.mark.parametrize("workers, read_before", [(1, 0), (2, 8)])
+def test_unreadable_pdf_page_ends_with_the_read_error(tmp_path, workers, read_before):
+    path = write_pdf(tmp_path / "notes.pdf", 20, broken_page=10)
+    pages = list(DocumentParser.iter_pdf_pages(path, workers=workers, pages_per_task=4))
+    assert pages == [""] * read_before + ["Error reading PDF"]
+    assert DocumentParser.parse_pdf(path) == "Error reading PDF"
+
+
+def test_not_a_pdf(tmp_path):
+    path = tmp_path / "notes.pdf"
+    path.write_bytes(b"not a pdf")
+    assert list(DocumentParser.iter_pdf_pages(str(path))) == ["Error reading PDF"]
+
+
+def test_parse_pdf_is_traced(tmp_path):
+    path = write_pdf(tmp_path / "notes.pdf", 3)
+    assert DocumentParser.parse_pdf(path) == ""
+    DocumentParser.parse_pdf(str(tmp_path / "missing.pdf"))
+    spans = [s for s in get_tracer().recent() if s["name"] == "parse"][-2:]
+    assert [s["attributes"]["format"] for s in spans] == ["pdf", "pdf"]
+    assert spans[0]["attributes"]["pages"] == 3 and spans[0]["error"] is None
+    assert spans[1]["error"]
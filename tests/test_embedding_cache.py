@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pytest
+
+from backend.embedding_cache import KEY_SIZE, EmbeddingCache
+
+DIMENSION = 8
+
+
+def vectors(n, seed=0):
+    return np.random.RandomState(seed).rand(n, DIMENSION).astype('float32')
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "embedding_cache")
+
+
+def test_lookup_after_add_and_reopen(cache_dir):
+    cache = EmbeddingCache(cache_dir, "org/model", DIMENSION)
+    cache.add(["alpha", "beta", "alpha"], vectors(3))
+    assert len(cache) == 2
+
+    reopened = EmbeddingCache(cache_dir, "org/model", DIMENSION)
+    found, missing = reopened.lookup(["beta", "gamma", "alpha"])
+    assert missing == [1]
+    assert np.array_equal(found[0], vectors(3)[1])
+    assert np.array_equal(found[2], vectors(3)[0])
+    assert not found[1].any()
+
+
+def test_keyed_by_model(cache_dir):
+    EmbeddingCache(cache_dir, "model-a", DIMENSION).add(["alpha"], vectors(1))
+    assert EmbeddingCache(cache_dir, "model-b", DIMENSION).lookup(["alpha"])[1] == [0]
+
+
+def test_dtypes_keep_separate_rows(cache_dir):
+    full = EmbeddingCache(cache_dir, "model", DIMENSION)
+    full.add(["alpha", "beta"], vectors(2))
+    half = EmbeddingCache(cache_dir, "model", DIMENSION, dtype='float16')
+    assert half.lookup(["alpha", "beta"])[1] == [0, 1]
+    half.add(["beta"], vectors(1, seed=1))
+
+    found, missing = EmbeddingCache(cache_dir, "model", DIMENSION, dtype='float16').lookup(["alpha", "beta"])
+    assert missing == [0]
+    assert np.allclose(found[1], vectors(1, seed=1)[0], atol=1e-3)
+    found, missing = EmbeddingCache(cache_dir, "model", DIMENSION).lookup(["alpha", "beta"])
+    assert missing == [] and np.array_equal(found, vectors(2))
+
+
+def test_dimension_change_starts_over(cache_dir):
+    EmbeddingCache(cache_dir, "model", DIMENSION).add(["alpha"], vectors(1))
+    wider = EmbeddingCache(cache_dir, "model", DIMENSION * 2)
+    assert len(wider) == 0
+    assert wider.lookup(["alpha"])[1] == [0]
+
+
+def test_torn_append_is_trimmed(cache_dir):
+    cache = EmbeddingCache(cache_dir, "model", DIMENSION)
+    cache.add(["alpha"], vectors(1))
+    # Crash between writing the vector rows and their keys
+    with open(cache.vectors_file, 'ab') as f:
+        f.write(vectors(1, seed=2).tobytes()[:20])
+
+    reopened = EmbeddingCache(cache_dir, "model", DIMENSION)
+    assert len(reopened) == 1
+    assert os.path.getsize(reopened.vectors_file) == DIMENSION * 4
+    reopened.add(["beta"], vectors(1, seed=3))
+    found, missing = EmbeddingCache(cache_dir, "model", DIMENSION).lookup(["alpha", "beta"])
+    assert missing == [] and np.array_equal(found[1], vectors(1, seed=3)[0])
+
+
+def test_more_keys_than_rows_resets(cache_dir):
+    cache = EmbeddingCache(cache_dir, "model", DIMENSION)
+    cache.add(["alpha", "beta"], vectors(2))
+    os.truncate(cache.vectors_file, DIMENSION * 4)
+    assert len(EmbeddingCache(cache_dir, "model", DIMENSION)) == 0
+
+
+def test_legacy_shared_keys_become_float32_keys(cache_dir):
+    cache = EmbeddingCache(cache_dir, "model", DIMENSION)
+    cache.add(["alpha", "beta"], vectors(2))
+    os.replace(cache.keys_file, os.path.join(cache.path, "keys.bin"))
+
+    migrated = EmbeddingCache(cache_dir, "model", DIMENSION)
+    assert len(migrated) == 2
+    assert os.path.getsize(migrated.keys_file) == 2 * KEY_SIZE
+    assert not os.path.exists(os.path.join(cache.path, "keys.bin"))
+
+
+def test_engine_reuses_cached_embeddings(engine, embedder):
+    chunks = ["chlorophyll absorbs light", "mitochondria release energy"]
+    engine.add_documents("first", chunks)
+    calls = embedder.calls
+    engine.add_documents("second", chunks)
+    assert embedder.calls == calls
+    assert list(engine.query("second", "chlorophyll light", n_results=1)) == [chunks[0]]
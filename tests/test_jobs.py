@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from backend.jobs import CANCELLED, DONE, QUEUED, RUNNING, WorkerPool
+
+
+def wait_for(job, states, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        if job.state in states:
+            return
+        threading.Event().wait(0.01)
+    pytest.fail(f"job stayed {job.state}")
+
+
+@pytest.fixture
+def blocked_pool():
+    """One worker, held busy by a job that runs until released."""
+    pool = WorkerPool(workers=1)
+    release = threading.Event()
+    blocker = pool.submit("someone", lambda job: release.wait(5), key="blocker")
+    wait_for(blocker, (RUNNING,))
+    yield pool, release
+    release.set()
+
+
+def test_duplicate_submit_joins_the_same_job(blocked_pool):
+    pool, release = blocked_pool
+    first = pool.submit("a", lambda job: "a's result", key="same-file")
+    second = pool.submit("b", lambda job: "b's result", key="same-file")
+    assert second is first
+    assert first.owners == {"a", "b"}
+
+
+def test_cancel_by_one_owner_keeps_job_for_the_other(blocked_pool):
+    pool, release = blocked_pool
+    job = pool.submit("a", lambda job: "collection", key="same-file")
+    pool.submit("b", lambda job: "collection", key="same-file")
+
+    assert pool.cancel(job.id, "b")
+    assert job.state == QUEUED
+    release.set()
+    wait_for(job, (DONE,))
+    assert job.result == "collection"
+
+
+def test_cancel_by_last_owner_cancels(blocked_pool):
+    pool, release = blocked_pool
+    job = pool.submit("a", lambda job: "collection", key="same-file")
+    pool.submit("b", lambda job: "collection", key="same-file")
+
+    assert pool.cancel(job.id, "a") and pool.cancel(job.id, "b")
+    assert job.state == CANCELLED
+    assert pool.queue_position(job.id) == 0
+
+
+def test_cancel_by_stranger_is_refused(blocked_pool):
+    pool, release = blocked_pool
+    job = pool.submit("a", lambda job: "collection", key="same-file")
+    assert not pool.cancel(job.id, "b")
+    assert not pool.cancel("no-such-job", "a")
+    assert job.state == QUEUED and job.owners == {"a"}
+
+
+def test_running_job_stops_at_next_update():
+    pool = WorkerPool(workers=1)
+    started, checked = threading.Event(), threading.Event()
+
+    def target(job):
+        started.set()
+        checked.wait(5)
+        job.update("embedding", chunks_embedded=1)
+        return "not reached"
+
+    job = pool.submit("a", target)
+    started.wait(5)
+    assert pool.cancel(job.id, "a")
+    checked.set()
+    wait_for(job, (CANCELLED,))
+    assert job.result is None
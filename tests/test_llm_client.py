@@ -0,0 +1,186 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.generator import ContentGenerator, is_error_reply
+from backend.llm_client import ConcurrencyLimit, LLMPool, SingleFlight, backoff_delay
+from backend.response_cache import ResponseCache
+
+PARAMS = {"model": "stub", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 20}
+
+
+class Gauge:
+    """Counts how many callers are inside at once."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.active -= 1
+
+
+def run_threads(target, n):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+
+def test_concurrency_limit_across_threads_and_event_loops():
+    limit, gauge = ConcurrencyLimit(3), Gauge()
+
+    def blocking():
+        with limit, gauge:
+            time.sleep(0.01)
+
+    async def concurrent():
+        async def one():
+            async with limit:
+                with gauge:
+                    await asyncio.sleep(0.01)
+        await asyncio.gather(*[one() for _ in range(5)])
+
+    run_threads(lambda: (blocking(), asyncio.run(concurrent())), 4)
+    assert gauge.peak == 3
+    assert limit.active == 0
+
+
+def test_concurrency_limit_passes_on_a_cancelled_waiters_slot():
+    limit = ConcurrencyLimit(1)
+
+    async def main():
+        await limit.aacquire()
+        waiter = asyncio.ensure_future(limit.aacquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limit.release()
+        await asyncio.wait_for(limit.aacquire(), 1)
+        limit.release()
+
+    asyncio.run(main())
+    assert limit.active == 0
+
+
+def test_single_flight_runs_identical_calls_once():
+    flights, calls, results = SingleFlight(), [], []
+    started = threading.Event()
+
+    def fn():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return "reply"
+
+    def caller():
+        results.append(flights.do("key", fn))
+
+    leader = threading.Thread(target=caller)
+    leader.start()
+    started.wait(5)
+    run_threads(caller, 4)
+    leader.join(5)
+    assert len(calls) == 1
+    assert sorted(results) == [("reply", False)] + [("reply", True)] * 4
+    assert flights.do("key", lambda: "again") == ("again", False)  # finished flights are not reused
+
+
+def test_single_flight_async_shares_errors():
+    flights, calls = SingleFlight(), []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    async def main():
+        return await asyncio.gather(*[flights.ado("key", fail) for _ in range(3)], return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(isinstance(e, ValueError) for e in errors)
+
+
+def test_stream_flight_late_reader_sees_every_delta():
+    flights, release = SingleFlight(), threading.Event()
+
+    def run(flight):
+        flight.push("a")
+        release.wait(5)
+        flight.push("b")
+
+    first, shared = flights.stream("key", run)
+    second, joined = flights.stream("key", run)
+    release.set()
+    assert (shared, joined) == (False, True) and second is first
+    assert "".join(first.follow()) == "ab"
+    assert "".join(second.follow()) == "ab"
+
+
+def test_backoff_delay():
+    class Response:
+        headers = {"retry-after": "2"}
+
+    class RateLimited(Exception):
+        response = Response()
+
+    assert 2 <= backoff_delay(0, RateLimited()) <= 2.1
+    for attempt in range(12):
+        assert 0 < backoff_delay(attempt) <= 30
+
+
+def test_pool_retries_rate_limits(stub_llm):
+    stub_llm.fail_requests = 2
+    pool = LLMPool("test-key", stub_llm.url, max_concurrency=2, max_retries=3)
+    response, retries = pool.create(**PARAMS)
+    assert retries == 2
+    assert response.choices[0].message.content
+    assert stub_llm.requests == 3
+
+
+def test_pool_does_not_retry_client_errors(stub_llm):
+    stub_llm.fail_requests, stub_llm.fail_status = 1, 400
+    pool = LLMPool("test-key", stub_llm.url, max_retries=3)
+    with pytest.raises(Exception) as raised:
+        pool.create(**PARAMS)
+    assert raised.value.retries == 0
+    assert stub_llm.requests == 1
+
+
+def test_pool_caps_calls_in_flight(stub_llm):
+    stub_llm.latency_ms = 30
+    pool = LLMPool("test-key", stub_llm.url, max_concurrency=3)
+
+    async def many():
+        async with pool.async_client() as client:
+            await asyncio.gather(*[pool.acreate(client, asyncio.Semaphore(10), **PARAMS) for _ in range(6)])
+
+    run_threads(lambda: (pool.create(**PARAMS), asyncio.run(many())), 3)
+    assert stub_llm.requests == 21
+    assert stub_llm.peak_in_flight == 3
+
+
+def test_generator_coalesces_and_caches(stub_llm, tmp_path):
+    stub_llm.latency_ms = 50
+    generator = ContentGenerator("test-key", ResponseCache(str(tmp_path / "llm_cache.sqlite")), base_url=stub_llm.url)
+    replies = []
+    run_threads(lambda: replies.append(generator.generate_with_context("Explain", ["notes"], feature="lesson")), 4)
+    assert len(set(replies)) == 1 and not is_error_reply(replies[0])
+    assert stub_llm.requests == 1
+    assert generator.generate_with_context("Explain", ["notes"], feature="lesson") == replies[0]
+    assert stub_llm.requests == 1
+
+    streamed = "".join(generator.stream_with_context("Summarize", ["notes"], feature="summary"))
+    assert streamed and stub_llm.requests == 2
@@ -0,0 +1,51 @@
+import logging
+import os
+
+import pytest
+
+from backend.rag_engine import RAGEngine
+from backend.segment_store import SegmentStore
+
+
+@pytest.fixture
+def saved(engine, embedder):
+    engine.add_documents("notes", ["chlorophyll absorbs light", "mitochondria release energy"])
+    # A second engine on the same directory has to load the collection from disk
+    return RAGEngine(engine.db_path, embedder=embedder)
+
+
+def test_collection_loads_from_disk(saved):
+    assert list(saved.query("notes", "chlorophyll light", n_results=1)) == ["chlorophyll absorbs light"]
+
+
+def test_missing_collection_is_not_logged(engine, caplog):
+    with caplog.at_level(logging.WARNING, logger="backend.rag_engine"):
+        assert list(engine.query("nothing-here", "light")) == []
+    assert caplog.records == []
+
+
+def test_unreadable_collection_is_logged(saved, caplog):
+    os.remove(os.path.join(saved.db_path, "notes_vectors.f32"))
+    with caplog.at_level(logging.WARNING, logger="backend.rag_engine"):
+        assert list(saved.query("notes", "light")) == []
+    assert "Could not load collection notes" in caplog.text
+    assert caplog.records[0].exc_info is not None
+
+
+def test_interrupt_while_loading_is_not_swallowed(saved, monkeypatch):
+    def interrupted(self):
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(SegmentStore, "open", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        saved.query("notes", "light")
+
+
+def test_collections_are_addressed_only_by_name(saved, embedder):
+    saved.add_documents("other", ["ribosomes build proteins"])
+    # Loading one collection leaves no engine-wide "current" collection behind
+    assert not hasattr(saved, "collection_name")
+    fresh = RAGEngine(saved.db_path, embedder=embedder)
+    assert list(fresh.query("other", "proteins", n_results=1)) == ["ribosomes build proteins"]
+    assert list(fresh.query("notes", "chlorophyll light", n_results=1)) == ["chlorophyll absorbs light"]
+    assert list(fresh.query("other", "proteins", n_results=1)) == ["ribosomes build proteins"]
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+
+from backend.segment_store import SegmentStore
+
+DIMENSION = 4
+
+
+def rows(n, start=0):
+    return np.arange(start * DIMENSION, (start + n) * DIMENSION, dtype='float32').reshape(n, DIMENSION)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SegmentStore(str(tmp_path), "notes", DIMENSION).create()
+    store.append(["first chunk", "second — chunk"], rows(2), [(0, 11), (12, 26)])
+    return store
+
+
+def reopen(store):
+    return SegmentStore(os.path.dirname(store.offsets_file), "notes", DIMENSION).open()
+
+
+def test_round_trip(store):
+    store.append(["third"], rows(1, 2))
+    opened = reopen(store)
+    assert opened.count == 3
+    assert list(opened.texts()) == ["first chunk", "second — chunk", "third"]
+    assert np.array_equal(opened.vectors(), rows(3))
+    assert opened.span(1) == (12, 26)
+    assert opened.spans([2, 0]).tolist() == [[-1, -1], [0, 11]]
+
+
+def test_uncommitted_tail_is_trimmed_on_open(store):
+    # A crash after the vectors, texts and spans were written but before the offsets
+    with open(store.vectors_file, 'ab') as f:
+        f.write(rows(1, 2).tobytes())
+    with open(store.texts_file, 'ab') as f:
+        f.write(b"lost chunk")
+    with open(store.spans_file, 'ab') as f:
+        f.write(np.array([[27, 37]], dtype='int64').tobytes())
+
+    opened = reopen(store)
+    assert opened.count == 2
+    assert os.path.getsize(store.vectors_file) == 2 * DIMENSION * 4
+    assert os.path.getsize(store.texts_file) == len("first chunksecond — chunk".encode('utf-8'))
+    assert os.path.getsize(store.spans_file) == 2 * 16
+
+    opened.append(["third"], rows(1, 2), [(27, 32)])
+    assert list(reopen(store).texts()) == ["first chunk", "second — chunk", "third"]
+    assert reopen(store).span(2) == (27, 32)
+
+
+def test_torn_offset_write_is_trimmed(store):
+    with open(store.texts_file, 'ab') as f:
+        f.write(b"lost")
+    with open(store.offsets_file, 'ab') as f:
+        f.write(b"\x01\x02\x03")
+
+    opened = reopen(store)
+    assert opened.count == 2
+    assert os.path.getsize(store.offsets_file) == 2 * 8
+    opened.append(["third"], rows(1, 2))
+    assert list(reopen(store).texts()) == ["first chunk", "second — chunk", "third"]
+
+
+def test_store_without_spans_file(store):
+    os.remove(store.spans_file)
+    opened = reopen(store)
+    assert opened.spans([0, 1]).tolist() == [[-1, -1], [-1, -1]]
+
+
+def test_version_changes_on_commit(store):
+    db_path = os.path.dirname(store.offsets_file)
+    before = SegmentStore.version(db_path, "notes")
+    store.append(["third"], rows(1, 2))
+    assert SegmentStore.version(db_path, "notes") != before
+    assert SegmentStore.version(db_path, "missing") is None
@@ -0,0 +1,74 @@
+import pytest
+
+from backend.semantic_cache import SemanticCache, normalize_request
+
+
+@pytest.fixture
+def cache(engine):
+    engine.add_documents("notes", ["recursion is a function calling itself", "a base case stops the recursion"])
+    return SemanticCache(engine, threshold=0.9)
+
+
+@pytest.mark.parametrize("request_text", ["recursion", "Recursion explained", "What is recursion?", "what's recursion"])
+def test_normalize_request(request_text):
+    assert normalize_request(request_text) == "recursion"
+
+
+def test_similar_request_reuses_answer(cache, embedder):
+    cache.put("notes", "lesson", "Recursion explained", "LESSON")
+    calls = embedder.calls
+    hit = cache.get("notes", "lesson", "what is recursion?")
+    assert hit == {"request": "Recursion explained", "response": "LESSON", "similarity": 1.0}
+    assert embedder.calls == calls  # same normalized wording: no embedding needed
+
+
+def test_embedding_similarity_and_threshold(cache):
+    cache.put("notes", "story", "tail recursion in functional languages", "STORY")
+    hit = cache.get("notes", "story", "tail recursion in functional programming languages")
+    assert hit is not None and 0.9 <= hit["similarity"] < 1.0
+    assert cache.get("notes", "story", "photosynthesis in plants") is None
+
+
+def test_scoped_per_feature_and_collection(cache, engine):
+    engine.add_documents("other", ["unrelated"])
+    cache.put("notes", "lesson", "recursion", "LESSON")
+    assert cache.get("notes", "story", "recursion") is None
+    assert cache.get("other", "lesson", "recursion") is None
+    assert cache.get("missing", "lesson", "recursion") is None
+
+
+@pytest.mark.parametrize("reply", [
+    "",
+    "Error generating content: rate limited",
+    "A lesson that was cut off half way\n\nError generating content: connection reset",
+])
+def test_failed_or_cut_off_replies_are_not_stored(cache, reply):
+    cache.put("notes", "lesson", "recursion", reply)
+    assert cache.get("notes", "lesson", "recursion") is None
+
+
+def test_new_answer_replaces_similar_one_and_persists(cache, engine):
+    cache.put("notes", "lesson", "recursion", "OLD")
+    cache.put("notes", "lesson", "Recursion explained", "NEW")
+    assert cache._collections["notes"]["scopes"]["lesson"].entries[-1]["response"] == "NEW"
+    assert len(cache._collections["notes"]["scopes"]["lesson"].entries) == 1
+
+    reopened = SemanticCache(engine, threshold=0.9)
+    assert reopened.get("notes", "lesson", "recursion")["response"] == "NEW"
+
+
+def test_collection_change_invalidates(cache, engine):
+    cache.put("notes", "lesson", "recursion", "LESSON")
+    reopened = SemanticCache(engine, threshold=0.9)
+    engine.add_documents("notes", ["recursion can overflow the stack"])
+    assert cache.get("notes", "lesson", "recursion") is None
+    assert reopened.get("notes", "lesson", "recursion") is None
+
+
+def test_max_entries_drops_oldest(engine):
+    engine.add_documents("notes", ["text"])
+    cache = SemanticCache(engine, threshold=0.99, max_entries=3)
+    for topic in ("alpha", "beta", "gamma", "delta"):
+        cache.put("notes", "lesson", topic, topic.upper())
+    assert cache.get("notes", "lesson", "alpha") is None
+    assert cache.get("notes", "lesson", "delta")["response"] == "DELTA"
@@ -0,0 +1,143 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from backend.generator import ERROR_PREFIX, ContentGenerator
+from backend.rag_engine import RetrievedChunks
+from backend.sharded_generation import (
+    agenerate_flashcards_sharded, agenerate_quiz_sharded, format_flashcards, format_quiz, merge_records,
+    parse_flashcards, parse_quiz, shard_counts, slice_context
+)
+from tests.conftest import make_text
+
+QUIZ = """Q1. What does chlorophyll absorb?
+A) Light
+B) Water
+C) Oxygen
+D) Glucose
+Answer: A
+
+**Q2.** Where does respiration happen?
+a) Nucleus
+b) Mitochondria
+c) Membrane
+d) Ribosome
+**Answer:** b
+"""
+
+CARDS = """Front: Photosynthesis
+Back: Plants turning light,
+water and carbon dioxide into glucose.
+
+**Front:** Enzyme
+**Back:** A protein that speeds up a reaction.
+"""
+
+
+class ScriptedGenerator(ContentGenerator):
+    """Answers each shard from a list of replies, in call order, with no LLM behind it."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    async def agenerate_with_context(self, prompt, context, client, semaphore=None, use_cache=True, feature=None,
+                                     max_retries=None):
+        self.prompts.append(prompt)
+        return self.replies.pop(0)
+
+
+def quiz_reply(topic: str, count: int = 2) -> str:
+    return "\n\n".join(
+        f"Q{i}. Which step of {topic} number {i} uses stage {topic}{i}?\nA) one\nB) two\nAnswer: A"
+        for i in range(1, count + 1)
+    )
+
+
+@pytest.fixture
+def notes(engine):
+    engine.add_documents("notes", [make_text(60, seed) for seed in range(12)])
+    return engine
+
+
+def test_parse_quiz():
+    records = parse_quiz(QUIZ)
+    assert records == [
+        {"question": "What does chlorophyll absorb?", "options": ["Light", "Water", "Oxygen", "Glucose"], "answer": "A"},
+        {"question": "Where does respiration happen?", "options": ["Nucleus", "Mitochondria", "Membrane", "Ribosome"],
+         "answer": "b"},
+    ]
+    assert parse_quiz(format_quiz(records)) == records
+
+
+def test_parse_flashcards():
+    records = parse_flashcards(CARDS)
+    assert records == [
+        {"front": "Photosynthesis", "back": "Plants turning light, water and carbon dioxide into glucose."},
+        {"front": "Enzyme", "back": "A protein that speeds up a reaction."},
+    ]
+    assert parse_flashcards(format_flashcards(records)) == records
+
+
+def test_merge_records_drops_near_duplicates_and_caps():
+    first = [{"question": "What is the role of chlorophyll in the light reaction of photosynthesis"}]
+    second = [
+        {"question": "What is the role of chlorophyll in the light reaction of photosynthesis?"},
+        {"question": "Which organelle carries out cellular respiration in animal cells"},
+        {"question": "How do enzymes lower the activation energy of a reaction"},
+    ]
+    merged = merge_records([first, second], "question", 2)
+    assert [r["question"] for r in merged] == [first[0]["question"], second[1]["question"]]
+
+
+@pytest.mark.parametrize("total, size, expected", [
+    (20, 5, [5, 5, 5, 5]),
+    (12, 5, [4, 4, 4]),
+    (3, 5, [3]),
+    (0, 5, [0]),
+])
+def test_shard_counts(total, size, expected):
+    assert shard_counts(total, size) == expected
+    assert sum(shard_counts(total, size)) == total
+
+
+def test_slice_context_round_robin_keeps_embeddings_and_spans():
+    context = RetrievedChunks(
+        [f"chunk {i}" for i in range(7)],
+        np.arange(14, dtype='float32').reshape(7, 2),
+        np.ones(2, dtype='float32'),
+        np.array([(i * 10, i * 10 + 5) for i in range(7)], dtype='int64'),
+    )
+    slices = slice_context(context, 3)
+    assert [list(s) for s in slices] == [["chunk 0", "chunk 3", "chunk 6"], ["chunk 1", "chunk 4"], ["chunk 2", "chunk 5"]]
+    assert slices[1].embeddings.tolist() == [[2, 3], [8, 9]]
+    assert slices[2].spans.tolist() == [[20, 25], [50, 55]]
+
+
+def test_sharded_quiz_merges_and_renumbers(notes):
+    generator = ScriptedGenerator([quiz_reply("glycolysis"), quiz_reply("osmosis"), quiz_reply("catalysis")])
+    result = asyncio.run(agenerate_quiz_sharded(notes, generator, "notes", 5, shard_size=2, client=object()))
+    assert result["shards"] == 3
+    assert len(result["questions"]) == 5
+    assert result["missing"] == 0 and result["errors"] == []
+    assert result["content"].startswith("Q1. ") and "Q5. " in result["content"]
+
+
+def test_failed_shard_is_retried(notes):
+    error = f"{ERROR_PREFIX}: Request timed out."
+    generator = ScriptedGenerator([quiz_reply("glycolysis", 3), error, quiz_reply("osmosis", 3)])
+    result = asyncio.run(agenerate_quiz_sharded(notes, generator, "notes", 4, shard_size=2, client=object()))
+    assert len(generator.prompts) == 3
+    assert len(result["questions"]) == 4
+    assert result["missing"] == 0 and result["errors"] == []
+
+
+def test_shard_that_keeps_failing_is_reported(notes):
+    error = f"{ERROR_PREFIX}: Error code: 429 - rate limited"
+    cards = "\n\n".join(f"Front: Term {name}\nBack: Meaning of {name}." for name in ("xylem", "phloem", "stomata"))
+    generator = ScriptedGenerator([cards, error, error])
+    result = asyncio.run(agenerate_flashcards_sharded(notes, generator, "notes", 4, shard_size=2, client=object()))
+    assert len(result["cards"]) == 3
+    assert result["missing"] == 1
+    assert result["errors"] == [error]
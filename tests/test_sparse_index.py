@@ -0,0 +1,102 @@
+import math
+import os
+
+import pytest
+
+from backend.rag_engine import HYBRID, SPARSE
+from backend.sparse_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+CHUNKS = [
+    "The mitochondria is the powerhouse of the cell",
+    "Chlorophyll absorbs light; light drives the light reaction",
+    "Enzymes lower the activation energy of a reaction",
+    "The cell membrane controls transport into the cell",
+]
+
+
+def brute_force_bm25(chunks, query, k1=1.2, b=0.75):
+    docs = [tokenize(chunk) for chunk in chunks]
+    average = sum(len(doc) for doc in docs) / len(docs)
+    scores = []
+    for doc in docs:
+        score = 0.0
+        for term in set(tokenize(query)):
+            containing = sum(1 for d in docs if term in d)
+            tf = doc.count(term)
+            if tf:
+                idf = math.log(1 + (len(docs) - containing + 0.5) / (containing + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / average))
+        scores.append(score)
+    return scores
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(str(tmp_path), "notes").create()
+    index.append(CHUNKS)
+    return index
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("The Cell, and its Membrane!") == ["cell", "membrane"]
+
+
+def test_scores_match_okapi_bm25(index):
+    ids, scores = index.search("light reaction in the cell", 10)
+    expected = brute_force_bm25(CHUNKS, "light reaction in the cell")
+    assert ids == sorted((i for i in range(len(CHUNKS)) if expected[i]), key=lambda i: -expected[i])
+    assert scores == pytest.approx([expected[i] for i in ids], rel=1e-5)
+
+
+def test_search_limits_and_misses(index):
+    assert index.search("cell", 1)[0] == [3]
+    assert index.search("photosynthesis", 5) == ([], [])
+    assert index.search("the of", 5) == ([], [])
+
+
+def test_reopen_and_append_after_search(index, tmp_path):
+    index.search("cell", 5)
+    index.append(["Ribosomes build proteins inside the cell"])
+    assert index.search("ribosomes", 5)[0] == [4]
+
+    reopened = BM25Index(str(tmp_path), "notes").open()
+    assert reopened.count == 5
+    assert reopened.search("cell", 5) == index.search("cell", 5)
+
+
+def test_torn_append_is_trimmed(index, tmp_path):
+    with open(index.terms_file, 'ab') as f:
+        f.write("half-writ".encode('utf-8'))
+    with open(index.postings_file, 'ab') as f:
+        f.write(b"\x00" * 12)
+    with open(index.offsets_file, 'ab') as f:
+        f.write(b"\x07\x00")
+
+    reopened = BM25Index(str(tmp_path), "notes").open()
+    assert reopened.count == len(CHUNKS)
+    assert os.path.getsize(index.offsets_file) == len(CHUNKS) * 8
+    reopened.append(["Ribosomes build proteins"])
+    assert BM25Index(str(tmp_path), "notes").open().search("ribosomes proteins", 5)[0] == [4]
+
+
+def test_sync_follows_the_segment_store(index):
+    index.sync(CHUNKS[:2])
+    assert index.count == 2 and index.search("cell", 5)[0] == [0]
+    index.sync(CHUNKS)
+    assert index.count == 4 and sorted(index.search("cell", 5)[0]) == [0, 3]
+
+
+def test_reciprocal_rank_fusion():
+    # 2 is second and first; 1 is first and third; 5 only appears once
+    assert reciprocal_rank_fusion([[1, 2, 3], [2, 4, 1], [5]], 3) == [2, 1, 5]
+    assert reciprocal_rank_fusion([[7], [8]], 5) == [7, 8]  # ties by id
+    assert reciprocal_rank_fusion([], 5) == []
+
+
+def test_engine_sparse_and_hybrid_modes(engine):
+    engine.add_documents("notes", CHUNKS)
+    assert list(engine.query("notes", "mitochondria powerhouse", n_results=1, mode=SPARSE)) == [CHUNKS[0]]
+    assert engine.query("notes", "mitochondria powerhouse", n_results=1, mode=SPARSE).query_embedding is None
+    hybrid = engine.query("notes", "chlorophyll light", n_results=2, mode=HYBRID)
+    assert hybrid[0] == CHUNKS[1]
+    assert list(engine.query("notes", "photosynthesis", n_results=2, mode=SPARSE)) == []
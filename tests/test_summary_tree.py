@@ -0,0 +1,69 @@
+import threading
+
+from backend.generator import ContentGenerator
+from backend.ingest import make_ingest_job
+from backend.jobs import CANCELLED, DONE, WorkerPool
+from backend.summary_tree import build_summary_tree, load_summary_tree
+from tests.conftest import make_text
+
+
+class CountingGenerator(ContentGenerator):
+    """Numbered summaries with no LLM behind them; calls wait until proceed is set."""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.proceed = threading.Event()
+        self._lock = threading.Lock()
+
+    def generate_with_context(self, prompt, context, use_cache=True, feature=None):
+        with self._lock:
+            self.calls += 1
+            number = self.calls
+        self.started.set()
+        self.proceed.wait(5)
+        return f"Summary {number} of {len(context)} parts."
+
+    def generate_mindmap(self, context, use_cache=True, stream=False):
+        return "Mind map"
+
+
+def wait_for(job, states):
+    for _ in range(500):
+        if job.state in states:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"job stayed {job.state}")
+
+
+def test_progress_is_reported_per_summary(engine):
+    engine.add_documents("notes", [make_text(20, seed) for seed in range(40)])
+    generator = CountingGenerator()
+    generator.proceed.set()
+    progress = []
+    tree = build_summary_tree(engine, generator, "notes", on_progress=lambda stage, **counters: progress.append(counters))
+    # 5 section summaries, then 2 and 1 combined
+    assert [len(level) for level in tree["levels"]] == [5, 2, 1]
+    assert [p["summaries_done"] for p in progress] == [1, 2, 3, 4, 5, 6, 7, 8, 8]
+    assert [p["summary_level"] for p in progress] == [0] * 5 + [1, 1, 2, 3]
+    assert load_summary_tree(engine.db_path, "notes")["document"] == tree["document"]
+
+
+def test_cancel_while_summarizing_stops_the_job(engine, tmp_path):
+    notes = tmp_path / "book.txt"
+    notes.write_text(make_text(4000))
+    generator = CountingGenerator()
+    pool = WorkerPool(workers=1)
+    job = pool.submit("session", make_ingest_job(engine, str(notes), "book.txt", "hash", generator))
+
+    assert generator.started.wait(5)
+    assert job.stage == "summarizing"
+    collection = engine.catalog.get("hash")["collection"]
+    sections = -(-len(engine.chunks(collection)) // 8)
+    pool.cancel(job.id, "session")
+    generator.proceed.set()
+    wait_for(job, (DONE, CANCELLED))
+
+    assert job.state == CANCELLED
+    assert generator.calls < sections
+    assert load_summary_tree(engine.db_path, collection) is None